@@ -2,6 +2,7 @@
 Based on PureJaxRL Implementation of PPO
 """
 
+import copy
 import os
 import jax
 import jax.numpy as jnp
@@ -13,7 +14,7 @@ from typing import Sequence, NamedTuple, Any
 from flax.training.train_state import TrainState
 import distrax
 import jaxmarl
-from jaxmarl.wrappers.baselines import LogWrapper
+from jaxmarl.wrappers.baselines import LogWrapper, load_params
 import matplotlib.pyplot as plt
 import hydra
 from omegaconf import OmegaConf
@@ -130,7 +131,8 @@ class MultiFacmacMPE(SimpleFacmacMPE):
         num_adversaries=3,
         num_landmarks=2,
         view_radius=1.5,  # set -1 to deactivate
-        score_function="sum"
+        score_function="sum",
+        collision_reward=10.0,
     ):
         super().__init__( 
         num_good_agents,
@@ -138,6 +140,8 @@ class MultiFacmacMPE(SimpleFacmacMPE):
         num_landmarks,
         view_radius, 
         score_function)
+        # may be a traced value, see `make_train`
+        self.collision_reward = collision_reward
         
     def rewards(self, state: State) -> Dict[str, float]:
         @partial(jax.vmap, in_axes=(0, None))
@@ -154,7 +158,7 @@ class MultiFacmacMPE(SimpleFacmacMPE):
         )  # [agent, adversary, collison]
 
         def _good(aidx: int, collisions: chex.Array):
-            rew = -10 * jnp.sum(collisions[aidx])
+            rew = -self.collision_reward * jnp.sum(collisions[aidx])
 
             mr = jnp.sum(self.map_bounds_reward(jnp.abs(state.p_pos[aidx])))
             rew -= mr
@@ -163,7 +167,7 @@ class MultiFacmacMPE(SimpleFacmacMPE):
         # ad_rew = 10 * jnp.sum(c)
         
         def _adv(aidx: int, collisions: chex.Array):
-            rew = 10 * jnp.sum(collisions[:,aidx])
+            rew = self.collision_reward * jnp.sum(collisions[:,aidx])
             
             return rew
 
@@ -197,8 +201,24 @@ def flatten_agents(x):
     # print("FLATTEN SHAPE", x.shape)
     return x.reshape((x.shape[0]*x.shape[1], ))
 
+# scalar env attributes that only enter the dynamics and rewards numerically,
+# so they can be traced and overridden through `env_kwargs`
+TRACED_ENV_KWARGS = ("collision_reward", "dt", "damping", "contact_force")
+
 def make_train(config):
-    env = MultiFacmacMPE(**config["ENV_KWARGS"])
+    """Returns `train(rng, context_params, env_kwargs={})`, training a best
+    response for the first adversary against the other adversaries acting
+    with `context_params`.
+
+    The context params and the numerical `env_kwargs`, e.g.
+    `collision_reward`, are traced inputs rather than compile-time constants,
+    so one compiled `train` can be reused or vmapped across a sweep of
+    checkpoints and env settings. `env_kwargs` override the matching
+    attributes of the env built from `config["ENV_KWARGS"]` and must be in
+    `TRACED_ENV_KWARGS`; the other entries such as `score_function` stay
+    static.
+    """
+    env = base_env = MultiFacmacMPE(**config["ENV_KWARGS"])
     print("made env")
     config["NUM_ACTORS"] = env.num_agents * config["NUM_ENVS"]
     config["NUM_UPDATES"] = (
@@ -216,7 +236,20 @@ def make_train(config):
         frac = 1.0 - (count // (config["NUM_MINIBATCHES"] * config["UPDATE_EPOCHS"])) / config["NUM_UPDATES"]
         return config["LR"] * frac
 
-    def train(rng):
+    def make_env(env_kwargs):
+        # the env arrays are built once outside of the trace, only the
+        # traced attributes are swapped in
+        unknown = set(env_kwargs) - set(TRACED_ENV_KWARGS)
+        if unknown:
+            raise ValueError(f"env_kwargs {sorted(unknown)} can't be traced, "
+                             f"expected a subset of {TRACED_ENV_KWARGS}")
+        env = copy.copy(base_env)
+        for k, v in env_kwargs.items():
+            setattr(env, k, v)
+        return LogWrapper(env, replace_info=True)
+
+    def train(rng, context_params, env_kwargs={}):
+        env = make_env(env_kwargs)
 
         # INIT NETWORK
         # TODO doesn't work for non-homogenous agents
@@ -230,13 +263,7 @@ def make_train(config):
         init_x = jnp.zeros(env.observation_space(env.agents[0]).shape)
         print("init x", init_x)
         network_params0 = network0.init(_rng0, init_x)
-        
-        def load_params(filename):
-            flattened_dict = load_file(filename)
-            return unflatten_dict(flattened_dict, sep=',')
-
-        network_params1 = load_params("ckpt/MPE_simple_facmac_v1/selfish/IPPO.safetensors")
-        # network_params1 = network1.init(_rng1, init_x)
+        network_params1 = context_params
         if config["ANNEAL_LR"]:
             tx = optax.chain(
                 optax.clip_by_global_norm(config["MAX_GRAD_NORM"]),
@@ -574,8 +601,11 @@ def main(config):
     
     rng = jax.random.PRNGKey(config["SEED"])
     rngs = jax.random.split(rng, config["NUM_SEEDS"])    
+    context_params = load_params(
+        config.get("CONTEXT_PATH", "ckpt/MPE_simple_facmac_v1/selfish/IPPO.safetensors")
+    )
     train_jit = jax.jit(make_train(config))
-    out = jax.vmap(train_jit)(rngs)
+    out = jax.vmap(train_jit, in_axes=(0, None))(rngs, context_params)
     # print(out)
     # save params
     env_name = config["ENV_NAME"]
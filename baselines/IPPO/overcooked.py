@@ -9,12 +9,13 @@ import numpy as np
 import os
 import optax
 from flax.linen.initializers import constant, orthogonal
-from typing import Sequence, NamedTuple, Any
+from typing import Sequence, NamedTuple, Any, Optional
 from flax.training.train_state import TrainState
 import distrax
 from gymnax.wrappers.purerl import LogWrapper, FlattenObservationWrapper
 import jaxmarl
 from jaxmarl.wrappers.baselines import LogWrapper
+from jaxmarl.environments import ObsPacking
 from jaxmarl.environments.overcooked import overcooked_layouts
 from jaxmarl.viz.overcooked_visualizer import OvercookedVisualizer
 import hydra
@@ -31,9 +32,14 @@ import matplotlib.pyplot as plt
 class ActorCritic(nn.Module):
     action_dim: Sequence[int]
     activation: str = "tanh"
+    obs_packing: Optional[ObsPacking] = None
 
     @nn.compact
     def __call__(self, x):
+        if self.obs_packing is not None:
+            # observations are stored packed and only unpacked here, where XLA fuses it into the first layer
+            cells = x.reshape(*x.shape[:-1], -1, self.obs_packing.num_packed_channels)
+            x = self.obs_packing.unpack(cells).reshape(*x.shape[:-1], -1)
         if self.activation == "relu":
             activation = nn.relu
         else:
@@ -80,7 +86,11 @@ def get_rollout(train_state, config):
     # env_params = env.default_params
     # env = LogWrapper(env)
 
-    network = ActorCritic(env.action_space().n, activation=config["ACTIVATION"])
+    network = ActorCritic(
+        env.action_space().n,
+        activation=config["ACTIVATION"],
+        obs_packing=env.obs_packing if env.packed_obs else None,
+    )
     key = jax.random.PRNGKey(0)
     key, key_r, key_a = jax.random.split(key, 3)
 
@@ -145,7 +155,11 @@ def make_train(config):
     def train(rng):
 
         # INIT NETWORK
-        network = ActorCritic(env.action_space().n, activation=config["ACTIVATION"])
+        network = ActorCritic(
+            env.action_space().n,
+            activation=config["ACTIVATION"],
+            obs_packing=env.obs_packing if env.packed_obs else None,
+        )
         rng, _rng = jax.random.split(rng)
         init_x = jnp.zeros(env.observation_space().shape)
         
@@ -355,7 +369,12 @@ def main(config):
         mode=config["WANDB_MODE"],
     )
 
-    config["ENV_KWARGS"]["layout"] = overcooked_layouts[config["ENV_KWARGS"]["layout"]]
+    layout = config["ENV_KWARGS"]["layout"]
+    if isinstance(layout, list):
+        # several layouts are padded to a common size and sampled at each reset
+        config["ENV_KWARGS"]["layout"] = [overcooked_layouts[l] for l in layout]
+    else:
+        config["ENV_KWARGS"]["layout"] = overcooked_layouts[layout]
     rng = jax.random.PRNGKey(30)
     num_seeds = 20
     with jax.disable_jit(False):
@@ -1,4 +1,6 @@
 from .multi_agent_env import MultiAgentEnv, State
+from .reset_pool import ResetPool
+from .obs_packing import ObsPacking
 from .mpe import (
     SimpleMPE,
     SimpleTagMPE,
@@ -5,6 +5,7 @@ from typing import Tuple
 from jaxmarl.environments.multi_agent_env import MultiAgentEnv
 import chex
 from jaxmarl.environments import spaces
+from jaxmarl.environments.obs_packing import ObsPacking
 from typing import Optional, Tuple
 
 @chex.dataclass
@@ -62,11 +63,14 @@ class CoinGame(MultiAgentEnv):
         cnn: bool = True,
         egocentric: bool = False,
         payoff_matrix=[[1, 1, -2], [1, 1, -2]],
+        packed_obs: bool = False,
     ):
 
         super().__init__(num_agents=2)
         self.agents = list(range(2))
         self.payoff_matrix = payoff_matrix
+        # all observations are binary, bit-pack the channels or the flat vector
+        obs_packing = ObsPacking(4 if cnn else 36)
 
         # helper functions
         def _update_stats(
@@ -192,7 +196,9 @@ class CoinGame(MultiAgentEnv):
                 obs1, obs2 = _abs_position(state)
 
             if not cnn:
-                return obs1.flatten(), obs2.flatten()
+                obs1, obs2 = obs1.flatten(), obs2.flatten()
+            if packed_obs:
+                return obs_packing.pack(obs1), obs_packing.pack(obs2)
             return obs1, obs2
 
         def _step(
@@ -387,6 +393,8 @@ class CoinGame(MultiAgentEnv):
         self.step = jax.jit(_step)
         self.reset = jax.jit(_reset)
         self.cnn = cnn
+        self.packed_obs = packed_obs
+        self.obs_packing = obs_packing
 
         self.step = _step
         self.reset = _reset
@@ -408,6 +416,9 @@ class CoinGame(MultiAgentEnv):
     def observation_space(self) -> spaces.Box:
         """Observation space of the environment."""
         _shape = (3, 3, 4) if self.cnn else (36,)
+        if self.packed_obs:
+            _shape = _shape[:-1] + (self.obs_packing.num_packed_channels,)
+            return spaces.Box(low=0, high=255, shape=_shape, dtype=jnp.uint8)
         return spaces.Box(low=0, high=1, shape=_shape, dtype=jnp.uint8)
 
     def state_space(self) -> spaces.Dict:
@@ -10,7 +10,7 @@ import chex
 from typing import Tuple, Dict
 from functools import partial
 from gymnax.environments.spaces import Discrete
-from .hanabi_game import HanabiGame, State
+from .hanabi_game import HanabiGame, State, CompactState
 
 
 class HanabiEnv(HanabiGame):
@@ -28,6 +28,8 @@ class HanabiEnv(HanabiGame):
         action_spaces=None,
         observation_spaces=None,
         num_moves=None,
+        compact_state=False,
+        variable_num_agents=False,
     ):
         super().__init__(
             num_agents=num_agents,
@@ -37,6 +39,8 @@ class HanabiEnv(HanabiGame):
             max_info_tokens=max_info_tokens,
             max_life_tokens=max_life_tokens,
             num_cards_of_rank=num_cards_of_rank,
+            compact_state=compact_state,
+            variable_num_agents=variable_num_agents,
         )
 
         if agents is None:
@@ -87,13 +91,38 @@ class HanabiEnv(HanabiGame):
             2 * self.hand_size + self.num_colors + self.num_ranks,
         )
 
+        # lookup tables gathered by the observation functions
+        # copies of each card in the full deck, colour-major
+        self.full_deck_counts = jnp.array(
+            np.tile(num_cards_of_rank, num_colors), dtype=jnp.float32
+        )
+        # rank and copy thresholded by each bit of a binarized discard pile colour
+        self.discard_bin_ranks = jnp.array(
+            np.repeat(np.arange(num_ranks), num_cards_of_rank)
+        )
+        self.discard_bin_copies = jnp.array(
+            np.concatenate([np.arange(n) for n in num_cards_of_rank])
+        )
+        # move type (in obl order: play, discard, reveal_c, reveal_r) and revealed
+        # colour/rank of each action
+        move_types = np.zeros((self.num_moves, 4), dtype=np.int32)
+        move_types[:hand_size, 1] = 1
+        move_types[hand_size : 2 * hand_size, 0] = 1
+        revealed = np.zeros((self.num_moves, num_colors + num_ranks))
+        for a in range(2 * hand_size, self.num_moves - 1):
+            hint_idx = (a - 2 * hand_size) % (num_colors + num_ranks)
+            move_types[a, 2 + (hint_idx >= num_colors)] = 1
+            revealed[a, hint_idx] = 1
+        self.move_types = jnp.array(move_types)
+        self.revealed_hints = jnp.array(revealed)
+
         # number of features
         self.hands_n_feats = (
             (self.num_agents - 1) * self.hand_size * self.num_colors * self.num_ranks
             + self.num_agents  # hands of all the other agents + agents' missing cards
         )
         self.board_n_feats = (
-            (self.deck_size - self.num_agents * self.hand_size)
+            (self.deck_size - self.min_cards_dealt)
             + self.num_colors * self.num_ranks  # deck-initial cards, thermometer
             + self.max_info_tokens  # fireworks, OH
             + self.max_life_tokens  # info tokens, OH  # life tokens, OH
@@ -133,19 +162,60 @@ class HanabiEnv(HanabiGame):
             self.observation_spaces = {i: Discrete(self.obs_size) for i in self.agents}
 
     @partial(jax.jit, static_argnums=[0])
-    def reset(self, key: chex.PRNGKey) -> Tuple[Dict, State]:
-        """Reset the environment and return the initial observation."""
-        state = self.reset_game(key)
-        obs = self.get_obs(state, state, action=20)
+    def reset(self, key: chex.PRNGKey, num_players: int = None) -> Tuple[Dict, State]:
+        """Reset the environment and return the initial observation.
+
+        With variable_num_agents, `num_players` sets the number of players of
+        the game (drawn uniformly when not given) and can be traced, so games
+        with different numbers of players can be vmapped together.
+        """
+        obs, state = self.reset_array(key, num_players)
+        return self.unstack_agents(obs), state
+
+    @partial(jax.jit, static_argnums=[0])
+    def reset_array(
+        self, key: chex.PRNGKey, num_players: int = None
+    ) -> Tuple[chex.Array, State]:
+        """Reset the environment and return the stacked initial observations."""
+        if self.compact_state:
+            state = self.reset_game_compact(key, num_players)
+        else:
+            state = self.reset_game(key, num_players)
+        obs = self.get_obs_array(state, state, action=20)
         return obs, state
-    
+
     @partial(jax.jit, static_argnums=[0])
-    def reset_from_deck(self, key: chex.PRNGKey, deck:chex.Array) -> Tuple[Dict, State]:
+    def reset_from_deck(
+        self, key: chex.PRNGKey, deck: chex.Array, num_players: int = None
+    ) -> Tuple[Dict, State]:
         """Inject a deck in the game. Useful for testing."""
-        state = self.reset_game_from_deck(key, deck)
+        if self.compact_state:
+            state = self.get_first_state_compact(key, self.card_ids(deck), num_players)
+        else:
+            state = self.reset_game_from_deck(key, deck, num_players)
         obs = self.get_obs(state, state, action=20)
         return obs, state
 
+    @partial(jax.jit, static_argnums=[0])
+    def reset_done(self, key, obs, state, done, pool=None):
+        """`MultiAgentEnv.reset_done`, keeping the number of players of each
+        game when it is variable and resets are not drawn from a pool."""
+        if not self.variable_num_agents or pool is not None:
+            return super().reset_done(key, obs, state, done, pool)
+        obs_re, state_re = self.reset(key, self.get_num_players(state))
+        state = jax.tree_map(lambda x, y: lax.select(done, x, y), state_re, state)
+        obs = jax.tree_map(lambda x, y: lax.select(done, x, y), obs_re, obs)
+        return obs, state
+
+    @partial(jax.jit, static_argnums=[0])
+    def reset_done_array(self, key, obs, state, done, pool=None):
+        """`reset_done` on agent-major observation arrays."""
+        if not self.variable_num_agents or pool is not None:
+            return super().reset_done_array(key, obs, state, done, pool)
+        obs_re, state_re = self.reset_array(key, self.get_num_players(state))
+        state = jax.tree_map(lambda x, y: lax.select(done, x, y), state_re, state)
+        return lax.select(done, obs_re, obs), state
+
     @partial(jax.jit, static_argnums=[0])
     def step_env(
         self,
@@ -157,23 +227,46 @@ class HanabiEnv(HanabiGame):
 
         # get actions as array
         actions = jnp.array([actions[i] for i in self.agents])
-        aidx = jnp.nonzero(state.cur_player_idx, size=1)[0][0]
-        action = actions.at[aidx].get()
+        obs, new_state, rewards, dones, info = self.step_env_array(key, state, actions)
+
+        rewards = self.unstack_agents(rewards)
+        rewards["__all__"] = rewards[self.agents[0]]
+
+        return (
+            self.unstack_agents(obs),
+            new_state,
+            rewards,
+            self.unstack_dones(dones),
+            info,
+        )
+
+    @partial(jax.jit, static_argnums=[0])
+    def step_env_array(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: chex.Array,
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        """Execute the environment step on agent-major arrays."""
 
-        # execute the current player's action and its consequences
         old_state = state
-        new_state, reward = self.step_game(state, aidx, action)
+        # execute the current player's action and its consequences
+        if self.compact_state:
+            aidx = state.cur_player_idx
+            action = actions.at[aidx].get()
+            new_state, reward = self.step_game_compact(state, aidx, action)
+        else:
+            aidx = jnp.nonzero(state.cur_player_idx, size=1)[0][0]
+            action = actions.at[aidx].get()
+            new_state, reward = self.step_game(state, aidx, action)
 
         done = self.terminal(new_state)
-        dones = {agent: done for agent in self.agents}
-        dones["__all__"] = done
-
-        rewards = {agent: reward for agent in self.agents}
-        rewards["__all__"] = reward
+        dones = jnp.full((self.num_agents + 1,), done)
+        rewards = jnp.full((self.num_agents,), reward)
 
         info = {}
 
-        obs = lax.stop_gradient(self.get_obs(new_state, old_state, action))
+        obs = lax.stop_gradient(self.get_obs_array(new_state, old_state, action))
 
         return (obs, lax.stop_gradient(new_state), rewards, dones, info)
 
@@ -182,23 +275,37 @@ class HanabiEnv(HanabiGame):
         self, new_state: State, old_state: State, action: chex.Array = 20
     ) -> Dict:
         """Get all agents' observations."""
+        return self.unstack_agents(self.get_obs_array(new_state, old_state, action))
 
+    @partial(jax.jit, static_argnums=[0])
+    def get_obs_array(
+        self, new_state: State, old_state: State, action: chex.Array = 20
+    ) -> chex.Array:
+        """Get all agents' observations, stacked in `self.agents` order."""
+        new_state = self.one_hot_state(new_state)
+        old_state = self.one_hot_state(old_state)
         # no agent-specific obs
         board_fats = self.get_board_fats(new_state)
         discard_feats = self._binarize_discard_pile(new_state.discard_pile)
-
-        def _observe(aidx: int):
+        relative_agents = self.get_relative_agents(self.get_num_players(new_state))
+        # beliefs don't depend on the observer, only their order does
+        beliefs = self.get_hands_beliefs(new_state)[relative_agents]
+        # make the observer's hand first
+        hands = new_state.player_hands[relative_agents]
+        active_agents = new_state.active_agents[relative_agents]
+
+        def _observe(
+            aidx: int,
+            hands_from_self: chex.Array,
+            belief: chex.Array,
+            active_from_self: chex.Array,
+        ):
 
             # HANDS FEATURES: my masked hand, other agents hands, missing cards per agent
-            hands_from_self = jnp.roll(
-                new_state.player_hands, -aidx, axis=0
-            )  # make the current player hand first
-            other_hands = jnp.delete(
-                hands_from_self, 0, axis=0, assume_unique_indices=True
-            ).ravel()
+            other_hands = hands_from_self[1:].ravel()
             missing_cards = ~hands_from_self.any(
                 axis=(1, 2, 3)
-            )  # check if some player is missing a card
+            ) & active_from_self  # check if some player is missing a card
             hands_feats = jnp.concatenate((other_hands, missing_cards))
 
             # LAST ACTION FEATS
@@ -210,7 +317,7 @@ class HanabiEnv(HanabiGame):
             )
 
             # BELIEF FEATS
-            belief_v0_feats = self.get_v0_belief_feats(aidx, new_state)
+            belief_v0_feats = belief.ravel()
 
             return jnp.concatenate(
                 (
@@ -222,12 +329,31 @@ class HanabiEnv(HanabiGame):
                 )
             )
 
-        obs = jax.vmap(_observe)(self.agent_range)
+        obs = jax.vmap(_observe)(self.agent_range, hands, beliefs, active_agents)
+        # agents that don't take part in the game observe nothing
+        return jnp.where(new_state.active_agents[:, jnp.newaxis], obs, 0)
+
+    def get_relative_agents(self, num_players: int) -> chex.Array:
+        """Agents in the order seen by each agent, starting from itself. Agents
+        that don't take part in the game keep their position at the end."""
+        agents = np.arange(self.num_agents)
+        relative = (agents[:, np.newaxis] + agents) % num_players
+        return jnp.where(agents < num_players, relative, agents)
 
-        return {a: obs[i] for i, a in enumerate(self.agents)}
+    def one_hot_state(self, state: State) -> State:
+        """The one-hot `State` the observations are computed from"""
+        if isinstance(state, CompactState):
+            return self.expand_state(state)
+        return state
 
     def get_legal_moves(self, state: State) -> chex.Array:
         """Get all agents' legal moves"""
+        state = self.one_hot_state(state)
+
+        num_players = self.get_num_players(state)
+        relative_agents = self.get_relative_agents(num_players)
+        # slots past the hand size of the game are always empty
+        in_hand = jnp.arange(self.hand_size) < self.get_hand_size(num_players)
 
         @partial(jax.vmap, in_axes=[0, None])
         def _legal_moves(aidx: int, state: State) -> chex.Array:
@@ -244,40 +370,20 @@ class HanabiEnv(HanabiGame):
             # discard legal when discard tokens are not full
             is_not_max_info_tokens = jnp.sum(state.info_tokens) < 8
             legal_moves = legal_moves.at[move_idx : move_idx + self.hand_size].set(
-                is_not_max_info_tokens
+                is_not_max_info_tokens & in_hand
             )
             move_idx += self.hand_size
             # play moves always legal
-            legal_moves = legal_moves.at[move_idx : move_idx + self.hand_size].set(1)
-            move_idx += self.hand_size
-            # hints depend on other player cards
-            other_hands = jnp.delete(hands, aidx, axis=0, assume_unique_indices=True)
-
-            def _get_hints_for_hand(carry, unused):
-                """Generates valid hints given hand"""
-                aidx, other_hands = carry
-                hand = other_hands[aidx]
-
-                # get occurrences of each card
-                card_counts = jnp.sum(hand, axis=0)
-                # get occurrences of each color
-                color_counts = jnp.sum(card_counts, axis=1)
-                # get occurrences of each rank
-                rank_counts = jnp.sum(card_counts, axis=0)
-                # check which colors/ranks in hand
-                colors_present = jnp.where(color_counts > 0, 1, 0)
-                ranks_present = jnp.where(rank_counts > 0, 1, 0)
-
-                valid_hints = jnp.concatenate([colors_present, ranks_present])
-                carry = (aidx + 1, other_hands)
-
-                return carry, valid_hints
-
-            _, valid_hints = lax.scan(
-                _get_hints_for_hand, (0, other_hands), None, self.num_agents - 1
+            legal_moves = legal_moves.at[move_idx : move_idx + self.hand_size].set(
+                in_hand
             )
-            # make other player positions relative to current player
-            valid_hints = jnp.roll(valid_hints, -aidx, axis=0)
+            move_idx += self.hand_size
+            # hints depend on other player cards, in positions relative to current player
+            other_hands = hands[relative_agents[aidx, 1:]]
+            # check which colors/ranks are in each hand
+            colors_present = jnp.where(jnp.sum(other_hands, axis=(1, 3)) > 0, 1, 0)
+            ranks_present = jnp.where(jnp.sum(other_hands, axis=(1, 2)) > 0, 1, 0)
+            valid_hints = jnp.concatenate([colors_present, ranks_present], axis=1)
             # include valid hints in legal moves
             num_hints = (self.num_agents - 1) * (self.num_colors + self.num_ranks)
             valid_hints = jnp.concatenate(valid_hints, axis=0)
@@ -305,56 +411,38 @@ class HanabiEnv(HanabiGame):
     ):
         """Get the features of the last action taken"""
 
-        acting_player_index = old_state.cur_player_idx  # absolute OH index
-        target_player_index = new_state.cur_player_idx  # absolute OH index
-        acting_player_relative_index = jnp.roll(
-            acting_player_index, -aidx
+        num_players = self.get_num_players(new_state)
+        # in obl the encoding order here is: play, discard, reveal_c, reveal_r
+        move_type = self.move_types[action]
+        is_hint = move_type[2:].any()
+
+        acting_player = jnp.argmax(old_state.cur_player_idx)  # absolute index
+        # hinted player, or next player for other moves
+        hint_target = (action - 2 * self.hand_size) // (self.num_colors + self.num_ranks)
+        target_player = jnp.where(
+            is_hint,
+            (acting_player + 1 + hint_target) % num_players,
+            jnp.argmax(new_state.cur_player_idx),
+        )  # absolute index
+        acting_player_relative_index = jax.nn.one_hot(
+            (acting_player - aidx) % num_players, self.num_agents
         )  # relative OH index
-        target_player_relative_index = jnp.roll(
-            target_player_index, -aidx
+        target_player_relative_index = jax.nn.one_hot(
+            (target_player - aidx) % num_players, self.num_agents
         )  # relative OH index
 
-        # in obl the encoding order here is: play, discard, reveal_c, reveal_r
-        move_type = jnp.where(  # hard encoded but hey ho let's go
-            (action >= 0) & (action < 5),  # discard
-            jnp.array([0, 1, 0, 0]),
-            jnp.where(
-                (action >= 5) & (action < 10),  # play
-                jnp.array([1, 0, 0, 0]),
-                jnp.where(
-                    (action >= 10) & (action < 15),  # reveal_c
-                    jnp.array([0, 0, 1, 0]),
-                    jnp.where(
-                        (action >= 15) & (action < 20),  # reveal_r
-                        jnp.array([0, 0, 0, 1]),
-                        jnp.array([0, 0, 0, 0]),  # invalid
-                    ),
-                ),
-            ),
-        )
-
         target_player_relative_index_feat = jnp.where(
-            action >= 10,  # only for hint actions
+            is_hint,  # only for hint actions
             target_player_relative_index,
             jnp.zeros(self.num_agents),
         )
 
         # get the hand of the target player
-        target_hand = new_state.player_hands[
-            jnp.nonzero(target_player_index, size=1)[0][0]
-        ]
-
-        color_revealed = jnp.where(  # which color was revealed by action (oh)?
-            action == self.color_action_range,
-            1.0,
-            jnp.zeros(self.color_action_range.size),
-        )
+        target_hand = new_state.player_hands[target_player]
 
-        rank_revealed = jnp.where(  # which rank was revealed by action (oh)?
-            action == self.rank_action_range,
-            1.0,
-            jnp.zeros(self.rank_action_range.size),
-        )
+        # which color/rank was revealed by action (oh)?
+        color_revealed = self.revealed_hints[action, : self.num_colors]
+        rank_revealed = self.revealed_hints[action, self.num_colors :]
 
         # cards that have the color that was revealed
         color_revealed_cards = jnp.where(
@@ -383,9 +471,7 @@ class HanabiEnv(HanabiGame):
             jnp.arange(self.hand_size) == action % self.hand_size,
             jnp.zeros(self.hand_size),
         )
-        actor_hand_before = old_state.player_hands[
-            jnp.nonzero(acting_player_index, size=1)[0][0]
-        ]
+        actor_hand_before = old_state.player_hands[acting_player]
 
         played_discarded_card = jnp.where(
             pos_played_discarded.any(),
@@ -449,17 +535,14 @@ class HanabiEnv(HanabiGame):
         """Get the features of the board."""
         # by default the fireworks are incremental, i.e. [1,1,0,0,0] one and two are in the board
         # must be OH of only the highest rank, i.e. [0,1,0,0,0]
-        keep_only_last_one = lambda x: jnp.where(
-            jnp.arange(x.size) < (x.size - 1 - jnp.argmax(jnp.flip(x))),  # last argmax
-            0,
-            x,
-        )
-
-        fireworks = jax.vmap(keep_only_last_one)(state.fireworks)
-        deck = jnp.any(jnp.any(state.deck, axis=1), axis=1).astype(int)
-        deck = deck[
-            -1 : self.num_agents * self.hand_size - 1 : -1
-        ]  # avoid the first cards at beginning of episode and reset the order
+        next_fireworks = jnp.pad(state.fireworks[:, 1:], ((0, 0), (0, 1)))
+        fireworks = state.fireworks * (1 - next_fireworks)
+        # cards left in the deck, thermometer encoded: cards are dealt from the top
+        # so this is the deck presence without the first cards and in reverse order
+        deck = (
+            jnp.arange(self.deck_size - self.num_agents * self.hand_size)
+            < self.deck_size - state.num_cards_dealt
+        ).astype(int)
         board_feats = jnp.concatenate(
             (deck, fireworks.ravel(), state.info_tokens, state.life_tokens)
         )
@@ -488,50 +571,48 @@ class HanabiEnv(HanabiGame):
     @partial(jax.jit, static_argnums=[0])
     def get_v0_belief_feats(self, aidx: int, state: State):
         """Get the belief of the agent about the player hands."""
+        # my belief and the beliefs of other players, starting from self cards
+        return jnp.roll(self.get_hands_beliefs(state), -aidx, axis=0).ravel()
 
-        full_deck = self.get_full_deck()
+    @partial(jax.jit, static_argnums=[0])
+    def get_hands_beliefs(self, state: State):
+        """Get the v0 belief about each player's hand, in absolute player order."""
+        count = (
+            self.full_deck_counts
+            - state.discard_pile.sum(axis=0).ravel()
+            - state.fireworks.ravel()
+        )  # count of the remaining cards
 
         def belief_per_hand(knowledge, color_hint, rank_hint):
-            count = (
-                full_deck.sum(axis=0).ravel()
-                - state.discard_pile.sum(axis=0).ravel()
-                - state.fireworks.ravel()
-            )  # count of the remaining cards
             normalized_knowledge = knowledge * count
             normalized_knowledge /= normalized_knowledge.sum(axis=1)[:, np.newaxis]
             return jnp.concatenate(
                 (normalized_knowledge, color_hint, rank_hint), axis=-1
             ).ravel()
 
-        # compute my belief and the beliefs of other players, starting from self cards
-        rel_pos = lambda x: jnp.roll(x, -aidx, axis=0)
-        belief = jax.vmap(belief_per_hand)(
-            rel_pos(state.card_knowledge),
-            rel_pos(state.colors_revealed),
-            rel_pos(state.ranks_revealed),
+        beliefs = jax.vmap(belief_per_hand)(
+            state.card_knowledge, state.colors_revealed, state.ranks_revealed
         )
-
-        return belief.ravel()
+        if self.variable_num_agents:
+            # no beliefs about the cards of inactive players or unused slots
+            hand_size = self.get_hand_size(self.get_num_players(state))
+            in_game = state.active_agents[:, np.newaxis] & (
+                jnp.arange(self.hand_size) < hand_size
+            )
+            beliefs = beliefs.reshape(self.num_agents, self.hand_size, -1)
+            beliefs = jnp.where(in_game[..., np.newaxis], beliefs, 0)
+            beliefs = beliefs.reshape(self.num_agents, -1)
+        return beliefs
 
     @partial(jax.jit, static_argnums=[0])
     def _binarize_discard_pile(self, discard_pile: chex.Array):
         """Binarize the discard pile to reduce dimensionality."""
 
-        def binarize_ranks(n_ranks):
-            tree = jax.tree_util.tree_map(
-                lambda n_rank_present, max_ranks: jnp.where(
-                    jnp.arange(max_ranks) >= n_rank_present,
-                    jnp.zeros(max_ranks),
-                    jnp.ones(max_ranks),
-                ),
-                [x for x in n_ranks],
-                [x for x in self.num_cards_of_rank],
-            )
-            return jnp.concatenate(tree)
-
-        binarized_pile = jax.vmap(binarize_ranks)(discard_pile.sum(axis=0)).ravel()
+        # thermometer of the discarded copies of each card, per colour
+        counts = discard_pile.sum(axis=0)[:, self.discard_bin_ranks]
+        binarized_pile = (counts > self.discard_bin_copies).astype(jnp.float32)
 
-        return binarized_pile
+        return binarized_pile.ravel()
 
     def terminal(self, state: State) -> bool:
         """Check whether state is terminal."""
@@ -590,6 +671,7 @@ class HanabiEnv(HanabiGame):
 
     def render(self, state: State):
         """Render the state of the game as a string in console."""
+        state = self.one_hot_state(state)
 
         def get_actor_hand_str(aidx: int) -> str:
             # get the index of an actor and returns its hand (with knowledge per card) as string
@@ -670,7 +752,10 @@ class HanabiEnv(HanabiGame):
 
     def get_obs_str(self, new_state, old_state=None, action=20, include_belief=False, best_belief=5):
         """Get the observation as a string."""
-        
+        new_state = self.one_hot_state(new_state)
+        if old_state is not None:
+            old_state = self.one_hot_state(old_state)
+
         output = ""
 
         def get_actor_hand_str(aidx: int, belief: chex.Array=None, mask_hand=False) -> str:
@@ -34,6 +34,35 @@ class State:
     remaining_deck_size: chex.Array
     turn: int
     score: int
+    # agents taking part in the game, a prefix of all agents
+    active_agents: chex.Array
+
+
+@struct.dataclass
+class CompactState:
+    # cards are stored as int8 ids `color * num_ranks + rank`, -1 for no card
+    deck: chex.Array
+    discard_pile: chex.Array
+    # number of cards played per color
+    fireworks: chex.Array
+    player_hands: chex.Array
+    info_tokens: int
+    terminal: bool
+    life_tokens: int
+    # bit `color * num_ranks + rank` is set while that card is still possible
+    card_knowledge: chex.Array
+    # bit `color` (`rank`) is set once the card's color (rank) was hinted
+    colors_revealed: chex.Array
+    ranks_revealed: chex.Array
+    num_cards_dealt: int
+    num_cards_discarded: int
+    cur_player_idx: int
+    out_of_lives: bool
+    last_round_count: int
+    bombed: bool
+    turn: int
+    score: int
+    active_agents: chex.Array
 
 
 class HanabiGame(MultiAgentEnv):
@@ -48,6 +77,8 @@ class HanabiGame(MultiAgentEnv):
         max_life_tokens=3,
         num_cards_of_rank=np.array([3, 2, 2, 2, 1]),
         color_map=["R", "Y", "G", "W", "B"],
+        compact_state=False,
+        variable_num_agents=False,
     ):
         super().__init__(num_agents)
 
@@ -59,25 +90,75 @@ class HanabiGame(MultiAgentEnv):
         self.max_info_tokens = max_info_tokens
         self.max_life_tokens = max_life_tokens
         self.num_cards_of_rank = num_cards_of_rank
-        self.deck_size = jnp.sum(num_cards_of_rank) * num_colors
+        self.deck_size = int(np.sum(num_cards_of_rank)) * num_colors
         self.color_map = color_map
 
-    @partial(jax.jit, static_argnums=[0])
-    def get_first_state(self, key:chex.PRNGKey, deck:chex.Array) -> State:
-        """Get the initial state of the game"""
-
-        def _deal_cards(aidx, unused):
-            """Deals cards to players from top of deck"""
-            # top of deck is first array element
-            start = aidx * self.hand_size
-            hand = lax.dynamic_slice(
-                deck, (start, 0, 0), (self.hand_size, self.num_colors, self.num_ranks)
+        # with variable_num_agents, num_agents and hand_size are the maximum ones
+        # and every game has its own number of players, from 2 to num_agents
+        self.variable_num_agents = variable_num_agents
+        if variable_num_agents:
+            # hand sizes of the official rules, indexed by number of players
+            hand_sizes = [
+                hand_size if n < 4 else hand_size - 1 for n in range(num_agents + 1)
+            ]
+            self.hand_sizes = jnp.array(hand_sizes)
+            self.min_num_agents = 2
+            self.min_cards_dealt = min(
+                n * hand_sizes[n] for n in range(self.min_num_agents, num_agents + 1)
             )
+        else:
+            self.min_num_agents = num_agents
+            self.min_cards_dealt = num_agents * hand_size
+
+        self.compact_state = compact_state
+        if compact_state:
+            assert (
+                num_colors * num_ranks <= 32 and max(num_colors, num_ranks) <= 8
+            ), "Compact state packs card knowledge in uint32 and hints in uint8"
+            # knowledge bits kept by a positive hint, indexed by hint (colors then ranks)
+            card_bits = np.arange(num_colors * num_ranks).reshape(num_colors, num_ranks)
+            card_bits = (1 << card_bits).astype(np.uint32)
+            self.hint_bits = jnp.array(
+                np.concatenate((card_bits.sum(axis=1), card_bits.sum(axis=0))),
+                dtype=jnp.uint32,
+            )
+            self.full_knowledge = jnp.uint32((1 << (num_colors * num_ranks)) - 1)
+
+    def get_num_players(self, state: State) -> int:
+        """Number of agents taking part in the game"""
+        if self.variable_num_agents:
+            return jnp.sum(state.active_agents).astype(int)
+        return self.num_agents
+
+    def get_hand_size(self, num_players: int) -> int:
+        """Number of cards in each hand of a game with `num_players` players"""
+        if self.variable_num_agents:
+            return self.hand_sizes[num_players]
+        return self.hand_size
+
+    def _deal_hands(self, deck: chex.Array, num_players: int, empty_card: chex.Array):
+        """Deals cards to the players from the top of the deck, leaving the
+        slots of inactive players and unused slots empty"""
+        hand_size = self.get_hand_size(num_players)
+        agents = jnp.arange(self.num_agents)[:, jnp.newaxis]
+        slots = jnp.arange(self.hand_size)
+        in_hand = (agents < num_players) & (slots < hand_size)
+        # top of deck is first array element
+        hands = deck[jnp.where(in_hand, agents * hand_size + slots, 0)]
+        in_hand = in_hand.reshape(in_hand.shape + (1,) * (hands.ndim - 2))
+        return jnp.where(in_hand, hands, empty_card), num_players * hand_size
+
+    def _sample_num_players(self, key: chex.PRNGKey) -> int:
+        return jax.random.randint(key, (), self.min_num_agents, self.num_agents + 1)
 
-            return aidx + 1, hand
-
-        _, hands = lax.scan(_deal_cards, 0, None, self.num_agents)
-        num_cards_dealt = self.num_agents * self.hand_size
+    @partial(jax.jit, static_argnums=[0])
+    def get_first_state(
+        self, key: chex.PRNGKey, deck: chex.Array, num_players: int = None
+    ) -> State:
+        """Get the initial state of the game"""
+        if num_players is None:
+            num_players = self.num_agents
+        hands, num_cards_dealt = self._deal_hands(deck, num_players, 0)
 
         # start off with all (color, rank) combinations being possible for all cards
         card_knowledge = jnp.ones(
@@ -91,10 +172,11 @@ class HanabiGame(MultiAgentEnv):
         num_cards_discarded = 0
 
         # remove dealt cards from deck
-        deck = deck.at[:num_cards_dealt].set(
-            jnp.zeros((self.num_colors, self.num_ranks))
-        )
-        remaining_deck_size = jnp.zeros(self.deck_size).at[:-num_cards_dealt].set(1)
+        dealt = jnp.arange(self.deck_size) < num_cards_dealt
+        deck = jnp.where(dealt[:, jnp.newaxis, jnp.newaxis], 0, deck)
+        remaining_deck_size = (
+            jnp.arange(self.deck_size) < self.deck_size - num_cards_dealt
+        ).astype(jnp.float32)
 
         # thermometer encoded
         life_tokens = jnp.ones(self.max_life_tokens)
@@ -128,13 +210,18 @@ class HanabiGame(MultiAgentEnv):
             remaining_deck_size=remaining_deck_size,
             turn=0,
             score=0,
+            active_agents=self.agent_range < num_players,
         )
 
         return state
 
     @partial(jax.jit, static_argnums=[0])
-    def reset_game(self, key: chex.PRNGKey) -> State:
-        """Create a random deck and return the first state of the game"""
+    def reset_game(self, key: chex.PRNGKey, num_players: int = None) -> State:
+        """Create a random deck and return the first state of the game. With
+        variable_num_agents, the number of players is drawn uniformly when not given."""
+        if self.variable_num_agents and num_players is None:
+            key, key_players = jax.random.split(key)
+            num_players = self._sample_num_players(key_players)
 
         def _gen_cards(aidx, unused):
             """Generates one-hot card encodings given (color, rank) pairs"""
@@ -155,11 +242,13 @@ class HanabiGame(MultiAgentEnv):
         # generate one-hot encoded deck
         _, deck = lax.scan(_gen_cards, 0, None, self.deck_size)
 
-        return self.get_first_state(key, deck)
+        return self.get_first_state(key, deck, num_players)
 
     @partial(jax.jit, static_argnums=[0])
-    def reset_game_from_deck(self, key: chex.PRNGKey, deck:chex.PRNGKey) -> State:
-        return self.get_first_state(key, deck)
+    def reset_game_from_deck(
+        self, key: chex.PRNGKey, deck: chex.PRNGKey, num_players: int = None
+    ) -> State:
+        return self.get_first_state(key, deck, num_players)
 
     @partial(jax.jit, static_argnums=[0])
     def step_game(
@@ -174,6 +263,8 @@ class HanabiGame(MultiAgentEnv):
         # check move type
         is_discard = action < self.hand_size
         is_hint = (2 * self.hand_size) <= action
+        num_players = self.get_num_players(state)
+        hand_size = self.get_hand_size(num_players)
         # initialise reward for move
         reward = 0
 
@@ -191,7 +282,7 @@ class HanabiGame(MultiAgentEnv):
             infos_remaining = jnp.sum(state.info_tokens)
             infos_depleted = infos_remaining < self.max_info_tokens
             new_infos = (infos_remaining + (is_discard * infos_depleted)).astype(int)
-            info_tokens = state.info_tokens.at[new_infos - 1].set(1)
+            info_tokens = (jnp.arange(self.max_info_tokens) < new_infos).astype(int)
 
             # play selected card if play action
             color, rank = jnp.nonzero(card, size=1)
@@ -208,7 +299,7 @@ class HanabiGame(MultiAgentEnv):
             infos_remaining = jnp.sum(info_tokens)
             infos_depleted = infos_remaining < self.max_info_tokens
             new_infos = (infos_remaining + (is_final_card * infos_depleted)).astype(int)
-            info_tokens = info_tokens.at[new_infos - 1].set(1)
+            info_tokens = (jnp.arange(self.max_info_tokens) < new_infos).astype(int)
 
             # increment fireworks if valid play action
             color_fireworks = color_fireworks.at[
@@ -229,50 +320,35 @@ class HanabiGame(MultiAgentEnv):
                 jnp.logical_not(is_valid_play), jnp.logical_not(is_discard)
             ).squeeze(0)
             num_life_tokens = jnp.sum(state.life_tokens).astype(int)
-            life_tokens = state.life_tokens.at[num_life_tokens - 1].set(
-                jnp.logical_not(life_lost)
-            )
+            life_tokens = (
+                jnp.arange(self.max_life_tokens) < num_life_tokens - life_lost
+            ).astype(state.life_tokens.dtype)
 
             # remove knowledge of selected card
-            player_knowledge = state.card_knowledge.at[aidx].get()
-            player_knowledge = jnp.delete(
-                player_knowledge, card_idx, axis=0, assume_unique_indices=True
-            )
-            player_knowledge = jnp.append(
-                player_knowledge,
-                jnp.ones((1, self.num_colors * self.num_ranks)),
-                axis=0,
+            player_knowledge = self._replace_card(
+                state.card_knowledge.at[aidx].get(),
+                card_idx,
+                jnp.ones(self.num_colors * self.num_ranks),
+                hand_size,
             )
             card_knowledge = state.card_knowledge.at[aidx].set(player_knowledge)
             # color hint knowledge removal
-            player_colors_revealed = state.colors_revealed.at[aidx].get()
-            player_colors_revealed = jnp.delete(
-                player_colors_revealed, card_idx, axis=0, assume_unique_indices=True
-            )
-            player_colors_revealed = jnp.append(
-                player_colors_revealed, jnp.zeros((1, self.num_colors)), axis=0
+            player_colors_revealed = self._replace_card(
+                state.colors_revealed.at[aidx].get(), card_idx, 0, hand_size
             )
             colors_revealed = state.colors_revealed.at[aidx].set(player_colors_revealed)
             # rank hint knowledge removal
-            player_ranks_revealed = state.ranks_revealed.at[aidx].get()
-            player_ranks_revealed = jnp.delete(
-                player_ranks_revealed, card_idx, axis=0, assume_unique_indices=True
-            )
-            player_ranks_revealed = jnp.append(
-                player_ranks_revealed, jnp.zeros((1, self.num_ranks)), axis=0
+            player_ranks_revealed = self._replace_card(
+                state.ranks_revealed.at[aidx].get(), card_idx, 0, hand_size
             )
             ranks_revealed = state.ranks_revealed.at[aidx].set(player_ranks_revealed)
 
             # deal a new card
             # check if in last round
             in_last_round = state.last_round_count > 0
-            # deal empty card from top of deck if in last round
-            num_dealt = lax.select(in_last_round, 0, state.num_cards_dealt)
+            # the deck is empty in last round, so this deals an empty card
             new_card = state.deck.at[state.num_cards_dealt].get()
-            hand_without_old = jnp.delete(
-                hand_before, card_idx, axis=0, assume_unique_indices=True
-            )
-            new_hand = jnp.append(hand_without_old, new_card[jnp.newaxis, :, :], axis=0)
+            new_hand = self._replace_card(hand_before, card_idx, new_card, hand_size)
             hands = state.player_hands.at[aidx].set(new_hand)
             deck = state.deck.at[state.num_cards_dealt].set(jnp.zeros_like(card))
             # don't increment if in last round
@@ -303,9 +379,7 @@ class HanabiGame(MultiAgentEnv):
             # get player hint is being given to
             hints_per_player = self.num_colors + self.num_ranks
             hint_player_before = jnp.floor(action_idx / hints_per_player).astype(int)
-            hint_player = ((aidx + 1 + hint_player_before) % self.num_agents).astype(
-                int
-            )
+            hint_player = ((aidx + 1 + hint_player_before) % num_players).astype(int)
             hint_idx = (action_idx % hints_per_player).astype(int)
 
             # define hint as possibilities to remove
@@ -402,7 +476,7 @@ class HanabiGame(MultiAgentEnv):
         game_won = fireworks_after == (self.num_colors * self.num_ranks)
         deck_empty = state.num_cards_dealt >= self.deck_size
         last_round_count = state.last_round_count + deck_empty
-        last_round_done = last_round_count == self.num_agents + 1
+        last_round_done = last_round_count == num_players + 1
         terminal = jnp.logical_or(
             jnp.logical_or(state.out_of_lives, game_won), last_round_done
         )
@@ -412,7 +486,7 @@ class HanabiGame(MultiAgentEnv):
         # bomb-0 scoring
         reward -= out_of_lives * fireworks_after * jnp.logical_not(state.bombed)
         bombed = jnp.logical_or(out_of_lives, state.bombed)
-        aidx = (aidx + 1) % self.num_agents
+        aidx = (aidx + 1) % num_players
 
         cur_player_idx = jnp.zeros(self.num_agents).at[aidx].set(1)
 
@@ -428,3 +502,301 @@ class HanabiGame(MultiAgentEnv):
             ),
             reward,
         )
+
+    def _replace_card(self, cards, card_idx, new_card, hand_size):
+        """Removes the card at `card_idx` from a hand of `hand_size` cards,
+        shifting the newer cards down, and puts `new_card` in its last slot.
+        Slots past the hand size are left untouched."""
+        slots = jnp.arange(self.hand_size)
+        shift = (slots >= card_idx) & (slots < hand_size - 1)
+        return cards[slots + shift].at[hand_size - 1].set(new_card)
+
+    def card_ids(self, cards: chex.Array) -> chex.Array:
+        """Convert one-hot (..., num_colors, num_ranks) cards into int8 card ids"""
+        flat = cards.reshape(cards.shape[:-2] + (self.num_colors * self.num_ranks,))
+        return jnp.where(flat.any(axis=-1), jnp.argmax(flat, axis=-1), -1).astype(
+            jnp.int8
+        )
+
+    @partial(jax.jit, static_argnums=[0])
+    def get_first_state_compact(
+        self, key: chex.PRNGKey, deck: chex.Array, num_players: int = None
+    ) -> CompactState:
+        """Get the initial compact state of the game from a deck of card ids"""
+        if num_players is None:
+            num_players = self.num_agents
+        hands, num_cards_dealt = self._deal_hands(deck, num_players, -1)
+        dealt = jnp.arange(self.deck_size) < num_cards_dealt
+        card_shape = (self.num_agents, self.hand_size)
+
+        return CompactState(
+            deck=jnp.where(dealt, -1, deck).astype(jnp.int8),
+            discard_pile=jnp.full(deck.shape, -1, dtype=jnp.int8),
+            fireworks=jnp.zeros(self.num_colors, dtype=jnp.int8),
+            player_hands=hands.astype(jnp.int8),
+            info_tokens=jnp.int8(self.max_info_tokens),
+            terminal=False,
+            life_tokens=jnp.int8(self.max_life_tokens),
+            card_knowledge=jnp.full(card_shape, self.full_knowledge),
+            colors_revealed=jnp.zeros(card_shape, dtype=jnp.uint8),
+            ranks_revealed=jnp.zeros(card_shape, dtype=jnp.uint8),
+            num_cards_dealt=num_cards_dealt,
+            num_cards_discarded=0,
+            cur_player_idx=0,
+            out_of_lives=False,
+            last_round_count=0,
+            bombed=False,
+            turn=0,
+            score=0,
+            active_agents=self.agent_range < num_players,
+        )
+
+    @partial(jax.jit, static_argnums=[0])
+    def reset_game_compact(self, key: chex.PRNGKey, num_players: int = None) -> CompactState:
+        """Create a random deck and return the first compact state of the game"""
+        if self.variable_num_agents and num_players is None:
+            key, key_players = jax.random.split(key)
+            num_players = self._sample_num_players(key_players)
+        # same shuffle as `reset_game`, so both encode the same deck for a given key
+        colors = jnp.arange(self.num_colors)
+        ranks = jnp.repeat(jnp.arange(self.num_ranks), self.num_cards_of_rank)
+        color_rank_pairs = jnp.dstack(jnp.meshgrid(colors, ranks)).reshape(-1, 2)
+        key, _key = jax.random.split(key)
+        shuffled_pairs = jax.random.permutation(_key, color_rank_pairs, axis=0)
+        deck = shuffled_pairs[:, 0] * self.num_ranks + shuffled_pairs[:, 1]
+
+        return self.get_first_state_compact(key, deck.astype(jnp.int8), num_players)
+
+    @partial(jax.jit, static_argnums=[0])
+    def expand_state(self, state: CompactState) -> State:
+        """Decode a compact state into the one-hot `State` used by the observations"""
+        num_cards = self.num_colors * self.num_ranks
+
+        def _cards(ids):
+            cards = jax.nn.one_hot(ids, num_cards)
+            return cards.reshape(ids.shape + (self.num_colors, self.num_ranks))
+
+        def _bits(mask, num_bits):
+            shifts = jnp.arange(num_bits, dtype=mask.dtype)
+            return ((mask[..., jnp.newaxis] >> shifts) & 1).astype(jnp.float32)
+
+        fireworks = jnp.arange(self.num_ranks) < state.fireworks[:, jnp.newaxis]
+
+        return State(
+            deck=_cards(state.deck),
+            discard_pile=_cards(state.discard_pile),
+            fireworks=fireworks.astype(jnp.float32),
+            player_hands=_cards(state.player_hands),
+            info_tokens=(jnp.arange(self.max_info_tokens) < state.info_tokens).astype(
+                int
+            ),
+            terminal=state.terminal,
+            life_tokens=(jnp.arange(self.max_life_tokens) < state.life_tokens).astype(
+                jnp.float32
+            ),
+            card_knowledge=_bits(state.card_knowledge, num_cards),
+            colors_revealed=_bits(state.colors_revealed, self.num_colors),
+            ranks_revealed=_bits(state.ranks_revealed, self.num_ranks),
+            num_cards_dealt=state.num_cards_dealt,
+            num_cards_discarded=state.num_cards_discarded,
+            cur_player_idx=jax.nn.one_hot(state.cur_player_idx, self.num_agents),
+            out_of_lives=state.out_of_lives,
+            last_round_count=state.last_round_count,
+            bombed=state.bombed,
+            remaining_deck_size=(
+                jnp.arange(self.deck_size) < self.deck_size - state.num_cards_dealt
+            ).astype(jnp.float32),
+            turn=state.turn,
+            score=state.score,
+            active_agents=state.active_agents,
+        )
+
+    @partial(jax.jit, static_argnums=[0])
+    def compress_state(self, state: State) -> CompactState:
+        """Encode a one-hot `State` as a compact state"""
+        num_cards = self.num_colors * self.num_ranks
+
+        def _pack(bits, dtype):
+            shifts = jnp.arange(bits.shape[-1], dtype=dtype)
+            return jnp.sum(bits.astype(dtype) << shifts, axis=-1, dtype=dtype)
+
+        return CompactState(
+            deck=self.card_ids(state.deck),
+            discard_pile=self.card_ids(state.discard_pile),
+            fireworks=jnp.sum(state.fireworks, axis=1).astype(jnp.int8),
+            player_hands=self.card_ids(state.player_hands),
+            info_tokens=jnp.sum(state.info_tokens).astype(jnp.int8),
+            terminal=state.terminal,
+            life_tokens=jnp.sum(state.life_tokens).astype(jnp.int8),
+            card_knowledge=_pack(state.card_knowledge.reshape(
+                state.card_knowledge.shape[:-1] + (num_cards,)
+            ), jnp.uint32),
+            colors_revealed=_pack(state.colors_revealed, jnp.uint8),
+            ranks_revealed=_pack(state.ranks_revealed, jnp.uint8),
+            num_cards_dealt=state.num_cards_dealt,
+            num_cards_discarded=state.num_cards_discarded,
+            cur_player_idx=jnp.argmax(state.cur_player_idx),
+            out_of_lives=state.out_of_lives,
+            last_round_count=state.last_round_count,
+            bombed=state.bombed,
+            turn=state.turn,
+            score=state.score,
+            active_agents=state.active_agents,
+        )
+
+    @partial(jax.jit, static_argnums=[0])
+    def step_game_compact(
+        self,
+        state: CompactState,
+        aidx: int,
+        action: int,
+    ) -> Tuple[CompactState, float]:
+        """
+        Execute the current player's action on a compact state, with the same
+        dynamics as `step_game`
+        """
+        is_discard = action < self.hand_size
+        is_hint = (2 * self.hand_size) <= action
+        num_players = self.get_num_players(state)
+        hand_size = self.get_hand_size(num_players)
+
+        def _discard_play_fn(state, action):
+            """Discard or play selected card according to action selection"""
+            card_idx = jnp.where(is_discard, action, action - self.hand_size)
+            card = state.player_hands[aidx, card_idx]
+            # an empty slot is read as the lowest card of the first color, like in `step_game`
+            color = jnp.where(card >= 0, card // self.num_ranks, 0)
+            rank = jnp.where(card >= 0, card % self.num_ranks, 0)
+
+            # play selected card if play action
+            is_valid_play = rank == state.fireworks[color]
+            make_play = is_valid_play & ~is_discard
+            fireworks = state.fireworks.at[color].add(make_play.astype(jnp.int8))
+
+            # gain an info token for discarding and another one for completing a color
+            is_final_card = is_valid_play & (rank == self.num_ranks - 1)
+            info_tokens = jnp.minimum(
+                state.info_tokens + is_discard + is_final_card, self.max_info_tokens
+            ).astype(jnp.int8)
+
+            # the card must be discarded if action is discard or the play action is not valid
+            discard_card = ~is_valid_play | is_discard
+            discard_pile = state.discard_pile.at[state.num_cards_discarded].set(
+                jnp.where(discard_card, card, -1).astype(jnp.int8)
+            )
+            num_cards_discarded = state.num_cards_discarded + discard_card
+
+            # remove life token if invalid play
+            life_lost = ~is_valid_play & ~is_discard
+            life_tokens = jnp.maximum(state.life_tokens - life_lost, 0).astype(jnp.int8)
+
+            # remove the selected card from the hand, shifting newer cards down
+            def _remove_card(player_cards, new_card):
+                return self._replace_card(player_cards, card_idx, new_card, hand_size)
+
+            # deal a new card, an empty one once the deck is exhausted
+            in_last_round = state.last_round_count > 0
+            new_card = state.deck[state.num_cards_dealt]
+            hands = state.player_hands.at[aidx].set(
+                _remove_card(state.player_hands[aidx], new_card)
+            )
+            deck = state.deck.at[state.num_cards_dealt].set(-1)
+            num_cards_dealt = lax.select(
+                in_last_round, state.num_cards_dealt, state.num_cards_dealt + 1
+            )
+
+            return state.replace(
+                deck=deck,
+                discard_pile=discard_pile,
+                player_hands=hands,
+                card_knowledge=state.card_knowledge.at[aidx].set(
+                    _remove_card(state.card_knowledge[aidx], self.full_knowledge)
+                ),
+                colors_revealed=state.colors_revealed.at[aidx].set(
+                    _remove_card(state.colors_revealed[aidx], 0)
+                ),
+                ranks_revealed=state.ranks_revealed.at[aidx].set(
+                    _remove_card(state.ranks_revealed[aidx], 0)
+                ),
+                fireworks=fireworks,
+                info_tokens=info_tokens,
+                life_tokens=life_tokens,
+                num_cards_dealt=num_cards_dealt,
+                num_cards_discarded=num_cards_discarded,
+            )
+
+        def _hint_fn(state, action):
+            # get effective hint action index
+            action_idx = action - (2 * self.hand_size)
+            hints_per_player = self.num_colors + self.num_ranks
+            hint_player = (aidx + 1 + action_idx // hints_per_player) % num_players
+            hint_idx = action_idx % hints_per_player
+            is_color_hint = hint_idx < self.num_colors
+
+            # check which cards have hinted color/rank
+            cards = state.player_hands[hint_player]
+            card_colors = jnp.where(cards >= 0, cards // self.num_ranks, -1)
+            card_ranks = jnp.where(cards >= 0, cards % self.num_ranks, -1)
+            matches = jnp.where(
+                is_color_hint,
+                card_colors == hint_idx,
+                card_ranks == hint_idx - self.num_colors,
+            )
+
+            # matching cards keep only the hinted color/rank, the others lose it
+            hint_bits = self.hint_bits[hint_idx]
+            knowledge = state.card_knowledge[hint_player]
+            knowledge = jnp.where(matches, knowledge & hint_bits, knowledge & ~hint_bits)
+
+            revealed = jnp.where(
+                is_color_hint, hint_idx, hint_idx - self.num_colors
+            ).astype(jnp.uint8)
+            revealed = jnp.where(matches, jnp.uint8(1) << revealed, jnp.uint8(0))
+            colors_revealed = state.colors_revealed.at[hint_player].set(
+                state.colors_revealed[hint_player] | (revealed * is_color_hint)
+            )
+            ranks_revealed = state.ranks_revealed.at[hint_player].set(
+                state.ranks_revealed[hint_player] | (revealed * ~is_color_hint)
+            )
+
+            # remove an info token
+            info_tokens = jnp.maximum(state.info_tokens - 1, 0).astype(jnp.int8)
+            return state.replace(
+                card_knowledge=state.card_knowledge.at[hint_player].set(knowledge),
+                info_tokens=info_tokens,
+                colors_revealed=colors_revealed,
+                ranks_revealed=ranks_revealed,
+            )
+
+        # update fireworks
+        fireworks_before = jnp.sum(state.fireworks, dtype=jnp.int32)
+        state = lax.cond(is_hint, _hint_fn, _discard_play_fn, state, action)
+        fireworks_after = jnp.sum(state.fireworks, dtype=jnp.int32)
+
+        # check if lives left
+        out_of_lives = state.life_tokens == 0
+
+        # check if terminal
+        game_won = fireworks_after == (self.num_colors * self.num_ranks)
+        deck_empty = state.num_cards_dealt >= self.deck_size
+        last_round_count = state.last_round_count + deck_empty
+        last_round_done = last_round_count == num_players + 1
+        terminal = state.out_of_lives | game_won | last_round_done
+
+        # define reward as difference in fireworks, with bomb-0 scoring
+        reward = jnp.logical_not(out_of_lives) * (fireworks_after - fireworks_before)
+        reward -= out_of_lives * fireworks_after * jnp.logical_not(state.bombed)
+        bombed = jnp.logical_or(out_of_lives, state.bombed)
+
+        return (
+            state.replace(
+                terminal=terminal,
+                cur_player_idx=(aidx + 1) % num_players,
+                out_of_lives=out_of_lives,
+                last_round_count=last_round_count,
+                bombed=bombed,
+                turn=state.turn + 1,
+                score=state.score + reward,
+            ),
+            reward.astype(jnp.float32),
+        )
@@ -1 +1,2 @@
-from .obl_r2d2_agent import OBLAgentR2D2
\ No newline at end of file
+from .obl_r2d2_agent import OBLAgentR2D2, MultiLayerLSTM
+from .obl_r2d2_eval import load_weight_sets, make_obl_evaluation, score_distribution
@@ -0,0 +1,166 @@
+"""
+Batched evaluation of pretrained OBL R2D2 agents.
+
+All the weight sets of a population are stacked along a leading axis, so that
+self-play and cross-play games of every pair of weight sets are played by a
+single jitted `lax.scan`, vmapped over the pairs and over the games.
+"""
+
+import os
+import jax
+from jax import numpy as jnp
+import chex
+from typing import Callable, Dict, List, Tuple, Union
+
+from jaxmarl.environments.hanabi.hanabi import HanabiEnv
+from jaxmarl.environments.hanabi.pretrained.obl_r2d2_agent import OBLAgentR2D2
+from jaxmarl.evaluation import load_population
+
+
+def load_weight_sets(
+    model_dir: Union[str, os.PathLike]
+) -> Tuple[List[str], Dict]:
+    """Loads every `.safetensors` weight set found in `model_dir` and its
+    subdirectories, e.g. the `obl-r2d2-flax` repository, and stacks them
+    along a leading population axis. Returns the names of the weight sets
+    (their paths relative to `model_dir`, without extension) and the params."""
+    paths = sorted(
+        os.path.join(root, f)
+        for root, _, files in os.walk(model_dir)
+        for f in files
+        if f.endswith(".safetensors")
+    )
+    if not paths:
+        raise ValueError(f"No .safetensors weight sets found in {model_dir}")
+    names = [os.path.splitext(os.path.relpath(p, model_dir))[0] for p in paths]
+    return names, load_population(paths)
+
+
+def make_obl_evaluation(
+    env: HanabiEnv,
+    agent: OBLAgentR2D2,
+    num_games: int,
+    max_steps: int = 80,
+) -> Callable:
+    """Builds a jittable function playing populations of OBL agents together.
+
+    The returned function
+
+        evaluate(rng, params0, params1, paired=False)
+
+    plays `num_games` two-player games for every pair of weight sets, with
+    the first player acting greedily with `params0` and the second with
+    `params1`, both stacked along a leading population axis. It returns the
+    score of the first game in each environment, with shape
+    `(num_params0, num_params1, num_games)`. With `paired=True` the i-th
+    weight set of `params0` only plays the i-th of `params1`, e.g. for
+    self-play, and the result is `(num_params, num_games)`. The same deck
+    and env keys are used for every pair, so scores of different pairs are
+    compared on the same games. Games still running after `max_steps` are
+    scored with the points made so far.
+    """
+    assert env.num_agents == 2, "OBL agents were trained for 2-player Hanabi"
+
+    def _act(params, carry, obs, legal_moves):
+        carry, adv = agent.apply(params, carry, (obs, obs[..., 125:]))
+        legal_adv = (1 + adv - adv.min(axis=-1, keepdims=True)) * legal_moves
+        return carry, jnp.argmax(legal_adv, axis=-1)
+
+    def play(rng, params0, params1):
+        rng, _rng = jax.random.split(rng)
+        obs, env_state = jax.vmap(env.reset_array)(jax.random.split(_rng, num_games))
+        # one carry per player, batched over the games
+        carry = agent.initialize_carry(jax.random.PRNGKey(0), batch_dims=(2, num_games))
+
+        def _env_step(step_carry, unused):
+            obs, env_state, carry, scores, active, rng = step_carry
+            legal_moves = jax.vmap(
+                lambda s: env.stack_agents(env.get_legal_moves(s))
+            )(env_state)
+            # [game, player, ...] -> [player, game, ...]
+            obs, legal_moves = jnp.swapaxes(obs, 0, 1), jnp.swapaxes(legal_moves, 0, 1)
+            carry0, action0 = _act(
+                params0, jax.tree_map(lambda x: x[:, 0], carry), obs[0], legal_moves[0]
+            )
+            carry1, action1 = _act(
+                params1, jax.tree_map(lambda x: x[:, 1], carry), obs[1], legal_moves[1]
+            )
+            carry = jax.tree_map(lambda x, y: jnp.stack([x, y], axis=1), carry0, carry1)
+            actions = jnp.stack([action0, action1], axis=-1)
+
+            rng, _rng = jax.random.split(rng)
+            obs, env_state, rewards, dones, _ = jax.vmap(env.step_array)(
+                jax.random.split(_rng, num_games), env_state, actions
+            )
+            scores = scores + rewards[:, 0] * active
+            active = active & ~dones[:, -1]
+            return (obs, env_state, carry, scores, active, rng), None
+
+        step_carry = (
+            obs,
+            env_state,
+            carry,
+            jnp.zeros((num_games,)),
+            jnp.ones((num_games,), dtype=bool),
+            rng,
+        )
+        (_, _, _, scores, _, _), _ = jax.lax.scan(
+            _env_step, step_carry, None, max_steps
+        )
+        return scores
+
+    def evaluate(rng, params0, params1, paired=False):
+        if paired:
+            return jax.vmap(play, in_axes=(None, 0, 0))(rng, params0, params1)
+        over_params1 = jax.vmap(play, in_axes=(None, None, 0))
+        return jax.vmap(over_params1, in_axes=(None, 0, None))(rng, params0, params1)
+
+    return evaluate
+
+
+def score_distribution(scores: chex.Array, max_score: int = 25) -> Dict[str, chex.Array]:
+    """Summarises the scores of the games of each pair along the last axis:
+    their mean, standard error, fraction of perfect games and histogram over
+    `0..max_score`."""
+    num_games = scores.shape[-1]
+    hist = jax.nn.one_hot(jnp.round(scores).astype(jnp.int32), max_score + 1).sum(-2)
+    return {
+        "mean": scores.mean(-1),
+        "sem": scores.std(-1, ddof=1) / jnp.sqrt(num_games),
+        "perfect": (scores >= max_score).mean(-1),
+        "histogram": hist,
+    }
+
+
+def main():
+    import argparse
+    from jaxmarl import make
+    from jaxmarl.evaluation import cross_play_table, save_cross_play_table
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model_dir", default="./obl-r2d2-flax")
+    parser.add_argument("--num_games", type=int, default=1000)
+    parser.add_argument("--max_steps", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="csv file for the per-game scores")
+    args = parser.parse_args()
+
+    names, params = load_weight_sets(args.model_dir)
+    evaluate = jax.jit(
+        make_obl_evaluation(make("hanabi"), OBLAgentR2D2(), args.num_games, args.max_steps)
+    )
+    scores = evaluate(jax.random.PRNGKey(args.seed), params, params)
+    stats = score_distribution(scores)
+
+    for i, name0 in enumerate(names):
+        for j, name1 in enumerate(names):
+            print(
+                f"{name0} + {name1}: {stats['mean'][i, j]:.2f} "
+                f"± {stats['sem'][i, j]:.2f} (perfect {stats['perfect'][i, j]:.1%})"
+            )
+    if args.output is not None:
+        save_cross_play_table(cross_play_table(scores, names, names), args.output)
+
+
+if __name__ == "__main__":
+    main()
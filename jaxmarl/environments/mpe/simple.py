@@ -9,6 +9,7 @@ import jax.numpy as jnp
 import numpy as onp
 from jaxmarl.environments.multi_agent_env import MultiAgentEnv
 from jaxmarl.environments.mpe.default_params import *
+from jaxmarl.environments.smax.neighbors import UniformGrid
 import chex
 from gymnax.environments.spaces import Box, Discrete
 from flax import struct
@@ -225,6 +226,41 @@ class SimpleMPE(MultiAgentEnv):
         else:
             self.contact_margin = CONTACT_MARGIN
 
+        # Collision kernel, entities that never collide are dropped statically.
+        # `collision_mode="dense"` (default) evaluates every colliding pair.
+        # `collision_mode="cell_list"` only evaluates pairs found in a uniform
+        # grid spanning `[-grid_extent / 2, grid_extent / 2]` on both axes
+        # (default 4.0), entities outside it are counted in the edge cells.
+        # Each entity considers at most `max_neighbors` candidates (itself
+        # included), by default as many non-overlapping entities as fit in
+        # the 3x3 cells around it. The forces match the dense mode unless an
+        # entity has more candidates than that, e.g. when many entities are
+        # stacked or pushed past the grid edge; such steps are flagged per
+        # colliding entity in `info["collision_overflow"]`.
+        self.colliding = onp.flatnonzero(onp.asarray(self.collide))
+        self.collision_pairs = onp.triu_indices(len(self.colliding), k=1)
+        self.collision_mode = kwargs.get("collision_mode", "dense")
+        if self.collision_mode == "cell_list":
+            # beyond this distance the softmax penetration is below
+            # contact_margin * exp(-20) and treated as zero
+            rad = onp.asarray(self.rad)[self.colliding]
+            cutoff = 2 * float(rad.max()) + 20 * self.contact_margin
+            grid_extent = kwargs.get("grid_extent", 4.0)
+            max_neighbors = kwargs.get("max_neighbors")
+            if max_neighbors is None:
+                block_size = min(3 * cutoff, grid_extent) + 2 * float(rad.min())
+                max_neighbors = int(
+                    onp.ceil(block_size**2 / (2 * onp.sqrt(3) * float(rad.min()) ** 2))
+                )
+            self.collision_grid = UniformGrid(
+                grid_extent,
+                grid_extent,
+                cutoff,
+                min(max_neighbors, len(self.colliding)),
+            )
+        elif self.collision_mode != "dense":
+            raise ValueError(f"Unknown collision mode: {self.collision_mode}")
+
     @partial(jax.jit, static_argnums=[0])
     def step_env(self, key: chex.PRNGKey, state: State, actions: dict):
         u, c = self.set_actions(actions)
@@ -237,6 +273,10 @@ class SimpleMPE(MultiAgentEnv):
 
         key, key_w = jax.random.split(key)
         p_pos, p_vel = self._world_step(key_w, state, u)
+        info = {}
+        if self.collision_mode == "cell_list":
+            # the collision forces are computed from the positions before the step
+            info["collision_overflow"] = self.collision_overflow(state)
 
         key_c = jax.random.split(key, self.num_agents)
         c = self._apply_comm_action(key_c, c, self.c_noise, self.silent)
@@ -254,8 +294,6 @@ class SimpleMPE(MultiAgentEnv):
 
         obs = self.get_obs(state)
 
-        info = {}
-
         dones = {a: done[i] for i, a in enumerate(self.agents)}
         dones.update({"__all__": jnp.all(done)})
 
@@ -391,32 +429,47 @@ class SimpleMPE(MultiAgentEnv):
 
     def _apply_environment_force(self, p_force_all: chex.Array, state: State):
         """gather physical forces acting on entities"""
+        if len(self.colliding) < 2:
+            return p_force_all
 
-        @partial(jax.vmap, in_axes=[0])
-        def __env_force_outer(idx: int):
-            @partial(jax.vmap, in_axes=[None, 0])
-            def __env_force_inner(idx_a: int, idx_b: int):
-                l = idx_b <= idx_a
-                l_a = jnp.zeros((2, 2))
-
-                collision_force = self._get_collision_force(idx_a, idx_b, state)
-
-                xx = jax.lax.select(l, l_a, collision_force)
-                # jax.debug.print('{a} {b} {f}', a=idx_a, b=idx_b, f=xx)
-                return xx
-
-            p_force_t = __env_force_inner(idx, self.entity_range)
-
-            p_force_a = jnp.sum(p_force_t[:, 0], axis=0)  # ego force from other agents
-            p_force_o = p_force_t[:, 1]
-            p_force_o = p_force_o.at[idx].set(p_force_a)
+        p_pos = state.p_pos[self.colliding]
+        rad = self.rad[self.colliding]
+        if self.collision_mode == "cell_list":
+            p_forces = self._collision_forces_cell_list(p_pos, rad)
+        else:
+            p_forces = self._collision_forces_pairs(p_pos, rad)
+        p_forces = p_forces * self.moveable[self.colliding, None]
 
-            return p_force_o
+        return p_force_all.at[self.colliding].add(p_forces)
 
-        p_forces = __env_force_outer(self.entity_range)
-        p_forces = jnp.sum(p_forces, axis=0)
+    def _collision_forces_pairs(self, p_pos: chex.Array, rad: chex.Array):
+        """collision forces from every colliding pair, each pair computed once"""
+        idx_a, idx_b = self.collision_pairs
+        force = self._get_collision_force(
+            p_pos[idx_a] - p_pos[idx_b], rad[idx_a] + rad[idx_b]
+        )
+        return jnp.zeros_like(p_pos).at[idx_a].add(force).at[idx_b].add(-force)
+
+    def collision_overflow(self, state: State) -> chex.Array:
+        """Flags the colliding entities that have more than `max_neighbors`
+        candidates in the collision grid, so their forces are incomplete.
+        Only available with `collision_mode="cell_list"`."""
+        return self.collision_grid.overflow(
+            state.p_pos[self.colliding] + self.collision_grid.map_width / 2
+        )
 
-        return p_forces + p_force_all
+    def _collision_forces_cell_list(self, p_pos: chex.Array, rad: chex.Array):
+        """collision forces from the neighbours found in a uniform grid"""
+        num_colliding = len(self.colliding)
+        neighbor_idx, neighbor_mask, _ = self.collision_grid.neighbors(
+            p_pos + self.collision_grid.map_width / 2
+        )
+        neighbor_mask &= neighbor_idx != jnp.arange(num_colliding)[:, None]
+        neighbor_idx = jnp.minimum(neighbor_idx, num_colliding - 1)
+        force = self._get_collision_force(
+            p_pos[:, None] - p_pos[neighbor_idx], rad[:, None] + rad[neighbor_idx]
+        )
+        return jnp.sum(jnp.where(neighbor_mask[..., None], force, 0.0), axis=1)
 
     @partial(jax.vmap, in_axes=[None, 0, 0, 0, 0, 0, 0])
     def _integrate_state(self, p_force, p_pos, p_vel, mass, moveable, max_speed):
@@ -437,23 +490,14 @@ class SimpleMPE(MultiAgentEnv):
         return p_pos, p_vel
 
     # get collision forces for any contact between two entities BUG
-    def _get_collision_force(self, idx_a: int, idx_b: int, state: State):
-        dist_min = self.rad[idx_a] + self.rad[idx_b]
-        delta_pos = state.p_pos[idx_a] - state.p_pos[idx_b]
-
-        dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos)))
+    def _get_collision_force(self, delta_pos: chex.Array, dist_min: chex.Array):
+        """force on the first entity of each pair, the second gets its negation"""
+        dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos), axis=-1))
 
         # softmax penetration
         k = self.contact_margin
         penetration = jnp.logaddexp(0, -(dist - dist_min) / k) * k
-        force = self.contact_force * delta_pos / dist * penetration
-        force_a = +force * self.moveable[idx_a]
-        force_b = -force * self.moveable[idx_b]
-        force = jnp.array([force_a, force_b])
-
-        c = (~self.collide[idx_a]) | (~self.collide[idx_b]) | (idx_a == idx_b)
-        c_force = jnp.zeros((2, 2))
-        return jax.lax.select(c, c_force, force)
+        return self.contact_force * delta_pos * (penetration / dist)[..., None]
 
     def create_agent_classes(self):
         if hasattr(self, "leader"):
@@ -8,12 +8,12 @@ from gymnax.environments.spaces import Box
 from jaxmarl.environments.mpe.default_params import *
 
 
-SimpleFacmacMPE3a = lambda: SimpleFacmacMPE(num_good_agents=1, num_adversaries=3, num_landmarks=2,
-                            view_radius=1.5, score_function="min")
-SimpleFacmacMPE6a = lambda: SimpleFacmacMPE(num_good_agents=2, num_adversaries=6, num_landmarks=4,
-                            view_radius=1.5, score_function="min")
-SimpleFacmacMPE9a = lambda: SimpleFacmacMPE(num_good_agents=3, num_adversaries=9, num_landmarks=6,
-                            view_radius=1.5, score_function="min")
+SimpleFacmacMPE3a = lambda **kwargs: SimpleFacmacMPE(num_good_agents=1, num_adversaries=3, num_landmarks=2,
+                            view_radius=1.5, score_function="min", **kwargs)
+SimpleFacmacMPE6a = lambda **kwargs: SimpleFacmacMPE(num_good_agents=2, num_adversaries=6, num_landmarks=4,
+                            view_radius=1.5, score_function="min", **kwargs)
+SimpleFacmacMPE9a = lambda **kwargs: SimpleFacmacMPE(num_good_agents=3, num_adversaries=9, num_landmarks=6,
+                            view_radius=1.5, score_function="min", **kwargs)
 
 class SimpleFacmacMPE(SimpleMPE):
     def __init__(
@@ -22,8 +22,13 @@ class SimpleFacmacMPE(SimpleMPE):
         num_adversaries=3,
         num_landmarks=2,
         view_radius=1.5,  # set -1 to deactivate
-        score_function="sum"
+        score_function="sum",
+        num_prey_candidates=100,
+        **kwargs,
     ):
+        if score_function not in ("sum", "min"):
+            raise Exception("Unknown score function {}".format(score_function))
+
         dim_c = 2  # NOTE follows code rather than docs
         action_type = CONTINUOUS_ACT
         view_radius = view_radius if view_radius != -1 else 999999
@@ -80,6 +85,7 @@ class SimpleFacmacMPE(SimpleMPE):
             accel=accel,
             max_speed=max_speed,
             collide=collide,
+            **kwargs,
         )
 
         # Overwrite action and observation spaces
@@ -97,6 +103,7 @@ class SimpleFacmacMPE(SimpleMPE):
         )
 
         self.score_function = score_function
+        self.num_prey_candidates = num_prey_candidates
 
     def rewards(self, state: State) -> Dict[str, float]:
         @partial(jax.vmap, in_axes=(0, None))
@@ -130,13 +137,10 @@ class SimpleFacmacMPE(SimpleMPE):
         )
         return rew
 
+    @partial(jax.vmap, in_axes=[None, 0, None, 0])
     def _prey_policy(self, key: chex.PRNGKey, state: State, aidx: int):
-        action = None
-        n = 100  # number of positions sampled
+        n = self.num_prey_candidates  # number of positions sampled
         # sample actions randomly from a target circle
-        # length = jnp.sqrt(jnp.random.uniform(0, 1, n))
-        # angle = jnp.pi * jnp.random.uniform(0, 2, n)
-
         key, _key = jax.random.split(key)
         length = jnp.sqrt(jax.random.uniform(_key, (n,), minval=0., maxval=1.))
         key, _key = jax.random.split(key)
@@ -146,22 +150,26 @@ class SimpleFacmacMPE(SimpleMPE):
 
         # evaluate score for each position
         # check whether positions are reachable
-        # sample a few evenly spaced points on the way and see if they collide with anything
-        scores = jnp.zeros(n, dtype=jnp.float32)
-        n_iter = 5
         if self.score_function == "sum":
-            for i in range(n_iter):
-                waypoints_length = (length / float(n_iter)) * (i + 1)
-                x_wp = waypoints_length * jnp.cos(angle)
-                y_wp = waypoints_length * jnp.sin(angle)
-                proj_pos = jnp.vstack((x_wp, y_wp)).transpose() + state.p_pos[aidx]
-                delta_pos = state.p_pos[None, :, :] - proj_pos[:, None, :]
-                dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos), axis=2))
-                dist_min = self.rad + self.rad[aidx]
-                scores = jnp.where((dist < dist_min[None]).sum(axis=1), scores, -9999999)
-                if i == n_iter - 1:
-                    scores += dist[:, :self.num_adversaries].sum(axis=1)
+            # sample a few evenly spaced points on the way and see if they
+            # collide with anything, all waypoints at once: [waypoint, n, 2]
+            n_iter = 5
+            fractions = jnp.arange(1, n_iter + 1) / float(n_iter)
+            proj_pos = (
+                fractions[:, None, None] * jnp.stack([x, y], axis=-1)[None]
+                + state.p_pos[aidx]
+            )
+            delta_pos = state.p_pos[None, None, :, :] - proj_pos[:, :, None, :]
+            dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos), axis=-1))
+            dist_min = self.rad + self.rad[aidx]
+            # as in the original per-waypoint loop, a candidate keeps its score
+            # only if every waypoint overlaps some entity (the prey itself
+            # included), all others are ruled out
+            all_waypoints_collide = jnp.all((dist < dist_min).any(axis=-1), axis=0)
+            scores = jnp.where(all_waypoints_collide, 0.0, -9999999.0)
+            scores += dist[-1, :, :self.num_adversaries].sum(axis=1)
         elif self.score_function == "min":
+            scores = jnp.zeros(n, dtype=jnp.float32)
             proj_pos = jnp.vstack((x, y)).transpose() + state.p_pos[aidx]
             rel_dis = jnp.sqrt(jnp.sum(jnp.square(state.p_pos[aidx] - state.p_pos[:self.num_adversaries])))
             min_dist_adv_idx = jnp.argmin(rel_dis)
@@ -170,22 +178,23 @@ class SimpleFacmacMPE(SimpleMPE):
             dist_min = self.rad[:self.num_adversaries] + self.rad[aidx]
             scores = jnp.where((dist < dist_min[None]).sum(axis=1), scores, -9999999)
             scores += dist[:, min_dist_adv_idx]
-        else:
-            raise Exception("Unknown score function {}".format(self.score_function))
         # move to best position
         best_idx = jnp.argmax(scores)
         chosen_action = jnp.array([x[best_idx], y[best_idx]], dtype=jnp.float32)
-        chosen_action = jax.lax.cond(scores[best_idx] < 0, lambda: chosen_action*0.0, lambda: chosen_action)
+        chosen_action = jax.lax.select(scores[best_idx] < 0, chosen_action*0.0, chosen_action)
         return chosen_action
 
     @partial(jax.jit, static_argnums=[0])
     def step_env(self, key: chex.PRNGKey, state: State, actions: dict):
         u, c = self.set_actions(actions)
         # we throw away num_good_agents now, as num_agents does not differentiate between active and passive agents
-        u = u[:-self.num_good_agents]
-        for i in range(self.num_good_agents):
-            prey_action = self._prey_policy(key, state, u.shape[0]-1+i)
-            u = jnp.concatenate([u, prey_action[None]], axis=0)
+        key, key_prey = jax.random.split(key)
+        prey_actions = self._prey_policy(
+            jax.random.split(key_prey, self.num_good_agents),
+            state,
+            jnp.arange(self.num_good_agents) + self.num_adversaries,
+        )
+        u = jnp.concatenate([u[:-self.num_good_agents], prey_actions], axis=0)
         if (
             c.shape[1] < self.dim_c
         ):  # This is due to the MPE code carrying around 0s for the communication channels, and due to added prey
@@ -195,6 +204,10 @@ class SimpleFacmacMPE(SimpleMPE):
 
         key, key_w = jax.random.split(key)
         p_pos, p_vel = self._world_step(key_w, state, u)
+        info = {}
+        if self.collision_mode == "cell_list":
+            # the collision forces are computed from the positions before the step
+            info["collision_overflow"] = self.collision_overflow(state)
 
         key_c = jax.random.split(key, self.num_agents)
         c = self._apply_comm_action(key_c, c, self.c_noise, self.silent)
@@ -211,8 +224,6 @@ class SimpleFacmacMPE(SimpleMPE):
         reward = self.rewards(state)
         obs = self.get_obs(state)
 
-        info = {}
-
         dones = {a: done[i] for i, a in enumerate(self.agents)}
         dones.update({"__all__": jnp.all(done)})
 
@@ -11,6 +11,7 @@ import chex
 from functools import partial
 from flax import struct
 from typing import Tuple, Optional
+from .reset_pool import ResetPool
 
 
 @struct.dataclass
@@ -22,6 +23,11 @@ class State:
 class MultiAgentEnv(object):
     """Jittable abstract base class for all jaxmarl Environments."""
 
+    # How `step` resets finished episodes, see `set_reset_mode`. Set on the
+    # class so that environments which do not call `__init__` still get them.
+    reset_mode = "eager"
+    reset_pool = None
+
     def __init__(
         self,
         num_agents: int,
@@ -38,28 +44,134 @@ class MultiAgentEnv(object):
         """Performs resetting of the environment."""
         raise NotImplementedError
 
-    @partial(jax.jit, static_argnums=(0,))
     def step(
         self,
         key: chex.PRNGKey,
         state: State,
         actions: Dict[str, chex.Array],
+        reset_pool: Optional[ResetPool] = None,
     ) -> Tuple[Dict[str, chex.Array], State, Dict[str, float], Dict[str, bool], Dict]:
-        """Performs step transitions in the environment."""
+        """Performs step transitions in the environment.
+
+        In the "pool" reset mode, finished episodes are reset from
+        `reset_pool`, which defaults to the environment's own pool. The pool
+        is passed to the compiled step as an argument, so a training loop can
+        carry and refresh it without recompiling.
+        """
+        if reset_pool is None:
+            reset_pool = self.reset_pool
+        return self._step(key, state, actions, reset_pool)
 
+    @partial(jax.jit, static_argnums=(0,))
+    def _step(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: Dict[str, chex.Array],
+        reset_pool: Optional[ResetPool],
+    ) -> Tuple[Dict[str, chex.Array], State, Dict[str, float], Dict[str, bool], Dict]:
         key, key_reset = jax.random.split(key)
         obs_st, states_st, rewards, dones, infos = self.step_env(key, state, actions)
 
-        obs_re, states_re = self.reset(key_reset)
+        if self.reset_mode == "deferred":
+            return obs_st, states_st, rewards, dones, infos
 
         # Auto-reset environment based on termination
+        obs, states = self.reset_done(
+            key_reset, obs_st, states_st, dones["__all__"], reset_pool
+        )
+        return obs, states, rewards, dones, infos
+
+    def set_reset_mode(
+        self, mode: str, key: Optional[chex.PRNGKey] = None, pool_size: int = 64
+    ) -> None:
+        """Selects how `step` and `step_array` reset finished episodes.
+
+        - "eager": compute a fresh `reset` on every step and select it where
+          the episode is done. This is the default.
+        - "pool": pre-generate `pool_size` initial states from `key` once and
+          sample one of them on every step, so the per-step reset cost is a
+          gather instead of a full `reset`.
+        - "deferred": never reset inside `step`. Finished episodes keep
+          stepping from their terminal state until the caller resets them with
+          `reset_done`, typically at rollout-chunk boundaries. Transitions
+          after an episode's first done are then not valid and must be masked.
+
+        Must be called before the environment's methods are first traced.
+        Environments that replace `step` with their own function do not go
+        through these modes and raise an error.
+        """
+        if mode not in ("eager", "pool", "deferred"):
+            raise ValueError(f"Unknown reset mode: {mode}")
+        if (
+            type(self).step is not MultiAgentEnv.step
+            or type(self).step_array is not MultiAgentEnv.step_array
+            or "step" in self.__dict__
+        ):
+            raise ValueError(
+                f"{type(self).__name__} overrides step, so it does not support "
+                "reset modes"
+            )
+        if mode == "pool":
+            if key is None:
+                raise ValueError("A key is needed to generate the reset pool")
+            self.reset_pool = ResetPool.create(self, key, pool_size)
+        else:
+            self.reset_pool = None
+        self.reset_mode = mode
+
+    def sample_reset(
+        self, key: chex.PRNGKey, pool: Optional[ResetPool] = None
+    ) -> Tuple[Dict[str, chex.Array], State]:
+        """Returns an initial `(obs, state)`, drawn from `pool` when it is
+        given and computed with `reset` otherwise."""
+        if pool is None:
+            return self.reset(key)
+        return pool.sample(key)
+
+    @partial(jax.jit, static_argnums=(0,))
+    def reset_done(
+        self,
+        key: chex.PRNGKey,
+        obs: Dict[str, chex.Array],
+        state: State,
+        done: chex.Array,
+        pool: Optional[ResetPool] = None,
+    ) -> Tuple[Dict[str, chex.Array], State]:
+        """Replaces `(obs, state)` with an initial one where `done` is set.
+
+        Passing a `ResetPool` draws the initial state from it, which lets a
+        training loop carry and refresh its own pool in the deferred mode.
+        The environment's own pool is not used here, pass `env.reset_pool` to
+        draw from it.
+        """
+        obs_re, states_re = self.sample_reset(key, pool)
         states = jax.tree_map(
-            lambda x, y: jax.lax.select(dones["__all__"], x, y), states_re, states_st
+            lambda x, y: jax.lax.select(done, x, y), states_re, state
         )
-        obs = jax.tree_map(
-            lambda x, y: jax.lax.select(dones["__all__"], x, y), obs_re, obs_st
+        obs = jax.tree_map(lambda x, y: jax.lax.select(done, x, y), obs_re, obs)
+        return obs, states
+
+    @partial(jax.jit, static_argnums=(0,))
+    def reset_done_array(
+        self,
+        key: chex.PRNGKey,
+        obs: chex.Array,
+        state: State,
+        done: chex.Array,
+        pool: Optional[ResetPool] = None,
+    ) -> Tuple[chex.Array, State]:
+        """`reset_done` on agent-major observation arrays."""
+        if pool is None:
+            obs_re, states_re = self.reset_array(key)
+        else:
+            obs_re, states_re = self.sample_reset(key, pool)
+            obs_re = self.stack_agents(obs_re)
+        states = jax.tree_map(
+            lambda x, y: jax.lax.select(done, x, y), states_re, state
         )
-        return obs, states, rewards, dones, infos
+        obs = jax.lax.select(done, obs_re, obs)
+        return obs, states
 
     def step_env(
         self, key: chex.PRNGKey, state: State, actions: Dict[str, chex.Array]
@@ -67,6 +179,97 @@ class MultiAgentEnv(object):
         """Environment-specific step transition."""
         raise NotImplementedError
 
+    @partial(jax.jit, static_argnums=(0,))
+    def reset_array(self, key: chex.PRNGKey) -> Tuple[chex.Array, State]:
+        """Performs resetting of the environment, returning the observations
+        stacked along a leading agent axis in `self.agents` order."""
+        obs, state = self.reset(key)
+        return self.stack_agents(obs), state
+
+    def step_array(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: chex.Array,
+        reset_pool: Optional[ResetPool] = None,
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        """Performs step transitions in the environment on agent-major arrays.
+
+        `actions` and the returned observations and rewards are stacked along a
+        leading agent axis in `self.agents` order. The returned dones have
+        `num_agents + 1` entries, the last one being the episode-level
+        `"__all__"` done. `reset_pool` is handled as in `step`.
+        """
+        if reset_pool is None:
+            reset_pool = self.reset_pool
+        return self._step_array(key, state, actions, reset_pool)
+
+    @partial(jax.jit, static_argnums=(0,))
+    def _step_array(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: chex.Array,
+        reset_pool: Optional[ResetPool],
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        key, key_reset = jax.random.split(key)
+        obs_st, states_st, rewards, dones, infos = self.step_env_array(
+            key, state, actions
+        )
+
+        if self.reset_mode == "deferred":
+            return obs_st, states_st, rewards, dones, infos
+
+        # Auto-reset environment based on termination
+        obs, states = self.reset_done_array(
+            key_reset, obs_st, states_st, dones[-1], reset_pool
+        )
+        return obs, states, rewards, dones, infos
+
+    def step_env_array(
+        self, key: chex.PRNGKey, state: State, actions: chex.Array
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        """Environment-specific step transition on agent-major arrays.
+
+        By default this stacks the outputs of `step_env`. Environments that
+        compute their outputs as arrays override it and implement `step_env`
+        as a view over it instead.
+        """
+        obs, state, rewards, dones, infos = self.step_env(
+            key, state, self.unstack_agents(actions)
+        )
+        return (
+            self.stack_agents(obs),
+            state,
+            self.stack_agents(rewards),
+            self.stack_dones(dones),
+            infos,
+        )
+
+    def stack_agents(self, x: Dict[str, chex.Array]) -> chex.Array:
+        """Stacks per-agent values in `self.agents` order. Flat values of
+        different lengths, e.g. heterogeneous observations, are zero-padded
+        to the longest one."""
+        values = [jnp.asarray(x[a]) for a in self.agents]
+        if len(set(v.shape for v in values)) > 1:
+            max_len = max(v.size for v in values)
+            values = [jnp.pad(v.ravel(), (0, max_len - v.size)) for v in values]
+        return jnp.stack(values)
+
+    def unstack_agents(self, x: chex.Array) -> Dict[str, chex.Array]:
+        """Inverse of `stack_agents` for equally shaped per-agent values."""
+        return {a: x[i] for i, a in enumerate(self.agents)}
+
+    def stack_dones(self, dones: Dict[str, bool]) -> chex.Array:
+        """Stacks per-agent dones followed by the `"__all__"` done."""
+        return jnp.append(self.stack_agents(dones), dones["__all__"])
+
+    def unstack_dones(self, dones: chex.Array) -> Dict[str, bool]:
+        """Inverse of `stack_dones`."""
+        dones_dict = self.unstack_agents(dones[:-1])
+        dones_dict["__all__"] = dones[-1]
+        return dones_dict
+
     def get_obs(self, state: State) -> Dict[str, chex.Array]:
         """Applies observation function to state."""
         raise NotImplementedError
@@ -0,0 +1,47 @@
+import chex
+import numpy as np
+import jax.numpy as jnp
+from typing import Sequence
+
+
+class ObsPacking:
+    """Packs the channels (last axis) of mostly binary grid observations.
+
+    Binary channels are bit-packed, eight per uint8, and the channels listed
+    in `int_channels`, whose values must fit in a uint8, are kept as is, e.g.
+    a 26-channel Overcooked observation with 3 small-int channels packs into
+    6 uint8 channels. `unpack` is a single gather followed by elementwise ops,
+    so under jit it fuses into the first layer of the network consuming the
+    observations, and rollout buffers can store the packed observations.
+    """
+
+    def __init__(self, num_channels: int, int_channels: Sequence[int] = ()):
+        self.num_channels = num_channels
+        self.int_channels = np.asarray(int_channels, dtype=np.int32)
+        self.binary_channels = np.setdiff1d(np.arange(num_channels), self.int_channels)
+        self.num_bytes = -(-len(self.binary_channels) // 8)
+        self.num_packed_channels = self.num_bytes + len(self.int_channels)
+
+        # channel c of the unpacked obs is (packed[..., source[c]] >> shift[c]) & mask[c]
+        source = np.zeros(num_channels, dtype=np.int32)
+        shift = np.zeros(num_channels, dtype=np.uint8)
+        mask = np.full(num_channels, 0xFF, dtype=np.uint8)
+        source[self.binary_channels] = np.arange(len(self.binary_channels)) // 8
+        shift[self.binary_channels] = np.arange(len(self.binary_channels)) % 8
+        mask[self.binary_channels] = 1
+        source[self.int_channels] = self.num_bytes + np.arange(len(self.int_channels))
+        self.source, self.shift, self.mask = source, shift, mask
+
+    def pack(self, obs: chex.Array) -> chex.Array:
+        """Packs `(..., num_channels)` observations into `(..., num_packed_channels)` uint8."""
+        bits = obs[..., self.binary_channels].astype(jnp.uint8)
+        pad = 8 * self.num_bytes - bits.shape[-1]
+        bits = jnp.pad(bits, [(0, 0)] * (bits.ndim - 1) + [(0, pad)])
+        bits = bits.reshape(*bits.shape[:-1], self.num_bytes, 8)
+        packed = (bits << np.arange(8, dtype=np.uint8)).sum(-1, dtype=jnp.uint8)
+        return jnp.concatenate([packed, obs[..., self.int_channels].astype(jnp.uint8)], axis=-1)
+
+    def unpack(self, packed: chex.Array, dtype=jnp.float32) -> chex.Array:
+        """Recovers the `(..., num_channels)` observations from packed ones."""
+        channels = jnp.take(packed.astype(jnp.uint8), self.source, axis=-1)
+        return ((channels >> self.shift) & self.mask).astype(dtype)
@@ -19,6 +19,7 @@ from jaxmarl.environments.overcooked.common import (
     DIR_TO_VEC,
     make_overcooked_map)
 from jaxmarl.environments.overcooked.layouts import overcooked_layouts as layouts
+from jaxmarl.environments.obs_packing import ObsPacking
 
 
 class Actions(IntEnum):
@@ -44,6 +45,7 @@ class State:
     maze_map: chex.Array
     time: int
     terminal: bool
+    layout_idx: int = 0
 
 
 # Pot status indicated by an integer, which ranges from 23 to 0
@@ -55,23 +57,60 @@ MAX_ONIONS_IN_POT = 3 # A pot has at most 3 onions. A soup contains exactly 3 on
 URGENCY_CUTOFF = 40 # When this many time steps remain, the urgency layer is flipped on
 DELIVERY_REWARD = 20
 
+# Observation channels, see `Overcooked.get_obs_array`
+NUM_OBS_CHANNELS = 26
+TOMATO_CHANNELS = (13, 17, 19, 24)
+STATIC_CHANNELS = {10: "pot_idx", 12: "onion_pile_idx", 14: "plate_pile_idx", 15: "goal_idx"}
+INT_CHANNELS = (16, 18, 20) # The other channels are binary
+# Agent channels of each agent: the agent they describe, and the direction they encode (-1 for positions)
+AGENT_CHANNEL_OWNER = np.array([[0, 1, 0, 0, 0, 0, 1, 1, 1, 1], [1, 0, 1, 1, 1, 1, 0, 0, 0, 0]])
+AGENT_CHANNEL_DIR = np.array([-1, -1, 0, 1, 2, 3, 0, 1, 2, 3])
+
 
 class Overcooked(MultiAgentEnv):
-    """Vanilla Overcooked"""
+    """Vanilla Overcooked
+
+    `layout` is either a single layout or a sequence of layouts. With several
+    layouts, they are padded with walls to a common height and width, every
+    `reset` samples one of them (or uses `layout_idx` when given) and
+    `State.layout_idx` records which one is played, so that a single compiled
+    environment can be vmapped over a mix of layouts.
+    """
     def __init__(
             self,
             layout = FrozenDict(layouts["cramped_room"]),
             random_reset: bool = False,
             max_steps: int = 400,
+            tomato_channels: bool = True,
+            packed_obs: bool = False,
     ):
         # Sets self.num_agents to 2
         super().__init__(num_agents=2)
 
+        if isinstance(layout, (list, tuple)):
+            self.layouts = tuple(layout)
+        else:
+            self.layouts = (layout,)
+        self.num_layouts = len(self.layouts)
+
         # self.obs_shape = (agent_view_size, agent_view_size, 3)
-        # Observations given by 26 channels, most of which are boolean masks
-        self.height = layout["height"]
-        self.width = layout["width"]
-        self.obs_shape = (self.width, self.height, 26)
+        # Observations given by 26 channels, most of which are boolean masks,
+        # or 22 without the always-zero tomato channels
+        self.height = max(l["height"] for l in self.layouts)
+        self.width = max(l["width"] for l in self.layouts)
+        self.tomato_channels = tomato_channels
+        self.obs_channels = np.array(
+            [c for c in range(NUM_OBS_CHANNELS) if tomato_channels or c not in TOMATO_CHANNELS]
+        )
+        self.obs_shape = (self.width, self.height, len(self.obs_channels))
+
+        # Optionally, observations are bit-packed into a few uint8 channels, see `ObsPacking`
+        self.packed_obs = packed_obs
+        self.obs_packing = ObsPacking(
+            len(self.obs_channels), np.flatnonzero(np.isin(self.obs_channels, INT_CHANNELS))
+        )
+        if packed_obs:
+            self.obs_shape = (self.width, self.height, self.obs_packing.num_packed_channels)
 
         self.agent_view_size = 5  # Hard coded. Only affects map padding -- not observations.
         self.layout = layout
@@ -89,6 +128,43 @@ class Overcooked(MultiAgentEnv):
         self.random_reset = random_reset
         self.max_steps = max_steps
 
+        self._build_layout_tables()
+
+    def _build_layout_tables(self):
+        """Stacks the layouts into arrays indexed by layout, on the padded
+        `height x width` grid. Cells outside of a layout are walls. Objects
+        of which a layout has fewer than the others repeat its first one,
+        which makes no difference to the map."""
+        h, w = self.height, self.width
+
+        def _to_padded(layout, key):
+            idx = np.asarray(layout[key]).astype(np.int64)
+            return (idx // layout["width"]) * w + idx % layout["width"]
+
+        wall_maps = np.ones((self.num_layouts, h, w), dtype=bool)
+        agent_idx = np.full((self.num_layouts, self.num_agents), -1, dtype=np.int64)
+        for i, layout in enumerate(self.layouts):
+            wall_map = np.zeros((layout["height"], layout["width"]), dtype=bool)
+            wall_map.flat[np.asarray(layout["wall_idx"])] = True
+            wall_maps[i, :layout["height"], :layout["width"]] = wall_map
+            if "agent_idx" in layout:
+                agent_idx[i] = _to_padded(layout, "agent_idx")
+        self.layout_wall_maps = jnp.array(wall_maps)
+        self.layout_agent_idx = jnp.array(agent_idx, dtype=jnp.int32)
+
+        for key in ["goal_idx", "plate_pile_idx", "onion_pile_idx", "pot_idx"]:
+            idx = [_to_padded(layout, key) for layout in self.layouts]
+            max_len = max(len(i) for i in idx)
+            idx = np.stack([np.concatenate([i, np.repeat(i[:1], max_len - len(i))]) for i in idx])
+            setattr(self, f"layout_{key}", jnp.array(idx, dtype=jnp.uint32))
+
+        # Observation layers of the objects that never move, see `get_obs_array`
+        static_obs = np.zeros((self.num_layouts, h * w, len(self.obs_channels)), dtype=np.uint8)
+        for i, layout in enumerate(self.layouts):
+            for channel, key in STATIC_CHANNELS.items():
+                static_obs[i, _to_padded(layout, key), self.obs_channels == channel] = 1
+        self.layout_static_obs = jnp.array(static_obs.reshape(self.num_layouts, h, w, -1))
+
     def step_env(
             self,
             key: chex.PRNGKey,
@@ -97,7 +173,27 @@ class Overcooked(MultiAgentEnv):
     ) -> Tuple[Dict[str, chex.Array], State, Dict[str, float], Dict[str, bool], Dict]:
         """Perform single timestep state transition."""
 
-        acts = self.action_set.take(indices=jnp.array([actions["agent_0"], actions["agent_1"]]))
+        obs, state, rewards, dones, infos = self.step_env_array(
+            key, state, jnp.array([actions["agent_0"], actions["agent_1"]])
+        )
+
+        return (
+            self.unstack_agents(obs),
+            state,
+            self.unstack_agents(rewards),
+            self.unstack_dones(dones),
+            infos,
+        )
+
+    def step_env_array(
+            self,
+            key: chex.PRNGKey,
+            state: State,
+            actions: chex.Array,
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        """Perform single timestep state transition on agent-major arrays."""
+
+        acts = self.action_set.take(indices=actions.reshape((self.num_agents,)))
 
         state, reward = self.step_agents(key, state, acts)
 
@@ -106,9 +202,9 @@ class Overcooked(MultiAgentEnv):
         done = self.is_terminal(state)
         state = state.replace(terminal=done)
 
-        obs = self.get_obs(state)
-        rewards = {"agent_0": reward, "agent_1": reward}
-        dones = {"agent_0": done, "agent_1": done, "__all__": done}
+        obs = self.get_obs_array(state)
+        rewards = jnp.full((self.num_agents,), reward)
+        dones = jnp.full((self.num_agents + 1,), done)
 
         return (
             lax.stop_gradient(obs),
@@ -121,29 +217,43 @@ class Overcooked(MultiAgentEnv):
     def reset(
             self,
             key: chex.PRNGKey,
+            layout_idx: int = None,
     ) -> Tuple[Dict[str, chex.Array], State]:
+        """Reset environment state, see `reset_array`."""
+        obs, state = self.reset_array(key, layout_idx)
+        return self.unstack_agents(obs), state
+
+    def reset_array(
+            self,
+            key: chex.PRNGKey,
+            layout_idx: int = None,
+    ) -> Tuple[chex.Array, State]:
         """Reset environment state based on `self.random_reset`
 
         If True, everything is randomized, including agent inventories and positions, pot states and items on counters
         If False, only resample agent orientations
 
-        In both cases, the environment layout is determined by `self.layout`
+        In both cases, the environment layout is determined by `self.layouts[layout_idx]`. If `layout_idx` is not
+        given, it is sampled uniformly when there are several layouts.
         """
 
         # Whether to fully randomize the start state
         random_reset = self.random_reset
-        layout = self.layout
+
+        if layout_idx is None:
+            if self.num_layouts > 1:
+                key, subkey = jax.random.split(key)
+                layout_idx = jax.random.randint(subkey, (), 0, self.num_layouts)
+            else:
+                layout_idx = 0
 
         h = self.height
         w = self.width
         num_agents = self.num_agents
         all_pos = np.arange(np.prod([h, w]), dtype=jnp.uint32)
 
-        wall_idx = layout.get("wall_idx")
-
-        occupied_mask = jnp.zeros_like(all_pos)
-        occupied_mask = occupied_mask.at[wall_idx].set(1)
-        wall_map = occupied_mask.reshape(h, w).astype(jnp.bool_)
+        wall_map = self.layout_wall_maps[layout_idx]
+        occupied_mask = wall_map.ravel().astype(jnp.uint32)
 
         # Reset agent position + dir
         key, subkey = jax.random.split(key)
@@ -151,33 +261,26 @@ class Overcooked(MultiAgentEnv):
                                       p=(~occupied_mask.astype(jnp.bool_)).astype(jnp.float32), replace=False)
 
         # Replace with fixed layout if applicable. Also randomize if agent position not provided
-        agent_idx = random_reset*agent_idx + (1-random_reset)*layout.get("agent_idx", agent_idx)
+        layout_agent_idx = self.layout_agent_idx[layout_idx]
+        layout_agent_idx = jnp.where(layout_agent_idx < 0, agent_idx, layout_agent_idx)
+        agent_idx = random_reset*agent_idx + (1-random_reset)*layout_agent_idx
         agent_pos = jnp.array([agent_idx % w, agent_idx // w], dtype=jnp.uint32).transpose() # dim = n_agents x 2
-        occupied_mask = occupied_mask.at[agent_idx].set(1)
 
         key, subkey = jax.random.split(key)
         agent_dir_idx = jax.random.choice(subkey, jnp.arange(len(DIR_TO_VEC), dtype=jnp.int32), shape=(num_agents,))
         agent_dir = DIR_TO_VEC.at[agent_dir_idx].get() # dim = n_agents x 2
 
-        # Keep track of empty counter space (table)
-        empty_table_mask = jnp.zeros_like(all_pos)
-        empty_table_mask = empty_table_mask.at[wall_idx].set(1)
-
-        goal_idx = layout.get("goal_idx")
+        goal_idx = self.layout_goal_idx[layout_idx]
         goal_pos = jnp.array([goal_idx % w, goal_idx // w], dtype=jnp.uint32).transpose()
-        empty_table_mask = empty_table_mask.at[goal_idx].set(0)
 
-        onion_pile_idx = layout.get("onion_pile_idx")
+        onion_pile_idx = self.layout_onion_pile_idx[layout_idx]
         onion_pile_pos = jnp.array([onion_pile_idx % w, onion_pile_idx // w], dtype=jnp.uint32).transpose()
-        empty_table_mask = empty_table_mask.at[onion_pile_idx].set(0)
 
-        plate_pile_idx = layout.get("plate_pile_idx")
+        plate_pile_idx = self.layout_plate_pile_idx[layout_idx]
         plate_pile_pos = jnp.array([plate_pile_idx % w, plate_pile_idx // w], dtype=jnp.uint32).transpose()
-        empty_table_mask = empty_table_mask.at[plate_pile_idx].set(0)
 
-        pot_idx = layout.get("pot_idx")
+        pot_idx = self.layout_pot_idx[layout_idx]
         pot_pos = jnp.array([pot_idx % w, pot_idx // w], dtype=jnp.uint32).transpose()
-        empty_table_mask = empty_table_mask.at[pot_idx].set(0)
 
         key, subkey = jax.random.split(key)
         # Pot status is determined by a number between 0 (inclusive) and 24 (exclusive)
@@ -225,13 +328,18 @@ class Overcooked(MultiAgentEnv):
             maze_map=maze_map,
             time=0,
             terminal=False,
+            layout_idx=layout_idx,
         )
 
-        obs = self.get_obs(state)
+        obs = self.get_obs_array(state)
 
         return lax.stop_gradient(obs), lax.stop_gradient(state)
 
     def get_obs(self, state: State) -> Dict[str, chex.Array]:
+        """Return the observations of both agents as a dictionary, see `get_obs_array`."""
+        return self.unstack_agents(self.get_obs_array(state))
+
+    def get_obs_array(self, state: State) -> chex.Array:
         """Return a full observation, of size (height x width x n_layers), where n_layers = 26.
         Layers are of shape (height x width) and  are binary (0/1) except where indicated otherwise.
         The obs is very sparse (most elements are 0), which prob. contributes to generalization problems in Overcooked.
@@ -275,11 +383,16 @@ class Overcooked(MultiAgentEnv):
 
         Urgency:
         25. Urgency. The entire layer is 1 there are 40 or fewer remaining time steps. 0 otherwise
+
+        Without `tomato_channels`, the always-zero tomato layers (13, 17, 19 and 24) are left out and the obs has 22
+        layers. Layers 10, 12, 14 and 15 never change within a layout and are precomputed in `layout_static_obs`.
+        Layer 11 is not static, as counters holding an item are not marked.
+
+        With `packed_obs`, the observation is packed with `self.obs_packing` and `self.obs_packing.unpack` recovers
+        the layers above.
         """
 
-        width = self.obs_shape[0]
         height = self.obs_shape[1]
-        n_channels = self.obs_shape[2]
         padding = (state.maze_map.shape[0]-height) // 2
 
         maze_map = state.maze_map[padding:-padding, padding:-padding, 0]
@@ -292,60 +405,56 @@ class Overcooked(MultiAgentEnv):
                                * pot_loc_layer + MAX_ONIONS_IN_POT * soup_loc   # 0/3, as long as cooking or done
         pot_cooking_time_layer = pot_status * (pot_status < POT_FULL_STATUS)                           # Timer: 19 to 0
         soup_ready_layer = pot_loc_layer * (pot_status == POT_READY_STATUS) + soup_loc                 # Ready soups, plated or not
-        urgency_layer = jnp.ones(maze_map.shape, dtype=jnp.uint8) * ((self.max_steps - state.time) < URGENCY_CUTOFF)
+        urgency = (self.max_steps - state.time) < URGENCY_CUTOFF
 
-        agent_pos_layers = jnp.zeros((2, height, width), dtype=jnp.uint8)
-        agent_pos_layers = agent_pos_layers.at[0, state.agent_pos[0, 1], state.agent_pos[0, 0]].set(1)
-        agent_pos_layers = agent_pos_layers.at[1, state.agent_pos[1, 1], state.agent_pos[1, 0]].set(1)
+        # height x width x agent
+        agent_pos_layers = jnp.logical_and(
+            jnp.arange(maze_map.shape[0])[:, None, None] == state.agent_pos[:, 1],
+            jnp.arange(maze_map.shape[1])[None, :, None] == state.agent_pos[:, 0],
+        )
+        agent_loc = agent_pos_layers.any(-1)
 
         # Add agent inv: This works because loose items and agent cannot overlap
-        agent_inv_items = jnp.expand_dims(state.agent_inv,(1,2)) * agent_pos_layers
-        maze_map = jnp.where(jnp.sum(agent_pos_layers,0), agent_inv_items.sum(0), maze_map)
-        soup_ready_layer = soup_ready_layer \
-                           + (jnp.sum(agent_inv_items,0) == OBJECT_TO_INDEX["dish"]) * jnp.sum(agent_pos_layers,0)
-        onions_in_soup_layer = onions_in_soup_layer \
-                               + (jnp.sum(agent_inv_items,0) == OBJECT_TO_INDEX["dish"]) * 3 * jnp.sum(agent_pos_layers,0)
-
-        env_layers = [
-            jnp.array(maze_map == OBJECT_TO_INDEX["pot"], dtype=jnp.uint8),       # Channel 10
-            jnp.array(maze_map == OBJECT_TO_INDEX["wall"], dtype=jnp.uint8),
-            jnp.array(maze_map == OBJECT_TO_INDEX["onion_pile"], dtype=jnp.uint8),
-            jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomato pile
-            jnp.array(maze_map == OBJECT_TO_INDEX["plate_pile"], dtype=jnp.uint8),
-            jnp.array(maze_map == OBJECT_TO_INDEX["goal"], dtype=jnp.uint8),        # 15
-            jnp.array(onions_in_pot_layer, dtype=jnp.uint8),
-            jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes in pot
-            jnp.array(onions_in_soup_layer, dtype=jnp.uint8),
-            jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes in soup
-            jnp.array(pot_cooking_time_layer, dtype=jnp.uint8),                     # 20
-            jnp.array(soup_ready_layer, dtype=jnp.uint8),
-            jnp.array(maze_map == OBJECT_TO_INDEX["plate"], dtype=jnp.uint8),
-            jnp.array(maze_map == OBJECT_TO_INDEX["onion"], dtype=jnp.uint8),
-            jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes
-            urgency_layer,                                                          # 25
-        ]
-
-        # Agent related layers
-        agent_direction_layers = jnp.zeros((8, height, width), dtype=jnp.uint8)
-        dir_layer_idx = state.agent_dir_idx+jnp.array([0,4])
-        agent_direction_layers = agent_direction_layers.at[dir_layer_idx,:,:].set(agent_pos_layers)
-
-        # Both agent see their layers first, then the other layer
-        alice_obs = jnp.zeros((n_channels, height, width), dtype=jnp.uint8)
-        alice_obs = alice_obs.at[0:2].set(agent_pos_layers)
-
-        alice_obs = alice_obs.at[2:10].set(agent_direction_layers)
-        alice_obs = alice_obs.at[10:].set(jnp.stack(env_layers))
-
-        bob_obs = jnp.zeros((n_channels, height, width), dtype=jnp.uint8)
-        bob_obs = bob_obs.at[0].set(agent_pos_layers[1]).at[1].set(agent_pos_layers[0])
-        bob_obs = bob_obs.at[2:6].set(agent_direction_layers[4:]).at[6:10].set(agent_direction_layers[0:4])
-        bob_obs = bob_obs.at[10:].set(jnp.stack(env_layers))
-
-        alice_obs = jnp.transpose(alice_obs, (1, 2, 0))
-        bob_obs = jnp.transpose(bob_obs, (1, 2, 0))
-
-        return {"agent_0" : alice_obs, "agent_1" : bob_obs}
+        agent_inv_items = (agent_pos_layers * state.agent_inv).sum(-1)
+        maze_map = jnp.where(agent_loc, agent_inv_items, maze_map)
+        agent_dish = (agent_inv_items == OBJECT_TO_INDEX["dish"]) * agent_loc
+        soup_ready_layer = soup_ready_layer + agent_dish
+        onions_in_soup_layer = onions_in_soup_layer + agent_dish * 3
+
+        # All channels are computed at once, elementwise over (height x width x channel), so that XLA fuses them
+        # into the output instead of stacking and transposing separate layers
+        channel = self.obs_channels
+        channel_object = np.select(
+            [channel == 11, channel == 22, channel == 23],
+            [OBJECT_TO_INDEX["wall"], OBJECT_TO_INDEX["plate"], OBJECT_TO_INDEX["onion"]],
+            -1,
+        )
+        value_layers = jnp.where(channel == 16, onions_in_pot_layer[..., None],
+                       jnp.where(channel == 18, onions_in_soup_layer[..., None],
+                       jnp.where(channel == 20, pot_cooking_time_layer[..., None],
+                       jnp.where(channel == 21, soup_ready_layer[..., None],
+                                 (channel == 25) * urgency))))
+        env_layers = self.layout_static_obs[state.layout_idx] \
+                     + (maze_map[..., None] == channel_object) \
+                     + value_layers.astype(jnp.uint8)
+
+        # Agent layers of both agents, who see their layers first, then the other agent's
+        agent_channel = channel < AGENT_CHANNEL_DIR.shape[0]
+        owner = np.where(agent_channel, AGENT_CHANNEL_OWNER[:, np.minimum(channel, 9)], 0)
+        direction = np.where(agent_channel, AGENT_CHANNEL_DIR[np.minimum(channel, 9)], -2)
+        agent_layers = jnp.logical_and(
+            jnp.logical_and(
+                jnp.arange(maze_map.shape[0])[:, None, None] == state.agent_pos[owner, 1][:, None, None, :],
+                jnp.arange(maze_map.shape[1])[:, None] == state.agent_pos[owner, 0][:, None, None, :],
+            ),
+            jnp.logical_or(direction == -1, state.agent_dir_idx[owner] == direction)[:, None, None, :],
+        )
+
+        # agent x height x width x channel
+        obs = env_layers + agent_layers.astype(jnp.uint8)
+        if self.packed_obs:
+            return self.obs_packing.pack(obs)
+        return obs
 
     def step_agents(
             self, key: chex.PRNGKey, state: State, action: chex.Array,
@@ -619,7 +728,7 @@ class Overcooked(MultiAgentEnv):
 
     def observation_space(self) -> spaces.Box:
         """Observation space of the environment."""
-        return spaces.Box(0, 255, self.obs_shape)
+        return spaces.Box(0, 255, self.obs_shape, dtype=jnp.uint8 if self.packed_obs else jnp.float32)
 
     def state_space(self) -> spaces.Dict:
         """State space of the environment."""
@@ -0,0 +1,56 @@
+import chex
+import jax
+import jax.numpy as jnp
+from flax import struct
+from typing import Any, Dict, Tuple
+
+
+@struct.dataclass
+class ResetPool:
+    """A stack of pre-generated initial `(obs, state)` pairs.
+
+    Resets are computed once for a batch of keys with `create`, so that
+    drawing an initial state during training is a single gather. The pool is
+    a pytree and can be carried through jitted training loops, where
+    `refresh` regenerates part of it to keep the initial states diverse, e.g.
+    `pool = pool.periodic_refresh(env, key, update_step, period=10, num_refresh=64)`.
+    """
+
+    obs: Dict[str, chex.Array]
+    state: Any
+
+    @classmethod
+    def create(cls, env, key: chex.PRNGKey, size: int) -> "ResetPool":
+        obs, state = jax.vmap(env.reset)(jax.random.split(key, size))
+        return cls(obs=obs, state=state)
+
+    @property
+    def size(self) -> int:
+        return jax.tree_util.tree_leaves(self.state)[0].shape[0]
+
+    def sample(self, key: chex.PRNGKey) -> Tuple[Dict[str, chex.Array], Any]:
+        """Draws one `(obs, state)` pair uniformly from the pool."""
+        idx = jax.random.randint(key, (), 0, self.size)
+        return jax.tree_map(lambda x: x[idx], (self.obs, self.state))
+
+    def refresh(self, env, key: chex.PRNGKey, num_refresh: int) -> "ResetPool":
+        """Replaces `num_refresh` randomly chosen entries with fresh resets."""
+        key_idx, key_reset = jax.random.split(key)
+        idx = jax.random.choice(key_idx, self.size, (num_refresh,), replace=False)
+        new = ResetPool.create(env, key_reset, num_refresh)
+        return jax.tree_map(lambda x, y: x.at[idx].set(y), self, new)
+
+    def periodic_refresh(
+        self,
+        env,
+        key: chex.PRNGKey,
+        step: int,
+        period: int,
+        num_refresh: int,
+    ) -> "ResetPool":
+        """Calls `refresh` when `step` is a multiple of `period`."""
+        return jax.lax.cond(
+            step % period == 0,
+            lambda: self.refresh(env, key, num_refresh),
+            lambda: self,
+        )
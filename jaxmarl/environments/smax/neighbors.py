@@ -0,0 +1,137 @@
+import chex
+import jax
+import jax.numpy as jnp
+import math
+from flax.struct import dataclass
+from functools import partial
+from typing import Tuple
+
+
+@dataclass
+class CellList:
+    # (num_units, 2) integer grid coordinates of the cell each unit is in
+    unit_cells: chex.Array
+    # (num_units,) unit indices sorted by the cell they occupy
+    sorted_idx: chex.Array
+    # (num_cells,) offset into `sorted_idx` of the first unit in each cell
+    cell_start: chex.Array
+    # (num_cells,) number of units in each cell
+    cell_count: chex.Array
+
+
+class UniformGrid:
+    """Jittable uniform-grid (cell list) neighbour index over a rectangular map.
+
+    Units are bucketed into square cells of side `cell_size` by sorting on their
+    cell id, so building the index costs O(N log N) and O(num_cells) memory.
+    Querying returns, for every unit, up to `max_neighbors` candidate units
+    from the 3x3 block of cells around it. Every pair of units closer than
+    `cell_size` is guaranteed to appear in the candidates as long as no unit
+    has more than `max_neighbors` candidates; `query` reports when that cap
+    is exceeded so callers can size it.
+    """
+
+    def __init__(self, map_width, map_height, cell_size, max_neighbors):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.cell_size = cell_size
+        self.grid_width = max(int(math.ceil(map_width / cell_size)), 1)
+        self.grid_height = max(int(math.ceil(map_height / cell_size)), 1)
+        self.num_cells = self.grid_width * self.grid_height
+        self.max_neighbors = max_neighbors
+        self.stencil = jnp.array(
+            [[dx, dy] for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=jnp.int32
+        )
+
+    @partial(jax.jit, static_argnums=(0,))
+    def build(self, positions: chex.Array) -> CellList:
+        unit_cells = jnp.floor(positions / self.cell_size).astype(jnp.int32)
+        unit_cells = jnp.clip(
+            unit_cells,
+            0,
+            jnp.array([self.grid_width - 1, self.grid_height - 1]),
+        )
+        cell_ids = unit_cells[:, 0] * self.grid_height + unit_cells[:, 1]
+        sorted_idx = jnp.argsort(cell_ids)
+        sorted_cells = cell_ids[sorted_idx]
+        cells = jnp.arange(self.num_cells)
+        cell_start = jnp.searchsorted(sorted_cells, cells, side="left")
+        cell_end = jnp.searchsorted(sorted_cells, cells, side="right")
+        return CellList(
+            unit_cells=unit_cells,
+            sorted_idx=sorted_idx,
+            cell_start=cell_start,
+            cell_count=cell_end - cell_start,
+        )
+
+    @partial(jax.jit, static_argnums=(0,))
+    def query(
+        self, cell_list: CellList
+    ) -> Tuple[chex.Array, chex.Array, chex.Array]:
+        """Candidate neighbours of every unit, including the unit itself.
+
+        Returns `(neighbor_idx, neighbor_mask, overflow)` where `neighbor_idx`
+        is `(num_units, max_neighbors)` and sorted by unit index within each
+        row, `neighbor_mask` marks the filled slots (empty slots hold
+        `num_units`) and `overflow` flags units whose candidates were truncated.
+        """
+        num_units = cell_list.sorted_idx.shape[0]
+        slots = jnp.arange(self.max_neighbors)
+
+        def query_unit(unit_cell):
+            stencil_ids, counts = self._stencil_counts(cell_list, unit_cell)
+            ends = jnp.cumsum(counts)
+            starts = ends - counts
+            # work out which stencil cell each output slot reads from
+            stencil_slot = jnp.minimum(
+                jnp.searchsorted(ends, slots, side="right"), len(self.stencil) - 1
+            )
+            sorted_pos = (
+                cell_list.cell_start[stencil_ids[stencil_slot]]
+                + slots
+                - starts[stencil_slot]
+            )
+            valid = slots < ends[-1]
+            idx = jnp.where(
+                valid,
+                cell_list.sorted_idx[jnp.clip(sorted_pos, 0, num_units - 1)],
+                num_units,
+            )
+            return jnp.sort(idx), ends[-1] > self.max_neighbors
+
+        neighbor_idx, overflow = jax.vmap(query_unit)(cell_list.unit_cells)
+        return neighbor_idx, neighbor_idx < num_units, overflow
+
+    def _stencil_counts(
+        self, cell_list: CellList, unit_cell: chex.Array
+    ) -> Tuple[chex.Array, chex.Array]:
+        """Ids and unit counts of the 3x3 cells around `unit_cell`, with a count
+        of 0 for the cells outside the grid."""
+        stencil_cells = unit_cell + self.stencil
+        in_grid = jnp.all(
+            (stencil_cells >= 0)
+            & (stencil_cells < jnp.array([self.grid_width, self.grid_height])),
+            axis=-1,
+        )
+        stencil_ids = jnp.where(
+            in_grid,
+            stencil_cells[:, 0] * self.grid_height + stencil_cells[:, 1],
+            0,
+        )
+        return stencil_ids, jnp.where(in_grid, cell_list.cell_count[stencil_ids], 0)
+
+    @partial(jax.jit, static_argnums=(0,))
+    def overflow(self, positions: chex.Array) -> chex.Array:
+        """Flags the units whose candidates `neighbors` would truncate. Only
+        counts the units around each one, so it is much cheaper than `query`."""
+        cell_list = self.build(positions)
+        _, counts = jax.vmap(self._stencil_counts, in_axes=(None, 0))(
+            cell_list, cell_list.unit_cells
+        )
+        return counts.sum(axis=-1) > self.max_neighbors
+
+    @partial(jax.jit, static_argnums=(0,))
+    def neighbors(
+        self, positions: chex.Array
+    ) -> Tuple[chex.Array, chex.Array, chex.Array]:
+        return self.query(self.build(positions))
@@ -8,6 +8,7 @@ from jaxmarl.environments.smax.distributions import (
     SurroundAndReflectPositionDistribution,
     UniformUnitTypeDistribution,
 )
+from jaxmarl.environments.smax.neighbors import UniformGrid
 import chex
 from typing import Tuple, Dict, Optional
 from flax.struct import dataclass
@@ -143,6 +144,8 @@ class SMAX(MultiAgentEnv):
         smacv2_unit_type_generation=False,
         observation_type="unit_list",
         action_type="discrete",
+        neighbor_mode="dense",
+        max_neighbors=None,
     ) -> None:
         self.num_allies = num_allies if scenario is None else scenario.num_allies
         self.num_enemies = num_enemies if scenario is None else scenario.num_enemies
@@ -188,6 +191,30 @@ class SMAX(MultiAgentEnv):
             self.map_height,
             len(self.unit_type_names),
         )
+        # "dense" computes every unit pair and is kept as the reference.
+        # "cell_list" only considers units in neighbouring cells of a uniform
+        # grid whose cells are as wide as the largest interaction range.
+        # It matches "dense" exactly as long as no unit has more than
+        # `max_neighbors` units (itself included) in the 3x3 cells around it.
+        # Steps report the units for which this was not the case in
+        # `infos["neighbor_overflow"]`.
+        if neighbor_mode not in ("dense", "cell_list"):
+            raise ValueError(f"Invalid neighbor mode {neighbor_mode}")
+        self.neighbor_mode = neighbor_mode
+        cell_size = max(
+            float(jnp.max(self.unit_type_sight_ranges)),
+            float(jnp.max(self.unit_type_attack_ranges)),
+            2 * float(jnp.max(self.unit_type_radiuses)),
+        )
+        if max_neighbors is None:
+            max_neighbors = self._max_packed_units(3 * cell_size)
+        self.max_neighbors = min(max_neighbors, self.num_agents)
+        self.neighbor_grid = UniformGrid(
+            self.map_width,
+            self.map_height,
+            cell_size=cell_size,
+            max_neighbors=self.max_neighbors,
+        )
         self.agents = [f"ally_{i}" for i in range(self.num_allies)] + [
             f"enemy_{i}" for i in range(self.num_enemies)
         ]
@@ -229,6 +256,65 @@ class SMAX(MultiAgentEnv):
             agent: self._get_individual_action_space(i)
             for i, agent in enumerate(self.agents)
         }
+        self.movement_vectors, self.attack_targets = self._build_action_tables()
+
+    def _build_action_tables(self) -> Tuple[chex.Array, chex.Array]:
+        """Lookup tables indexed by discrete action id, shared by action
+        decoding, `_world_step` and `get_avail_actions`.
+
+        `movement_vectors` is `(num_actions, 2)`: the velocity direction of
+        each action, zero for stop and attack actions. `attack_targets` is
+        `(2, num_actions)`: for each team, the index of the unit an action
+        attacks, or -1 for actions that are not attacks.
+        """
+        num_actions = max(self.num_ally_actions, self.num_enemy_actions)
+        # The velocities below are for diagonal directions
+        # because these are easier to encode as actions than the four
+        # diagonal directions. Then rotate the velocity 45
+        # degrees anticlockwise to compute the movement.
+        rotation = jnp.array(
+            [
+                [1.0 / jnp.sqrt(2), -1.0 / jnp.sqrt(2)],
+                [1.0 / jnp.sqrt(2), 1.0 / jnp.sqrt(2)],
+            ]
+        )
+        movement_vectors = jnp.zeros((num_actions, 2))
+        for action in range(self.num_movement_actions - 1):
+            vec = jnp.array(
+                [
+                    (-1) ** (action // 2) * (1.0 / jnp.sqrt(2)),
+                    (-1) ** (action // 2 + action % 2) * (1.0 / jnp.sqrt(2)),
+                ]
+            )
+            movement_vectors = movement_vectors.at[action].set(rotation @ vec)
+        # for team 1, their attack actions are labelled in
+        # reverse order because that is the order they are
+        # observed in
+        attack_targets = jnp.full((2, num_actions), -1, dtype=jnp.int32)
+        attack_ids = jnp.arange(self.num_movement_actions, num_actions)
+        attack_targets = attack_targets.at[0, attack_ids].set(
+            jnp.where(
+                attack_ids < self.num_ally_actions,
+                attack_ids + self.num_allies - self.num_movement_actions,
+                -1,
+            )
+        )
+        attack_targets = attack_targets.at[1, attack_ids].set(
+            jnp.where(
+                attack_ids < self.num_enemy_actions,
+                self.num_allies - 1 - (attack_ids - self.num_movement_actions),
+                -1,
+            )
+        )
+        return movement_vectors, attack_targets
+
+    def _max_packed_units(self, block_size: float) -> int:
+        """Upper bound on the number of non-overlapping units whose centres fit
+        in a square block of the map, from the densest packing of discs."""
+        radius = float(jnp.min(self.unit_type_radiuses))
+        width = min(block_size, self.map_width) + 2 * radius
+        height = min(block_size, self.map_height) + 2 * radius
+        return int(math.ceil(width * height / (2 * math.sqrt(3) * radius**2)))
 
     def _get_individual_action_space(self, i):
         if self.action_type == "discrete":
@@ -261,6 +347,13 @@ class SMAX(MultiAgentEnv):
     @partial(jax.jit, static_argnums=(0,))
     def reset(self, key: chex.PRNGKey) -> Tuple[Dict[str, chex.Array], State]:
         """Environment-specific reset."""
+        obs, state = self.reset_array(key)
+        obs = self.unstack_agents(obs)
+        obs["world_state"] = jax.lax.stop_gradient(self.get_world_state(state))
+        return obs, state
+
+    @partial(jax.jit, static_argnums=(0,))
+    def reset_array(self, key: chex.PRNGKey) -> Tuple[chex.Array, State]:
         key, team_0_key, team_1_key = jax.random.split(key, num=3)
         team_0_start = jnp.stack([jnp.array([8.0, 16.0])] * self.num_allies)
         team_0_start_noise = jax.random.uniform(
@@ -306,10 +399,7 @@ class SMAX(MultiAgentEnv):
             unit_weapon_cooldowns=unit_weapon_cooldowns,
         )
         state = self._push_units_away(state)
-        obs = self.get_obs(state)
-        world_state = self.get_world_state(state)
-        obs["world_state"] = jax.lax.stop_gradient(world_state)
-        return obs, state
+        return self.get_obs_array(state), state
 
     @partial(jax.jit, static_argnums=(0, 4))
     def step_env(
@@ -324,6 +414,14 @@ class SMAX(MultiAgentEnv):
         actions = self._decode_actions(action_key, state, actions)
         return self.step_env_no_decode(key, state, actions, get_state_sequence)
 
+    @partial(jax.jit, static_argnums=(0,))
+    def step_env_array(
+        self, key: chex.PRNGKey, state: State, actions: chex.Array
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        key, action_key = jax.random.split(key)
+        actions = self._decode_actions(action_key, state, actions)
+        return self.step_env_no_decode_array(key, state, actions)
+
     @partial(jax.jit, static_argnums=(0, 4))
     def step_env_no_decode(
         self,
@@ -333,59 +431,145 @@ class SMAX(MultiAgentEnv):
         get_state_sequence: bool = False,
     ) -> Tuple[Dict[str, chex.Array], State, Dict[str, float], Dict[str, bool], Dict]:
         """Environment-specific step transition."""
+        if get_state_sequence:
+            _, states, _ = self._world_ticks(key, state, actions, get_state_sequence)
+            return states
+        obs, state, rewards, dones, infos = self.step_env_no_decode_array(
+            key, state, actions
+        )
+        obs = self.unstack_agents(obs)
+        obs["world_state"] = infos.pop("world_state")
+        return (
+            obs,
+            state,
+            self.unstack_agents(rewards),
+            self.unstack_dones(dones),
+            infos,
+        )
 
+    @partial(jax.jit, static_argnums=(0,))
+    def step_env_no_decode_array(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: Tuple[chex.Array, chex.Array],
+    ) -> Tuple[chex.Array, State, chex.Array, chex.Array, Dict]:
+        """Environment-specific step transition on agent-major arrays. The
+        world state is returned as `infos["world_state"]`, and with the
+        "cell_list" neighbor mode the units whose neighbours were truncated
+        at any point of the step as `infos["neighbor_overflow"]`."""
         health_before = jnp.copy(state.unit_health)
+        state, _, neighbor_overflow = self._world_ticks(key, state, actions)
+        health_after = state.unit_health
+        state = state.replace(
+            terminal=self.is_terminal(state),
+            prev_movement_actions=actions[0],
+            prev_attack_actions=actions[1],
+            time=state.time + 1,
+        )
+        obs = self.get_obs_array(state)
+        rewards = self.compute_reward_array(state, health_before, health_after)
+        dones = jnp.append(~state.unit_alive, state.terminal)
+        infos = {"world_state": jax.lax.stop_gradient(self.get_world_state(state))}
+        if self.neighbor_mode == "cell_list":
+            # observations and available actions use the final positions
+            infos["neighbor_overflow"] = neighbor_overflow | self.neighbor_grid.overflow(
+                state.unit_positions
+            )
+        return (
+            jax.lax.stop_gradient(obs),
+            jax.lax.stop_gradient(state),
+            rewards,
+            dones,
+            infos,
+        )
 
-        def world_step_fn(carry, _):
-            state, step_key = carry
-            step_key, world_step_key = jax.random.split(step_key)
-            state = partial(self._world_step, actions=actions)(
-                key=world_step_key, state=state
+    def _world_ticks(
+        self,
+        key: chex.PRNGKey,
+        state: State,
+        actions: Tuple[chex.Array, chex.Array],
+        get_state_sequence: bool = False,
+    ) -> Tuple[State, Optional[State], chex.Array]:
+        """Runs `world_steps_per_env_step` world ticks. Also returns the stacked
+        per-tick states if `get_state_sequence` is set, and the units whose
+        neighbours were truncated in any tick with the "cell_list" mode."""
+        # Only positions, health, cooldowns and liveness change between ticks,
+        # so those are the only arrays carried through the scan. The rest of
+        # the state is closed over, and the per-tick states are only stacked
+        # when the visualiser asks for them.
+        def world_tick_fn(carry, _):
+            (
+                unit_positions,
+                unit_health,
+                unit_weapon_cooldowns,
+                unit_alive,
+                neighbor_overflow,
+                tick_key,
+            ) = carry
+            tick_key, world_step_key = jax.random.split(tick_key)
+            tick_state = state.replace(
+                unit_positions=unit_positions,
+                unit_health=unit_health,
+                unit_weapon_cooldowns=unit_weapon_cooldowns,
+                unit_alive=unit_alive,
             )
-            state = self._kill_agents_touching_walls(state)
-            state = self._update_dead_agents(state)
-            state = self._push_units_away(state)
-            state = state.replace(
+            tick_state = self._world_step(world_step_key, tick_state, actions)
+            if self.walls_cause_death:
+                tick_state = self._kill_agents_touching_walls(tick_state)
+            tick_state = self._update_dead_agents(tick_state)
+            if self.neighbor_mode == "cell_list":
+                neighbor_overflow |= self.neighbor_grid.overflow(
+                    tick_state.unit_positions
+                )
+            tick_state = self._push_units_away(tick_state)
+            carry = (
+                tick_state.unit_positions,
+                tick_state.unit_health,
+                tick_state.unit_weapon_cooldowns,
+                tick_state.unit_alive,
+                neighbor_overflow,
+                tick_key,
+            )
+            if not get_state_sequence:
+                return carry, None
+            return carry, tick_state.replace(
                 prev_movement_actions=actions[0],
                 prev_attack_actions=actions[1],
             )
-            return (state, step_key), state
 
-        (state, _), states = jax.lax.scan(
-            world_step_fn,
-            init=(state, key),
+        (
+            unit_positions,
+            unit_health,
+            unit_weapon_cooldowns,
+            unit_alive,
+            neighbor_overflow,
+            _,
+        ), states = jax.lax.scan(
+            world_tick_fn,
+            init=(
+                state.unit_positions,
+                state.unit_health,
+                state.unit_weapon_cooldowns,
+                state.unit_alive,
+                jnp.zeros((self.num_agents,), dtype=jnp.bool_),
+                key,
+            ),
             xs=None,
             length=self.world_steps_per_env_step,
         )
-        health_after = state.unit_health
         state = state.replace(
-            terminal=self.is_terminal(state),
-            prev_movement_actions=actions[0],
-            prev_attack_actions=actions[1],
-            time=state.time + 1,
+            unit_positions=unit_positions,
+            unit_health=unit_health,
+            unit_weapon_cooldowns=unit_weapon_cooldowns,
+            unit_alive=unit_alive,
         )
-        obs = self.get_obs(state)
-        dones = {
-            agent: ~state.unit_alive[self.agent_ids[agent]] for agent in self.agents
-        }
-        rewards = self.compute_reward(state, health_before, health_after)
-        dones["__all__"] = state.terminal
-        world_state = self.get_world_state(state)
-        infos = {}
-        obs["world_state"] = jax.lax.stop_gradient(world_state)
-        if not get_state_sequence:
-            return (
-                jax.lax.stop_gradient(obs),
-                jax.lax.stop_gradient(state),
-                rewards,
-                dones,
-                infos,
-            )
-        else:
-            return states
+        return state, states, neighbor_overflow
 
     @partial(jax.jit, static_argnums=(0,))
-    def compute_reward(self, state, health_before, health_after):
+    def compute_reward_array(self, state, health_before, health_after):
+        """Rewards of all agents, stacked in `self.agents` order."""
+
         @partial(jax.jit, static_argnums=(0,))
         def compute_team_reward(team_idx):
             # compute how much the enemy team health has decreased
@@ -444,11 +628,14 @@ class SMAX(MultiAgentEnv):
             return enemy_health_decrease_reward + won_battle_bonus + lost_battle_bonus
 
         # agents still get reward when they are dead to allow for noble sacrifice
-        team_rewards = [compute_team_reward(i) for i in range(2)]
-        return {
-            agent: team_rewards[int(self.agent_ids[agent] >= self.num_allies)]
-            for agent in self.agents
-        }
+        team_rewards = jnp.array([compute_team_reward(i) for i in range(2)])
+        return team_rewards[self.teams]
+
+    @partial(jax.jit, static_argnums=(0,))
+    def compute_reward(self, state, health_before, health_after):
+        return self.unstack_agents(
+            self.compute_reward_array(state, health_before, health_after)
+        )
 
     @partial(jax.jit, static_argnums=(0,))
     def is_terminal(self, state):
@@ -479,6 +666,8 @@ class SMAX(MultiAgentEnv):
         return state.replace(unit_health=unit_health)
 
     def _push_units_away(self, state: State, firmness: float = 1.0):
+        if self.neighbor_mode == "cell_list":
+            return self._push_units_away_cell_list(state, firmness)
         delta_matrix = state.unit_positions[:, None] - state.unit_positions[None, :]
         dist_matrix = (
             jnp.linalg.norm(delta_matrix, axis=-1)
@@ -496,6 +685,49 @@ class SMAX(MultiAgentEnv):
         )
         return state.replace(unit_positions=unit_positions)
 
+    def _push_units_away_cell_list(self, state: State, firmness: float = 1.0):
+        neighbor_idx, neighbor_mask, _ = self.get_neighbors(state)
+        idx = jnp.where(neighbor_mask, neighbor_idx, 0)
+        delta = state.unit_positions[:, None] - state.unit_positions[idx]
+        is_self = idx == jnp.arange(self.num_agents)[:, None]
+        dist = jnp.linalg.norm(delta, axis=-1) + is_self + 1e-6
+        radiuses = self.unit_type_radiuses[state.unit_types]
+        radius = radiuses[:, None] + radiuses[idx]
+        overlap_term = jax.nn.relu(radius / dist - 1.0) * neighbor_mask
+        unit_positions = (
+            state.unit_positions
+            + firmness * jnp.sum(delta * overlap_term[:, :, None], axis=1) / 2
+        )
+        return state.replace(unit_positions=unit_positions)
+
+    @partial(jax.jit, static_argnums=(0,))
+    def get_neighbors(self, state: State) -> Tuple[chex.Array, chex.Array, chex.Array]:
+        """Candidate neighbours of every unit from the uniform grid index.
+
+        Returns `(neighbor_idx, neighbor_mask, overflow)`, see `UniformGrid.query`.
+        """
+        return self.neighbor_grid.neighbors(state.unit_positions)
+
+    def _get_units_in_range(self, state: State, ranges: chex.Array) -> chex.Array:
+        """(num_agents, num_agents) mask of the units within `ranges[i]` of unit i."""
+        if self.neighbor_mode == "dense":
+            dist = jnp.linalg.norm(
+                state.unit_positions[:, None] - state.unit_positions[None, :], axis=-1
+            )
+            return dist < ranges[:, None]
+        neighbor_idx, neighbor_mask, _ = self.get_neighbors(state)
+        idx = jnp.where(neighbor_mask, neighbor_idx, 0)
+        dist = jnp.linalg.norm(
+            state.unit_positions[:, None] - state.unit_positions[idx], axis=-1
+        )
+        in_range = neighbor_mask & (dist < ranges[:, None])
+        # empty slots hold `num_agents` and are dropped by the scatter
+        return (
+            jnp.zeros((self.num_agents, self.num_agents), dtype=jnp.bool_)
+            .at[jnp.arange(self.num_agents)[:, None], neighbor_idx]
+            .set(in_range, mode="drop")
+        )
+
     @partial(jax.jit, static_argnums=(0,))
     def _decode_actions(
         self, key, state: State, actions: chex.Array
@@ -510,28 +742,7 @@ class SMAX(MultiAgentEnv):
     def _decode_discrete_actions(
         self, actions: chex.Array
     ) -> Tuple[chex.Array, chex.Array]:
-        def _decode_movement_action(action):
-            vec = jax.lax.cond(
-                # action is an attack action OR stop (action 4)
-                action >= self.num_movement_actions - 1,
-                lambda: jnp.zeros((2,)),
-                lambda: jnp.array(
-                    [
-                        (-1) ** (action // 2) * (1.0 / jnp.sqrt(2)),
-                        (-1) ** (action // 2 + action % 2) * (1.0 / jnp.sqrt(2)),
-                    ]
-                ),
-            )
-            rotation = jnp.array(
-                [
-                    [1.0 / jnp.sqrt(2), -1.0 / jnp.sqrt(2)],
-                    [1.0 / jnp.sqrt(2), 1.0 / jnp.sqrt(2)],
-                ]
-            )
-            vec = rotation @ vec
-            return vec
-
-        movement_actions = jax.vmap(_decode_movement_action)(actions)
+        movement_actions = self.movement_vectors[actions]
         attack_actions = jnp.where(
             actions > self.num_movement_actions - 1, actions, jnp.zeros_like(actions)
         )
@@ -646,18 +857,9 @@ class SMAX(MultiAgentEnv):
             return new_pos
 
         def update_agent_health(idx, action, key):
-            # for team 1, their attack actions are labelled in
-            # reverse order because that is the order they are
-            # observed in
-            attacked_idx = jax.lax.cond(
-                idx < self.num_allies,
-                lambda: action + self.num_allies - self.num_movement_actions,
-                lambda: self.num_allies - 1 - (action - self.num_movement_actions),
-            )
+            attacked_idx = self.attack_targets[self.teams[idx], action]
             # deal with no-op attack actions (i.e. agents that are moving instead)
-            attacked_idx = jax.lax.select(
-                action < self.num_movement_actions, idx, attacked_idx
-            )
+            attacked_idx = jnp.where(attacked_idx < 0, idx, attacked_idx)
             attack_valid = (
                 (
                     jnp.linalg.norm(
@@ -761,17 +963,32 @@ class SMAX(MultiAgentEnv):
 
     @partial(jax.jit, static_argnums=(0,))
     def get_obs(self, state: State) -> Dict[str, chex.Array]:
+        return self.unstack_agents(self.get_obs_array(state))
+
+    @partial(jax.jit, static_argnums=(0,))
+    def get_obs_array(self, state: State) -> chex.Array:
+        """Observations of all agents, stacked in `self.agents` order."""
         if self.observation_type == "unit_list":
-            return self.get_obs_unit_list(state)
+            return self._get_obs_unit_list_array(state)
         elif self.observation_type == "conic":
-            return self.get_obs_conic(state)
+            return self._get_obs_conic_array(state)
 
     def get_obs_conic(self, state: State) -> Dict[str, chex.Array]:
-        def get_features(i: int):
+        return self.unstack_agents(self._get_obs_conic_array(state))
+
+    def _get_obs_conic_array(self, state: State) -> chex.Array:
+        if self.neighbor_mode == "cell_list":
+            neighbor_idx, neighbor_mask, _ = self.get_neighbors(state)
+        else:
+            neighbor_idx = jnp.tile(jnp.arange(self.num_agents), (self.num_agents, 1))
+            neighbor_mask = jnp.ones((self.num_agents, self.num_agents), dtype=jnp.bool_)
+
+        def get_features(i: int, candidates: chex.Array, candidate_mask: chex.Array):
+            candidates = jnp.where(candidate_mask, candidates, i)
             relative_pos = (
-                state.unit_positions - state.unit_positions[i]
+                state.unit_positions[candidates] - state.unit_positions[i]
             ) / self.unit_type_sight_ranges[state.unit_types[i]]
-            visible = jnp.linalg.norm(relative_pos, axis=-1) < 1
+            visible = (jnp.linalg.norm(relative_pos, axis=-1) < 1) & candidate_mask
 
             def get_segment(j: int):
                 #
@@ -785,7 +1002,7 @@ class SMAX(MultiAgentEnv):
                 max_segment_angle = (2 * math.pi) * (
                     (j + 1) / self.num_sections
                 ) - math.pi
-                self_mask = jnp.zeros((self.num_agents,)).at[i].set(1)
+                self_mask = candidates == i
                 in_range_mask = (
                     (angle > min_segment_angle)
                     & (angle < max_segment_angle)
@@ -793,10 +1010,11 @@ class SMAX(MultiAgentEnv):
                     & jnp.logical_not(self_mask)
                 )
                 idxes = jnp.nonzero(
-                    in_range_mask * jnp.arange(self.num_agents),
+                    in_range_mask * candidates,
                     size=self.max_units_per_section,
                     fill_value=-1,
                 )[0]
+                idxes = jnp.where(idxes == -1, -1, candidates[idxes])
                 features = jax.vmap(self._observe_features, in_axes=(None, None, 0))(
                     state, i, idxes
                 )
@@ -815,8 +1033,10 @@ class SMAX(MultiAgentEnv):
                 [all_segment_features.reshape(-1), own_features], axis=-1
             )
 
-        obs = jax.vmap(get_features)(jnp.arange(self.num_agents))
-        return {agent: obs[self.agent_ids[agent]] for agent in self.agents}
+        obs = jax.vmap(get_features)(
+            jnp.arange(self.num_agents), neighbor_idx, neighbor_mask
+        )
+        return obs
 
     @partial(jax.jit, static_argnums=(0,))
     def _observe_features(self, state: State, i: int, j_idx: int):
@@ -863,6 +1083,11 @@ class SMAX(MultiAgentEnv):
 
     def get_obs_unit_list(self, state: State) -> Dict[str, chex.Array]:
         """Applies observation function to state."""
+        return self.unstack_agents(self._get_obs_unit_list_array(state))
+
+    def _get_obs_unit_list_array(self, state: State) -> chex.Array:
+        if self.neighbor_mode == "cell_list":
+            return self._get_obs_unit_list_cell_list_array(state)
 
         def get_features(i, j):
             """Get features of unit j as seen from unit i"""
@@ -902,51 +1127,77 @@ class SMAX(MultiAgentEnv):
         get_all_self_features = jax.vmap(self._get_own_features, in_axes=(None, 0))
         own_unit_obs = get_all_self_features(state, jnp.arange(self.num_agents))
         obs = jnp.concatenate([other_unit_obs, own_unit_obs], axis=-1)
-        return {agent: obs[self.agent_ids[agent]] for agent in self.agents}
+        return obs
 
-    @partial(jax.jit, static_argnums=(0,))
-    def get_avail_actions(self, state: State) -> Dict[str, chex.Array]:
-        @partial(jax.jit, static_argnums=(1,))
-        def get_individual_avail_actions(i, team):
-            num_actions = {0: self.num_ally_actions, 1: self.num_enemy_actions}[team]
-            is_alive = state.unit_alive[i]
-            mask = jnp.zeros((num_actions,), dtype=jnp.uint8)
-            # always can take the stop action
-            mask = mask.at[self.num_movement_actions - 1].set(1)
-            mask = mask.at[: self.num_movement_actions - 1].set(
-                jax.lax.select(
-                    is_alive,
-                    jnp.ones((self.num_movement_actions - 1,), dtype=jnp.uint8),
-                    jnp.zeros((self.num_movement_actions - 1,), dtype=jnp.uint8),
-                )
+    def _get_obs_unit_list_cell_list_array(self, state: State) -> chex.Array:
+        """Same observation as `get_obs_unit_list`, but only the features of
+        units returned by the neighbour index are computed. They are then
+        scattered into their slot in the observation."""
+        neighbor_idx, neighbor_mask, _ = self.get_neighbors(state)
+
+        def get_features(i, j_idx, valid):
+            j_idx = jnp.where(valid, j_idx, i)
+            features = self._observe_features(state, i, j_idx)
+            visible = (
+                jnp.linalg.norm(state.unit_positions[j_idx] - state.unit_positions[i])
+                < self.unit_type_sight_ranges[state.unit_types[i]]
             )
-            shootable_mask = (
-                jnp.linalg.norm(state.unit_positions - state.unit_positions[i], axis=-1)
-                < self.unit_type_attack_ranges[state.unit_types[i]]
-            ) & state.unit_alive
-            shootable_mask = shootable_mask if team == 0 else shootable_mask[::-1]
-            shootable_mask = (
-                shootable_mask[self.num_allies :]
-                if team == 0
-                else shootable_mask[self.num_enemies :]
+            observed = (
+                valid
+                & (j_idx != i)
+                & visible
+                & state.unit_alive[i]
+                & state.unit_alive[j_idx]
             )
-            shootable_mask = jax.lax.select(
-                is_alive, shootable_mask, jnp.zeros_like(shootable_mask)
+            # inverse of the j -> j_idx mapping in `get_obs_unit_list`
+            slot = jnp.where(
+                i < self.num_allies,
+                jnp.where(j_idx < i, j_idx, j_idx - 1),
+                jnp.where(
+                    j_idx > i, self.num_agents - 1 - j_idx, self.num_agents - 2 - j_idx
+                ),
             )
-            mask = mask.at[self.num_movement_actions :].set(shootable_mask)
-            return mask
-
-        ally_avail_actions_masks = jax.vmap(
-            get_individual_avail_actions, in_axes=(0, None)
-        )(jnp.arange(self.num_allies), 0)
-        enemy_avail_actions_masks = jax.vmap(
-            get_individual_avail_actions, in_axes=(0, None)
-        )(jnp.arange(self.num_allies, self.num_agents), 1)
+            # out of range slots are dropped by the scatter below
+            slot = jnp.where(observed, slot, self.num_agents - 1)
+            return features, slot
+
+        features, slots = jax.vmap(
+            jax.vmap(get_features, in_axes=(None, 0, 0)), in_axes=(0, 0, 0)
+        )(jnp.arange(self.num_agents), neighbor_idx, neighbor_mask)
+        other_unit_obs = (
+            jnp.zeros((self.num_agents, self.num_agents - 1, len(self.unit_features)))
+            .at[jnp.arange(self.num_agents)[:, None], slots]
+            .set(features, mode="drop")
+        )
+        other_unit_obs = other_unit_obs.reshape((self.num_agents, -1))
+        get_all_self_features = jax.vmap(self._get_own_features, in_axes=(None, 0))
+        own_unit_obs = get_all_self_features(state, jnp.arange(self.num_agents))
+        obs = jnp.concatenate([other_unit_obs, own_unit_obs], axis=-1)
+        return obs
+
+    @partial(jax.jit, static_argnums=(0,))
+    def get_avail_actions(self, state: State) -> Dict[str, chex.Array]:
+        in_attack_range = self._get_units_in_range(
+            state, self.unit_type_attack_ranges[state.unit_types]
+        )
+        targets = self.attack_targets[self.teams]
+        is_attack = targets >= 0
+        targets = jnp.maximum(targets, 0)
+        shootable = (
+            is_attack
+            & in_attack_range[jnp.arange(self.num_agents)[:, None], targets]
+            & state.unit_alive[targets]
+        )
+        is_move = jnp.arange(targets.shape[-1]) < self.num_movement_actions - 1
+        is_stop = jnp.arange(targets.shape[-1]) == self.num_movement_actions - 1
+        # always can take the stop action
+        masks = is_stop | (state.unit_alive[:, None] & (is_move | shootable))
+        masks = masks.astype(jnp.uint8)
         return {
             agent: (
-                ally_avail_actions_masks[i]
+                masks[i, : self.num_ally_actions]
                 if i < self.num_allies
-                else enemy_avail_actions_masks[i - self.num_allies]
+                else masks[i, : self.num_enemy_actions]
             )
             for i, agent in enumerate(self.agents)
         }
@@ -979,12 +1230,7 @@ class SMAX(MultiAgentEnv):
 
         # work out which agents are being shot
         def agent_being_shot(shooter_idx, action):
-            attacked_idx = jax.lax.cond(
-                shooter_idx < self.num_allies,
-                lambda: action + self.num_allies - self.num_movement_actions,
-                lambda: self.num_allies - 1 - (action - self.num_movement_actions),
-            )
-            return attacked_idx
+            return self.attack_targets[self.teams[shooter_idx], action]
 
         def agent_can_shoot(shooter_idx, action):
             attacked_idx = agent_being_shot(shooter_idx, action)
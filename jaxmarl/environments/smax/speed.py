@@ -154,12 +154,24 @@ def make_benchmark(config):
     return benchmark
 
 
+def run_benchmark(config):
+    benchmark_fn = make_benchmark(config)
+    rng = jax.random.PRNGKey(config["SEED"])
+    benchmark_jit = jax.jit(benchmark_fn).lower(rng).compile()
+    before = time.perf_counter_ns()
+    runner_state = jax.block_until_ready(benchmark_jit(rng))
+    after = time.perf_counter_ns()
+    num_steps = config["NUM_ENVS"] * config["NUM_STEPS"]
+    total_time = (after - before) / 1e9
+    return num_steps, total_time
+
+
 def main():
     config = {
         "NUM_STEPS": 128,
         "NUM_ENVS": 4,
         "ACTIVATION": "relu",
-        "MAP_NAME": "50m",
+        "MAP_NAMES": ["3m", "27m_vs_30m", "smacv2_20_units"],
         "ENV_KWARGS": {
             "map_width": 32,
             "map_height": 32,
@@ -169,17 +181,12 @@ def main():
         "SEED": 0,
         "ACTION_SELECTION": "random"
     }
-    benchmark_fn = make_benchmark(config)
-    rng = jax.random.PRNGKey(config["SEED"])
-    benchmark_jit = jax.jit(benchmark_fn).lower(rng).compile()
-    before = time.perf_counter_ns()
-    runner_state = jax.block_until_ready(benchmark_jit(rng))
-    after = time.perf_counter_ns()
-    num_steps = config["NUM_ENVS"] * config["NUM_STEPS"]
-    total_time = (after - before) / 1e9
-    print(f"Total Time (s): {total_time}")
-    print(f"Total Steps: {num_steps}")
-    print(f"SPS: {num_steps / total_time}")
+    for map_name in config["MAP_NAMES"]:
+        num_steps, total_time = run_benchmark({**config, "MAP_NAME": map_name})
+        print(f"Map: {map_name}")
+        print(f"Total Time (s): {total_time}")
+        print(f"Total Steps: {num_steps}")
+        print(f"SPS: {num_steps / total_time}")
 
 
 if __name__ == "__main__":
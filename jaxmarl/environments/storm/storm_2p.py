@@ -10,6 +10,7 @@ from flax.struct import dataclass
 
 from jaxmarl.environments.multi_agent_env import MultiAgentEnv
 from jaxmarl.environments import spaces
+from jaxmarl.environments.obs_packing import ObsPacking
 
 
 from .rendering import (
@@ -197,10 +198,13 @@ class InTheGrid_2p(MultiAgentEnv):
         fixed_coin_location=True,
         num_agents=2,
         payoff_matrix=jnp.array([[[3, 0], [5, 1]], [[3, 5], [0, 1]]]),
-        freeze_penalty=5
+        freeze_penalty=5,
+        packed_obs=False,
     ):
 
         super().__init__(num_agents=num_agents)
+        # the grid observation is binary and can be bit-packed
+        obs_packing = ObsPacking(len(Items) - 1 + 4)
         self.agents = list(range(num_agents))
 
         def _get_obs_point(x: int, y: int, dir: int) -> jnp.ndarray:
@@ -298,6 +302,8 @@ class InTheGrid_2p(MultiAgentEnv):
             _grid2 = grid2.at[:, :, 0].set(grid2[:, :, 1])
             _grid2 = _grid2.at[:, :, 1].set(grid2[:, :, 0])
             _obs2 = jnp.concatenate([_grid2, angle2], axis=-1)
+            if packed_obs:
+                obs1, _obs2 = obs_packing.pack(obs1), obs_packing.pack(_obs2)
 
             red_pickup = jnp.sum(state.red_inventory) > INTERACT_THRESHOLD
             blue_pickup = jnp.sum(state.blue_inventory) > INTERACT_THRESHOLD
@@ -904,6 +910,8 @@ class InTheGrid_2p(MultiAgentEnv):
         # for debugging
         self.get_obs = _get_obs
         self.cnn = True
+        self.packed_obs = packed_obs
+        self.obs_packing = obs_packing
 
         self.num_inner_steps = num_inner_steps
         self.num_outer_steps = num_outer_steps
@@ -931,10 +939,12 @@ class InTheGrid_2p(MultiAgentEnv):
             if self.cnn
             else (OBS_SIZE**2 * (len(Items) - 1 + 4),)
         )
+        if self.packed_obs:
+            _shape = (OBS_SIZE, OBS_SIZE, self.obs_packing.num_packed_channels)
 
         return {
             "observation": spaces.Box(
-                low=0, high=1, shape=_shape, dtype=jnp.uint8
+                low=0, high=255 if self.packed_obs else 1, shape=_shape, dtype=jnp.uint8
             ),
             "inventory": spaces.Box(
                 low=0,
@@ -12,6 +12,7 @@ import numpy as onp
 
 from jaxmarl.environments.multi_agent_env import MultiAgentEnv
 from jaxmarl.environments import spaces
+from jaxmarl.environments.obs_packing import ObsPacking
 from flax.struct import dataclass
 
 from .rendering import (
@@ -208,10 +209,13 @@ class InTheGrid(MultiAgentEnv):
         fixed_coin_location=True,
         payoff_matrix=jnp.array([[[3, 0], [5, 1]], [[3, 5], [0, 1]]]),
         freeze_penalty=5,
+        packed_obs=False,
     ):
 
         super().__init__(num_agents=num_agents)
         self.agents = list(range(num_agents))
+        # the grid observation is binary and can be bit-packed
+        obs_packing = ObsPacking(len(Items) - 1 + 4)
 
         def _get_obs_point(x: int, y: int, dir: int) -> jnp.ndarray:
             x, y = x + PADDING, y + PADDING
@@ -312,6 +316,8 @@ class InTheGrid(MultiAgentEnv):
                 return agent_to_show
             vmap_agent2show = jax.vmap(agent2show, (0, 0), (0))
             agents2show = vmap_agent2show(state.agent_inventories, state.agent_freezes)
+            if packed_obs:
+                obs = obs_packing.pack(obs)
             return {
                 "observations": obs,
                 "inventory": jnp.array(
@@ -406,171 +412,50 @@ class InTheGrid(MultiAgentEnv):
             agent_positions, target, target_ahead, target_right, target_left, interact_targets = vmap_get_target(state.agent_positions, state.grid)
             # print(target, target_ahead, target_right, target_left, interact_targets,'target, target_ahead, target_right, target_left, interact_targets')
 
-            def update_grid_interact(i, val):
-                grid, target, target_ahead, target_right, target_left, zaps = val
-                t_i, t_a_i, t_r_i, t_l_i = target[i], target_ahead[i], target_right[i], target_left[i]
-                aux_grid = jnp.copy(grid)
-                item = jnp.where(
-                    grid[t_i[0], t_i[1]],
-                    grid[t_i[0], t_i[1]],
-                    interact_idx,
-                )
-                aux_grid = aux_grid.at[t_i[0], t_i[1]].set(item)
-
-                item = jnp.where(
-                    grid[t_a_i[0], t_a_i[1]],
-                    grid[t_a_i[0], t_a_i[1]],
-                    interact_idx,
-                )
-                aux_grid = aux_grid.at[
-                    t_a_i[0], t_a_i[1]
-                ].set(item)
-
-                item = jnp.where(
-                    grid[t_r_i[0], t_r_i[1]],
-                    grid[t_r_i[0], t_r_i[1]],
-                    interact_idx,
-                )
-                aux_grid = aux_grid.at[
-                    t_r_i[0], t_r_i[1]
-                ].set(item)
-
-                item = jnp.where(
-                    grid[t_l_i[0], t_l_i[1]],
-                    grid[t_l_i[0], t_l_i[1]],
-                    interact_idx,
-                )
-                aux_grid = aux_grid.at[t_l_i[0], t_l_i[1]].set(
-                    item
-                )
-                grid = jnp.where(zaps[i], aux_grid, grid)
-                return grid, target, target_ahead, target_right, target_left, zaps
-
-            grid, _, _, _, _, _ = jax.lax.fori_loop(0, num_agents, update_grid_interact, (state.grid, target, target_ahead, target_right, target_left, zaps))
+            # Zapping agents mark the empty cells they target
+            zap_targets = jnp.stack([target, target_ahead, target_right, target_left], axis=1)
+            zap_rows = jnp.where(zaps[:, None], zap_targets[..., 0], GRID_SIZE)  # out of the grid when not zapping
+            targeted = jnp.zeros(state.grid.shape, dtype=bool).at[
+                zap_rows, zap_targets[..., 1]
+            ].set(True, mode="drop")
+            grid = jnp.where(targeted & (state.grid == Items.empty), interact_idx, state.grid)
             state = state.replace(grid=grid)
-            # Create a function to generate agent_pairs without itertools
-            def generate_agent_pairs(num_agents):
-                pairs = jnp.array([(i, j) for i in range(num_agents) for j in range(i + 1, num_agents)])
-                return pairs
 
-            agent_pairs = jnp.array(generate_agent_pairs(num_agents))
-            # print(agent_pairs.shape, 'agent pairs')
-
-            # Sort the agent pairs randomly using the provided rng_key
+            # Agents i and j interact when both zap, both picked up coins and each one targets the other
+            targets_agent = (interact_targets[:, :, None] == jnp.arange(1, num_agents + 1)).any(axis=1)
+            pickups = state.agent_inventories.sum(axis=-1) > INTERACT_THRESHOLD
+            ready = jnp.logical_and(zaps, pickups)
+            interacting = targets_agent & targets_agent.T & ready[:, None] & ready[None, :]
+            interacting = interacting & ~jnp.eye(num_agents, dtype=bool)
+            agent_interaction_mask = interacting.any(axis=1)
+
+            # Each agent is rewarded for at most one interaction: pairs are matched greedily in a random order.
+            # A pair is matched when it comes first among the remaining pairs of both its agents. Every round
+            # matches at least one pair while some remain, so num_agents // 2 rounds give the greedy matching.
+            num_pairs = num_agents * (num_agents - 1) // 2
+            pair_i, pair_j = jnp.triu_indices(num_agents, k=1)
             random_key, subkey = jax.random.split(rng_key)
-            shuffled_indices = jax.random.permutation(subkey, jnp.arange(agent_pairs.shape[0]))
-
-            # Create a boolean array to track whether each agent is in an interaction
-            agent_interaction_mask = jnp.zeros((num_agents,), dtype=bool)
-            pairwise_mask = jnp.zeros((agent_pairs.shape[0],), dtype=bool)
-
-            def process_agent_interactions(i, val):
-                agent_interaction_mask, shuffled_indices, interact_targets, agent_inventories, pairwise_mask, zaps = val
-                pair_idx = shuffled_indices[i]
-                agent0, agent1 = agent_pairs[pair_idx]
-                agent1_in_agent0 = jnp.isin(agent1+1, interact_targets[agent0])
-                agent0_in_agent1 = jnp.isin(agent0+1, interact_targets[agent1])
-                pickup0 = agent_inventories[agent0].sum() > INTERACT_THRESHOLD
-                pickup1 = agent_inventories[agent1].sum() > INTERACT_THRESHOLD
-                is_interacting = jnp.logical_and(agent1_in_agent0, agent0_in_agent1)
-                is_interacting = jnp.logical_and(is_interacting, jnp.logical_and(pickup0, pickup1))
-                is_interacting = jnp.logical_and(is_interacting, zaps[agent0])
-                is_interacting = jnp.logical_and(is_interacting, zaps[agent1])
-                interacting = jnp.logical_and(is_interacting, jnp.logical_not(agent_interaction_mask[agent0] | agent_interaction_mask[agent1]))
-                interacting0 = jnp.logical_or(is_interacting, agent_interaction_mask[agent0])
-                interacting1 = jnp.logical_or(is_interacting, agent_interaction_mask[agent1])
-                agent_interaction_mask = agent_interaction_mask.at[agent0].set(interacting0)
-                agent_interaction_mask = agent_interaction_mask.at[agent1].set(interacting1)
-                pairwise_mask = pairwise_mask.at[pair_idx].set(interacting)
-
-                return (agent_interaction_mask,  shuffled_indices, interact_targets, agent_inventories, pairwise_mask, zaps)
-            
-            # for agent0,agent1 in [(0,1),(0,2),(1,2)]:
-            #     agent1_in_agent0 = jnp.isin(agent1+1, interact_targets[agent0])
-            #     agent0_in_agent1 = jnp.isin(agent0+1, interact_targets[agent1])
-            #     pickup0 = state.agent_inventories[agent0].sum() > INTERACT_THRESHOLD
-            #     pickup1 = state.agent_inventories[agent1].sum() > INTERACT_THRESHOLD
-
-            #     print('##')
-            #     print(agent0, agent1, 'agent0, agent1:')
-            #     print(agent1_in_agent0, 'agent1_in_agent0')
-            #     print(agent0_in_agent1, 'agent0_in_agent1')
-            #     print(pickup0, 'pickup0')
-            #     print(pickup1, 'pickup1')
-            #     print('##')
-
-
-
-            agent_interaction_mask, _, _, _,pairwise_mask, _ = jax.lax.fori_loop(0, num_agents, process_agent_interactions, 
-                                                          (agent_interaction_mask,
-                                                           shuffled_indices,
-                                                           interact_targets,
-                                                           state.agent_inventories, pairwise_mask, zaps))
-
-
-            # def get_interaction_mask(pair, agent_interaction_mask):
-            #     i, j = pair[0], pair[1]
-            #     return agent_interaction_mask[i] & agent_interaction_mask[j]
-
-            # interaction_masks = jax.vmap(get_interaction_mask, in_axes=(0, None))(agent_pairs, agent_interaction_mask)
-            interaction_masks = pairwise_mask
-            # print(agent_interaction_mask, 'agent interaction mask')
-            # print(interaction_masks, 'interaction masks')
-            # print(interaction_masks.shape, 'interaction mask shape')
-            # selected_interactions = interaction_masks.all(axis=-1)
-            # print(selected_interactions.shape, 'selected_interactions shape')
-
-            def compute_rewards_for_pair(state, pair):
-                return _get_reward(state, pair)  # Assume _get_reward is defined elsewhere
-
-            rewards_for_pairs = jax.vmap(compute_rewards_for_pair, in_axes=(None, 0))(state, agent_pairs)
-
-            def get_selected_pairs(interaction_masks,  agent_pairs, rewards_for_pairs):
-                selected_pairs = jnp.where(interaction_masks==1, agent_pairs, -1*jnp.ones((2,), dtype=jnp.int8))
-                selected_rewards = jnp.where(interaction_masks==1, rewards_for_pairs, 0)
-                return  selected_pairs, selected_rewards
-            
-            
-            vmap_get_selected_pairs = jax.vmap(get_selected_pairs, (0,0,0), (0,0))
-            selected_pairs, selected_rewards = vmap_get_selected_pairs(interaction_masks, agent_pairs, rewards_for_pairs)
-            # print(selected_pairs.shape, 'selected pairs shape')
-
-            rewards = jnp.zeros((num_agents,))
-            # print(rewards_for_pairs.shape,'rewards for pairs')
-            def assign_reward(i, val):
-                rewards, agent_pairs, selected_rewards = val
-                agent0, agent1 = agent_pairs[i]
-                rewards = rewards.at[agent0].set(selected_rewards[i][0])
-                rewards = rewards.at[agent1].set(selected_rewards[i][1])
-                return rewards, agent_pairs, selected_rewards
-            
-            rewards, _, _ = jax.lax.fori_loop(0, selected_rewards.shape[0], assign_reward, (rewards, agent_pairs, selected_rewards))
-            # rewards = rewards.at[selected_pairs.ravel()].set(rewards_for_pairs.ravel())
-            # print(rewards.shape, 'rewards shape')
-            # Update the grid with the selected interact positions
-            # def update_grid(i, val):
-            #     grid, selected_interact_positions, interact_idx = val
-            #     grid = grid.at[selected_interact_positions[i, 0, 0], selected_interact_positions[i, 0, 1]].set(interact_idx)
-            #     grid = grid.at[selected_interact_positions[i, 1, 0], selected_interact_positions[i, 1, 1]].set(interact_idx)
-            #     return grid, selected_interact_positions, interact_idx
-            
-            # grid, _, _ = jax.lax.fori_loop(0, selected_interact_positions.shape[0], update_grid, (state.grid, selected_interact_positions, interact_idx))
-
-            # Update state
-            state = state.replace(grid=grid)
-            def update_interacted_agents(i, val):
-                interacted_agents, pairs = val
-                # IDFK IF THIS WORKS. DOES IT AUTOMATICALLY TURN IT INTO BOOL???
-                interacted_agents = interacted_agents.at[pairs[i, 0], pairs[i, 1]].set(selected_pairs[i,0])
-                interacted_agents = interacted_agents.at[pairs[i, 1], pairs[i, 0]].set(selected_pairs[i,0])
-                return interacted_agents, pairs
-
-            # Initialize an interacted_agents matrix with False values
-            interacted_agents = jnp.zeros((num_agents, num_agents), dtype=bool)
-
-            # Update interacted_agents matrix using lax.scan and selected_pairs
-            interacted_agents, _ = jax.lax.fori_loop(0, selected_pairs.shape[0], update_interacted_agents, (interacted_agents, selected_pairs))
-            # print(interacted_agents, 'interacted agents')
+            pair_rank = jax.random.permutation(subkey, num_pairs)
+            rank = jnp.full((num_agents, num_agents), num_pairs)
+            rank = rank.at[pair_i, pair_j].set(pair_rank).at[pair_j, pair_i].set(pair_rank)
+
+            matched = jnp.zeros((num_agents, num_agents), dtype=bool)
+            free = jnp.ones((num_agents,), dtype=bool)
+            for _ in range(num_agents // 2):
+                candidates = interacting & free[:, None] & free[None, :]
+                candidate_rank = jnp.where(candidates, rank, num_pairs)
+                first = candidate_rank.min(axis=1)
+                new_pairs = candidates & (candidate_rank == first[:, None]) & (candidate_rank == first[None, :])
+                matched = matched | new_pairs
+                free = free & ~new_pairs.any(axis=1)
+
+            # The agent with the lower index of a pair gets the row player's payoff (see `_get_reward`)
+            inventories = state.agent_inventories / state.agent_inventories.sum(axis=-1, keepdims=True)
+            row_rewards = inventories @ payoff_matrix[0] @ inventories.T
+            col_rewards = inventories @ payoff_matrix[1] @ inventories.T
+            lower_index = jnp.arange(num_agents)[:, None] < jnp.arange(num_agents)[None, :]
+            pair_rewards = jnp.where(lower_index, row_rewards, col_rewards.T)
+            rewards = jnp.where(matched, pair_rewards, 0).sum(axis=1)
 
             return rewards, state, agent_interaction_mask
 
@@ -806,45 +691,27 @@ class InTheGrid(MultiAgentEnv):
 
             # print(agent_positions, 'agent positions after freezes')
 
-            def pos_remove(i, val):
-                grid, old_pos = val
-                grid = grid.at[
-                    (old_pos[i, 0], old_pos[i,1])
-                ].set(jnp.int8(Items.empty))
-                return (grid, old_pos)
-
-            def pos_add(i, val):
-                grid, new_pos = val
-                grid = grid.at[(new_pos[i,0], new_pos[i,1])].set(
-                    jnp.int8(i+1)
-                )
-                return (grid, new_pos)
-
-            grid, _ = jax.lax.fori_loop(0, num_agents, pos_remove, (state.grid, original_agent_pos))
-            grid, _ = jax.lax.fori_loop(0, num_agents, pos_add, (grid, agent_positions))
+            # Move the agents on the grid. When agents share a cell, the one with the highest index is shown
+            grid = state.grid.at[
+                original_agent_pos[:, 0], original_agent_pos[:, 1]
+            ].set(jnp.int8(Items.empty))
+            same_cell = (agent_positions[:, None, :2] == agent_positions[None, :, :2]).all(axis=-1)
+            hidden = jnp.triu(same_cell, k=1).any(axis=1)
+            grid = grid.at[
+                jnp.where(hidden, GRID_SIZE, agent_positions[:, 0]), agent_positions[:, 1]
+            ].set(jnp.arange(1, num_agents + 1, dtype=jnp.int8), mode="drop")
 
             state = state.replace(coin_timer_coop=state.coin_timer_coop-1)
             state = state.replace(coin_timer_defect=state.coin_timer_defect-1)
 
-            # define jax foriloop function to update grid cell to coin value when cointimer hits 0 but only if that cell is 0, otherwise take cell value
-            def update_grid_coin_coop(i, val):
-                grid, coin_timer_coop, coop_coin = val
-                cond = jnp.logical_and(coin_timer_coop[i] == 0, grid[coop_coin[i, 0], coop_coin[i, 1]] == 0)
-                update_value = jnp.where(cond, Items.cooperation_coin, grid[coop_coin[i, 0], coop_coin[i, 1]])
-                updated_grid = grid.at[coop_coin[i, 0], coop_coin[i, 1]].set(update_value)
-                return updated_grid, coin_timer_coop, coop_coin
-
-            def update_grid_coin_defect(i, val):
-                grid, coin_timer_defect, defect_coin = val
-                cond = jnp.logical_and(coin_timer_defect[i] == 0, grid[defect_coin[i, 0], defect_coin[i, 1]] == 0)
-                update_value = jnp.where(cond, Items.defection_coin, grid[defect_coin[i, 0], defect_coin[i, 1]])
-                updated_grid = grid.at[defect_coin[i, 0], defect_coin[i, 1]].set(update_value)
-                return updated_grid, coin_timer_defect, defect_coin
-
-            # now write the foriloop for the above functions
-            grid, _, _ = jax.lax.fori_loop(0, NUM_COINS, update_grid_coin_coop, (grid, state.coin_timer_coop, state.coin_coop))
-            grid, _, _ = jax.lax.fori_loop(0, NUM_COINS, update_grid_coin_defect, (grid, state.coin_timer_defect, state.coin_defect))
+            # Respawn the coins whose timer hits 0 on their cell, if it is empty
+            def respawn_coins(grid, coins, coin_timer, item):
+                cells = grid[coins[:, 0], coins[:, 1]]
+                respawn = jnp.logical_and(coin_timer == 0, cells == Items.empty)
+                return grid.at[coins[:, 0], coins[:, 1]].set(jnp.where(respawn, jnp.int8(item), cells))
 
+            grid = respawn_coins(grid, state.coin_coop, state.coin_timer_coop, Items.cooperation_coin)
+            grid = respawn_coins(grid, state.coin_defect, state.coin_timer_defect, Items.defection_coin)
 
             key, subkey = jax.random.split(key)
             new_coop_coin_timer = jax.random.randint(
@@ -933,13 +800,9 @@ class InTheGrid(MultiAgentEnv):
 
             grid = jnp.zeros((GRID_SIZE, GRID_SIZE), jnp.int8)
 
-            def pos_fun(i, val):
-                grid, player_pos = val
-                grid = grid.at[player_pos[i, 0], player_pos[i, 1]].set(
-                jnp.int8(i+1))
-                return (grid, player_pos)
-
-            grid, _ = jax.lax.fori_loop(0, num_agents, pos_fun, (grid, player_pos))
+            grid = grid.at[player_pos[:, 0], player_pos[:, 1]].set(
+                jnp.arange(1, num_agents + 1, dtype=jnp.int8)
+            )
 
             if fixed_coin_location:
                 rand_idx = jax.random.randint(
@@ -954,15 +817,12 @@ class InTheGrid(MultiAgentEnv):
                 red_coins = coin_spawn[:NUM_COINS, :]
                 blue_coins = coin_spawn[NUM_COINS:, :]
 
-            for i in range(NUM_COINS):
-                grid = grid.at[red_coins[i, 0], red_coins[i, 1]].set(
-                    jnp.int8(Items.defection_coin)
-                )
-
-            for i in range(NUM_COINS):
-                grid = grid.at[blue_coins[i, 0], blue_coins[i, 1]].set(
-                    jnp.int8(Items.cooperation_coin)
-                )
+            grid = grid.at[red_coins[:, 0], red_coins[:, 1]].set(
+                jnp.int8(Items.defection_coin)
+            )
+            grid = grid.at[blue_coins[:, 0], blue_coins[:, 1]].set(
+                jnp.int8(Items.cooperation_coin)
+            )
             key, subkey = jax.random.split(key)
             #initialize coin timer to random numbers between 1 and 10
             coin_timer_coop = jax.random.randint(
@@ -1003,6 +863,8 @@ class InTheGrid(MultiAgentEnv):
         # for debugging
         self.get_obs = _get_obs
         self.cnn = True
+        self.packed_obs = packed_obs
+        self.obs_packing = obs_packing
 
         self.num_inner_steps = num_inner_steps
         self.num_outer_steps = num_outer_steps
@@ -1012,9 +874,11 @@ class InTheGrid(MultiAgentEnv):
             if self.cnn
             else (OBS_SIZE**2 * (len(Items) - 1 + 4),)
         )
+        if packed_obs:
+            _shape = (OBS_SIZE, OBS_SIZE, obs_packing.num_packed_channels)
         self.observation_spaces = {
             i: {"observation": spaces.Box(
-                low=0, high=1, shape=_shape, dtype=jnp.uint8),
+                low=0, high=255 if packed_obs else 1, shape=_shape, dtype=jnp.uint8),
             "inventory": spaces.Box(
                 low=0,high=NUM_COINS,shape=NUM_COIN_TYPES + 4,dtype=jnp.uint8,),
         } for i in range(self.num_agents)}
@@ -0,0 +1,6 @@
+from .cross_play import (
+    load_population,
+    make_cross_play,
+    cross_play_table,
+    save_cross_play_table,
+)
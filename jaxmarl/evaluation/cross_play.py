@@ -0,0 +1,121 @@
+""" Cross-play evaluation of checkpoint populations. """
+import csv
+import os
+import jax
+import jax.numpy as jnp
+import chex
+from typing import Callable, Dict, List, Sequence, Union
+
+from jaxmarl.environments.multi_agent_env import MultiAgentEnv
+from jaxmarl.wrappers.baselines import load_params
+
+
+def load_population(paths: Sequence[Union[str, os.PathLike]]) -> Dict:
+    """Loads checkpoints saved with `save_params` and stacks their params
+    along a leading population axis. All checkpoints must share a network."""
+    params = [load_params(path) for path in paths]
+    return jax.tree_map(lambda *x: jnp.stack(x), *params)
+
+
+def make_cross_play(
+    env: MultiAgentEnv,
+    apply_fn: Callable,
+    evaluated_agents: Sequence[str],
+    context_agents: Sequence[str],
+    num_envs: int,
+    num_steps: int,
+) -> Callable:
+    """Builds a jittable function evaluating populations against each other.
+
+    `evaluated_agents` act with params from the evaluated population and
+    `context_agents` with params from the context population, using
+    `apply_fn(params, obs) -> (pi, value)`. All other agents take zero
+    actions. The returned function
+
+        cross_play(rng, evaluated_params, context_params, paired=False)
+
+    plays `num_envs` episodes of at most `num_steps` steps for every
+    (evaluated, context) pair, with params stacked along a leading population
+    axis, and returns the undiscounted returns of the first episode with
+    shape `(num_evaluated, num_context, num_envs, num_agents)` in
+    `env.agents` order. With `paired=True` the i-th evaluated params only
+    play the i-th context params, e.g. best responses against the context
+    they were trained for, and the result is `(num_context, num_envs,
+    num_agents)`. The same env keys are used for every pair.
+    """
+    evaluated_idx = jnp.array([env.agents.index(a) for a in evaluated_agents])
+    context_idx = jnp.array([env.agents.index(a) for a in context_agents])
+
+    def _policy(params, obs, agents, rng):
+        agent_obs = jnp.stack([obs[a] for a in agents])
+        pi, _ = apply_fn(params, agent_obs.reshape(-1, agent_obs.shape[-1]))
+        return pi.sample(seed=rng).reshape(len(agents), num_envs, -1)
+
+    def rollout(rng, evaluated_params, context_params):
+        rng, _rng = jax.random.split(rng)
+        obs, env_state = jax.vmap(env.reset)(jax.random.split(_rng, num_envs))
+
+        def _env_step(carry, unused):
+            obs, env_state, returns, active, rng = carry
+            rng, _rng_e, _rng_c, _rng_s = jax.random.split(rng, 4)
+            evaluated_action = _policy(
+                evaluated_params, obs, evaluated_agents, _rng_e
+            )
+            context_action = _policy(context_params, obs, context_agents, _rng_c)
+            action = jnp.zeros((env.num_agents,) + evaluated_action.shape[1:])
+            action = action.at[evaluated_idx].set(evaluated_action)
+            action = action.at[context_idx].set(context_action)
+            env_act = {a: action[i] for i, a in enumerate(env.agents)}
+
+            obs, env_state, reward, done, _ = jax.vmap(env.step)(
+                jax.random.split(_rng_s, num_envs), env_state, env_act
+            )
+            reward = jnp.stack([reward[a] for a in env.agents], axis=-1)
+            returns = returns + reward * active[:, None]
+            active = active & ~done["__all__"]
+            return (obs, env_state, returns, active, rng), None
+
+        carry = (
+            obs,
+            env_state,
+            jnp.zeros((num_envs, env.num_agents)),
+            jnp.ones((num_envs,), dtype=bool),
+            rng,
+        )
+        (_, _, returns, _, _), _ = jax.lax.scan(_env_step, carry, None, num_steps)
+        return returns
+
+    def cross_play(rng, evaluated_params, context_params, paired=False):
+        if paired:
+            return jax.vmap(rollout, in_axes=(None, 0, 0))(
+                rng, evaluated_params, context_params
+            )
+        over_context = jax.vmap(rollout, in_axes=(None, None, 0))
+        return jax.vmap(over_context, in_axes=(None, 0, None))(
+            rng, evaluated_params, context_params
+        )
+
+    return cross_play
+
+
+def cross_play_table(
+    returns: chex.Array,
+    evaluated_names: Sequence[str],
+    context_names: Sequence[str],
+) -> List[Dict]:
+    """Flattens `(num_evaluated, num_context, num_envs)` per-episode scores,
+    e.g. the summed returns from `make_cross_play`, into tidy rows with
+    `eval`, `context`, `episode` and `return` columns."""
+    return [
+        {"eval": e, "context": c, "episode": k, "return": float(returns[i, j, k])}
+        for i, e in enumerate(evaluated_names)
+        for j, c in enumerate(context_names)
+        for k in range(returns.shape[2])
+    ]
+
+
+def save_cross_play_table(rows: List[Dict], filename: Union[str, os.PathLike]) -> None:
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["eval", "context", "episode", "return"])
+        writer.writeheader()
+        writer.writerows(rows)
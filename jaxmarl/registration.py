@@ -1,3 +1,4 @@
+import jax
 from .environments import (
     SimpleMPE,
     SimpleTagMPE,
@@ -30,8 +31,19 @@ from .environments import (
 
 
 
-def make(env_id: str, **env_kwargs):
-    """A JAX-version of OpenAI's env.make(env_name), built off Gymnax"""
+def make(
+    env_id: str,
+    reset_mode: str = "eager",
+    reset_pool_size: int = 64,
+    reset_pool_seed: int = 0,
+    **env_kwargs,
+):
+    """A JAX-version of OpenAI's env.make(env_name), built off Gymnax
+
+    `reset_mode` selects how finished episodes are reset by `env.step`, see
+    `MultiAgentEnv.set_reset_mode`. For the "pool" mode, `reset_pool_size`
+    initial states are generated from `reset_pool_seed`.
+    """
     if env_id not in registered_envs:
         raise ValueError(f"{env_id} is not in registered jaxmarl environments.")
 
@@ -106,6 +118,12 @@ def make(env_id: str, **env_kwargs):
     elif env_id == "coin_game":
         env = CoinGame(**env_kwargs)
 
+    if reset_mode != "eager":
+        env.set_reset_mode(
+            reset_mode,
+            key=jax.random.PRNGKey(reset_pool_seed),
+            pool_size=reset_pool_size,
+        )
     return env
 
 registered_envs = [
@@ -0,0 +1,59 @@
+"""
+Benchmark HanabiEnv.get_obs_array throughput (observations/sec, one per
+agent) over batches of mid-game states.
+"""
+import time
+import jax
+import jax.numpy as jnp
+from jaxmarl import make
+
+BATCH_SIZES = [1024, 4096, 16384, 65536]
+
+
+def make_states(env, key, batch_size, num_steps=10):
+    """Play a few random legal moves so that hands, hints and discards are populated."""
+
+    def play(key):
+        _, state = env.reset(key)
+
+        def _step(carry, key):
+            state, _, _ = carry
+            legal = env.get_legal_moves(state)
+            actions = {
+                a: jax.random.choice(
+                    jax.random.fold_in(key, i), env.num_moves, p=legal[a] / legal[a].sum()
+                )
+                for i, a in enumerate(env.agents)
+            }
+            _, new_state, _, _, _ = env.step_env(key, state, actions)
+            action = jnp.array([actions[a] for a in env.agents]).max()
+            return (new_state, state, action), None
+
+        carry = (state, state, jnp.int32(env.num_moves - 1))
+        return jax.lax.scan(_step, carry, jax.random.split(key, num_steps))[0]
+
+    return jax.jit(jax.vmap(play))(jax.random.split(key, batch_size))
+
+
+def benchmark(env_id="hanabi", batch_size=1024, num_iters=10, **env_kwargs):
+    env = make(env_id, **env_kwargs)
+    new_state, old_state, action = make_states(env, jax.random.PRNGKey(0), batch_size)
+    get_obs = jax.jit(jax.vmap(env.get_obs_array))
+    jax.block_until_ready(get_obs(new_state, old_state, action))
+
+    t0 = time.time()
+    for _ in range(num_iters):
+        obs = get_obs(new_state, old_state, action)
+    jax.block_until_ready(obs)
+    total_time = time.time() - t0
+    return batch_size * env.num_agents * num_iters / total_time
+
+
+def main():
+    for batch_size in BATCH_SIZES:
+        ops = benchmark(batch_size=batch_size)
+        print(f"Batch size: {batch_size}, obs/sec: {ops:.0f}")
+
+
+if __name__ == "__main__":
+    main()
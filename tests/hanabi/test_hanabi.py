@@ -3,10 +3,12 @@ import json
 import numpy as np
 import jax
 from jax import numpy as jnp
+from functools import partial
 from jaxmarl import make
 from jaxmarl.wrappers.baselines import LogWrapper
 
 env = make("hanabi")
+compact_env = make("hanabi", compact_state=True)
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
 def pad_array(arr, target_length):
@@ -55,11 +57,12 @@ def get_scores():
     return jnp.array(scores)
 
 
-def get_injected_score(deck, actions):
+def get_injected_score(deck, actions, env=env):
 
     def _env_step(env_state, action):
 
-        curr_player = jnp.where(env_state.cur_player_idx == 1, size=1)[0][0]
+        cur_player_idx = env.one_hot_state(env_state).cur_player_idx
+        curr_player = jnp.where(cur_player_idx == 1, size=1)[0][0]
         actions = jnp.array([20, 20]).at[curr_player].set(action)
         actions = {agent: action for agent, action in zip(env.agents, actions)}
 
@@ -100,6 +103,166 @@ def test_injected_decks():
     print("Test passed")
 
 
+def test_compact_state_injected_decks():
+    actions_seq = get_action_sequences()
+    decks = get_decks()
+    scores = jax.jit(jax.vmap(partial(get_injected_score, env=compact_env)))(
+        decks, actions_seq
+    )
+    assert (get_scores() == scores).all()
+
+
+def test_compact_state_matches_one_hot():
+    """Random legal rollouts give the same states, observations and rewards on both encodings."""
+
+    def _rollout(key):
+        _, state = env.reset(key)
+        _, compact = compact_env.reset(key)
+
+        def _step(carry, key):
+            state, compact = carry
+            legal = env.get_legal_moves(state)
+            compact_legal = compact_env.get_legal_moves(compact)
+            actions = {
+                a: jax.random.choice(
+                    jax.random.fold_in(key, i), env.num_moves, p=legal[a] / legal[a].sum()
+                )
+                for i, a in enumerate(env.agents)
+            }
+            obs, state, rewards, _, _ = env.step(key, state, actions)
+            c_obs, compact, c_rewards, _, _ = compact_env.step(key, compact, actions)
+            errors = jax.tree_util.tree_map(
+                lambda x, y: jnp.nanmax(jnp.abs(jnp.asarray(x, float) - jnp.asarray(y, float))),
+                (obs, legal, rewards, state),
+                (c_obs, compact_legal, c_rewards, compact_env.expand_state(compact)),
+            )
+            return (state, compact), jnp.max(jnp.stack(jax.tree_util.tree_leaves(errors)))
+
+        return jax.lax.scan(_step, (state, compact), jax.random.split(key, 100))[1]
+
+    errors = jax.jit(jax.vmap(_rollout))(jax.random.split(jax.random.PRNGKey(0), 16))
+    assert errors.max() == 0
+
+
+def test_compact_state_roundtrip():
+    _, state = env.reset(jax.random.PRNGKey(3))
+    expanded = env.expand_state(env.compress_state(state))
+    for x, y in zip(jax.tree_util.tree_leaves(state), jax.tree_util.tree_leaves(expanded)):
+        assert (jnp.asarray(x) == jnp.asarray(y)).all()
+
+
+def _random_legal_actions(env, key, legal):
+    return {
+        a: jax.random.choice(
+            jax.random.fold_in(key, i), env.num_moves, p=legal[a] / legal[a].sum()
+        )
+        for i, a in enumerate(env.agents)
+    }
+
+
+def test_variable_num_agents_mixed_batch():
+    """2 to 5 player games share one batch, and keep their player count across resets."""
+    var_env = make("hanabi", num_agents=5, variable_num_agents=True)
+    num_players = jnp.tile(jnp.arange(2, 6), 8)
+
+    def _rollout(key, num_players):
+        _, state = var_env.reset(key, num_players)
+
+        def _step(state, key):
+            legal = var_env.get_legal_moves(state)
+            actions = _random_legal_actions(var_env, key, legal)
+            obs, new_state, _, _, _ = var_env.step(key, state, actions)
+            obs = jnp.stack([obs[a] for a in var_env.agents])
+            legal = jnp.stack([legal[a] for a in var_env.agents])
+            return new_state, (new_state, obs, legal, actions)
+
+        return jax.lax.scan(_step, state, jax.random.split(key, 150))[1]
+
+    keys = jax.random.split(jax.random.PRNGKey(0), num_players.size)
+    states, obs, legal, _ = jax.jit(jax.vmap(_rollout))(keys, num_players)
+
+    active = states.active_agents
+    # the player count never changes, even after the auto-resets
+    assert (active.sum(-1) == num_players[:, None]).all()
+    assert (states.turn == 0).any(axis=1).all(), "every game should have been reset"
+    cur_player = states.cur_player_idx.argmax(-1)
+    assert (cur_player < num_players[:, None]).all()
+    # inactive agents have no cards, observe nothing and can only noop
+    assert not (states.player_hands.any(axis=(3, 4, 5)) & ~active).any()
+    assert not (obs.any(-1) & ~active).any()
+    assert (legal[..., :-1].sum(-1)[~active] == 0).all()
+    # 4 and 5 player games are played with 4 cards
+    hand_slots = states.player_hands.any(axis=(4, 5))
+    assert not hand_slots[num_players >= 4][..., 4].any()
+    assert hand_slots[num_players < 4][..., 0, 4].all()
+    # hints only target active players
+    hints = legal[..., 2 * var_env.hand_size : -1].reshape(legal.shape[:3] + (4, -1))
+    assert not (hints.any(-1) & (jnp.arange(4) >= num_players[:, None, None, None] - 1)).any()
+
+
+def test_variable_num_agents_matches_fixed():
+    """A padded game with all players active plays exactly as the fixed-size game."""
+    fixed_env = make("hanabi", num_agents=3)
+    var_env = make("hanabi", num_agents=3, variable_num_agents=True)
+
+    def _rollout(key):
+        _, state = fixed_env.reset(key)
+        _, var_state = var_env.reset(key, 3)
+
+        def _step(carry, key):
+            state, var_state = carry
+            legal = fixed_env.get_legal_moves(state)
+            var_legal = var_env.get_legal_moves(var_state)
+            actions = _random_legal_actions(fixed_env, key, legal)
+            _, state, rewards, _, _ = fixed_env.step(key, state, actions)
+            _, var_state, var_rewards, _, _ = var_env.step(key, var_state, actions)
+            errors = jax.tree_util.tree_map(
+                lambda x, y: jnp.abs(jnp.asarray(x, float) - jnp.asarray(y, float)).max(),
+                (state, legal, rewards),
+                (var_state, var_legal, var_rewards),
+            )
+            return (state, var_state), jnp.max(jnp.stack(jax.tree_util.tree_leaves(errors)))
+
+        return jax.lax.scan(_step, (state, var_state), jax.random.split(key, 100))[1]
+
+    errors = jax.jit(jax.vmap(_rollout))(jax.random.split(jax.random.PRNGKey(1), 8))
+    assert errors.max() == 0
+
+
+def test_hints_to_every_opponent_are_encoded():
+    """In 3+ player games the last action features of a hint name the hinted
+    opponent and the revealed colour/rank, whichever opponent is hinted."""
+    env3 = make("hanabi", num_agents=3)
+    _, state = env3.reset(jax.random.PRNGKey(0))
+    acting = int(jnp.argmax(state.cur_player_idx))
+    num_hints = env3.num_colors + env3.num_ranks
+    noop = env3.num_moves - 1
+    for offset in range(1, env3.num_agents):
+        for hint in [0, env3.num_colors + 2]:
+            action = 2 * env3.hand_size + (offset - 1) * num_hints + hint
+            actions = {a: noop for a in env3.agents}
+            actions[env3.agents[acting]] = action
+            _, new_state, _, _, _ = env3.step_env(jax.random.PRNGKey(1), state, actions)
+            target = (acting + offset) % env3.num_agents
+            hand = state.player_hands[target]
+            if hint < env3.num_colors:
+                caught = hand[:, hint].sum(-1)
+            else:
+                caught = hand[:, :, hint - env3.num_colors].sum(-1)
+            for aidx in range(env3.num_agents):
+                feats = env3.get_last_action_feats_(aidx, state, new_state, action)
+                assert feats["move_type"][2 + (hint >= env3.num_colors)] == 1
+                assert feats["move_type"].sum() == 1
+                assert jnp.argmax(feats["target_player_relative_index"]) == (
+                    (target - aidx) % env3.num_agents
+                )
+                revealed = jnp.concatenate(
+                    [feats["color_revealed"], feats["rank_revealed"]]
+                )
+                assert jnp.all(revealed == jax.nn.one_hot(hint, num_hints))
+                assert jnp.all(feats["reveal_outcome"] == caught)
+
+
 def main():
     test_injected_decks()
 
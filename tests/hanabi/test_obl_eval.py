@@ -0,0 +1,84 @@
+"""
+Test the batched evaluation of OBL R2D2 agents
+"""
+import jax
+import jax.numpy as jnp
+from jaxmarl import make
+from jaxmarl.wrappers.baselines import save_params
+from jaxmarl.environments.hanabi.pretrained import (
+    OBLAgentR2D2,
+    load_weight_sets,
+    make_obl_evaluation,
+    score_distribution,
+)
+
+env = make("hanabi")
+agent = OBLAgentR2D2(hid_dim=32)
+
+
+def init_params(key):
+    obs = jnp.zeros((1, env.observation_space(env.agents[0]).n))
+    carry = agent.initialize_carry(key, batch_dims=(1,))
+    return agent.init(key, carry, (obs, obs[..., 125:]))
+
+
+def play_single_game(rng, game, num_games, params0, params1, max_steps):
+    """Plays the `game`-th of the batched games on its own with `greedy_act`,
+    as in `obl_r2d2_agent_test.py`, drawing the same keys."""
+    rng, _rng = jax.random.split(rng)
+    obs, env_state = env.reset(jax.random.split(_rng, num_games)[game])
+    carry = agent.initialize_carry(jax.random.PRNGKey(0), batch_dims=(2,))
+    score, active = 0.0, True
+    for _ in range(max_steps):
+        legal_moves = env.get_legal_moves(env_state)
+        actions, new_carry = {}, []
+        for i, (a, params) in enumerate(zip(env.agents, [params0, params1])):
+            c, action = agent.greedy_act(
+                params,
+                jax.tree_map(lambda x: x[:, i : i + 1], carry),
+                (obs[a][None], legal_moves[a][None]),
+            )
+            new_carry.append(c)
+            actions[a] = action[0]
+        carry = jax.tree_map(lambda *x: jnp.concatenate(x, axis=1), *new_carry)
+        rng, _rng = jax.random.split(rng)
+        obs, env_state, rewards, dones, _ = env.step(
+            jax.random.split(_rng, num_games)[game], env_state, actions
+        )
+        score += float(rewards["__all__"]) * active
+        active = active and not bool(dones["__all__"])
+    return score
+
+
+def test_obl_evaluation(tmp_path):
+    for i in range(2):
+        (tmp_path / f"set{i}").mkdir()
+        save_params(init_params(jax.random.PRNGKey(i)), tmp_path / f"set{i}" / "a.safetensors")
+    names, params = load_weight_sets(tmp_path)
+    assert names == ["set0/a", "set1/a"]
+
+    num_games, max_steps = 16, 80
+    evaluate = jax.jit(
+        make_obl_evaluation(env, agent, num_games, max_steps), static_argnums=3
+    )
+    rng = jax.random.PRNGKey(0)
+    scores = evaluate(rng, params, params)
+    assert scores.shape == (2, 2, num_games)
+    self_play = evaluate(rng, params, params, True)
+    assert jnp.allclose(self_play, jnp.diagonal(scores).T)
+
+    # the batched games match playing them one by one, on the games the
+    # random weights happen to score in and a few others
+    assert jnp.any(scores > 0)
+    param_sets = [jax.tree_map(lambda x: x[i], params) for i in range(2)]
+    games = [(i, j, g) for i, j, g in zip(*jnp.nonzero(scores > 0))]
+    games += [(0, 1, 0), (1, 0, 1)]
+    for i, j, g in games:
+        expected = play_single_game(
+            rng, int(g), num_games, param_sets[i], param_sets[j], max_steps
+        )
+        assert jnp.isclose(scores[i, j, g], expected)
+
+    stats = score_distribution(scores)
+    assert stats["mean"].shape == (2, 2)
+    assert jnp.all(stats["histogram"].sum(-1) == num_games)
@@ -141,6 +141,178 @@ zoo_mpe_env_mapper = {
     "MPE_simple_reference_v3": simple_reference_v3,
 }
 
+@pytest.mark.parametrize(
+    "env_name,env_kwargs,spread",
+    [
+        ("MPE_simple_spread_v3", {}, 0.4),
+        ("MPE_simple_facmac_9a_v1", {}, 0.4),
+        (
+            "MPE_simple_spread_v3",
+            {"num_agents": 40, "num_landmarks": 40, "max_neighbors": 16},
+            1.9,
+        ),
+    ],
+)
+def test_cell_list_collisions_match_dense(env_name, env_kwargs, spread):
+    env = make(env_name, **env_kwargs)
+    env_cell = make(env_name, collision_mode="cell_list", **env_kwargs)
+    key = jax.random.PRNGKey(0)
+    for _ in range(10):
+        key, key_r, key_p = jax.random.split(key, 3)
+        _, state = env.reset(key_r)
+        # pack entities together so that plenty of them collide, the large
+        # env is spread over the grid instead to stay below its small cap
+        state = state.replace(p_pos=state.p_pos * spread)
+        # the forces are only exact when no entity has too many candidates
+        assert not jnp.any(env_cell.collision_overflow(state))
+        p_force = jax.random.normal(key_p, (env.num_entities, 2))
+        assert jnp.allclose(
+            env._apply_environment_force(p_force, state),
+            env_cell._apply_environment_force(p_force, state),
+            atol=1e-4,
+        )
+
+
+def test_cell_list_reports_overflow():
+    env = make(
+        "MPE_simple_spread_v3",
+        num_agents=40,
+        num_landmarks=40,
+        collision_mode="cell_list",
+        max_neighbors=16,
+    )
+    key = jax.random.PRNGKey(0)
+    _, state = env.reset(key)
+    state = state.replace(p_pos=state.p_pos * 1.9)
+    actions = {agent: 0 for agent in env.agents}
+    _, _, _, _, info = env.step_env(key, state, actions)
+    assert not jnp.any(info["collision_overflow"])
+    # stack all agents into a single cell
+    state = state.replace(p_pos=state.p_pos * 0.01)
+    _, _, _, _, info = env.step_env(key, state, actions)
+    assert jnp.all(info["collision_overflow"][: env.num_agents])
+    env = make("MPE_simple_spread_v3")
+    _, state = env.reset(key)
+    actions = {agent: 0 for agent in env.agents}
+    assert "collision_overflow" not in env.step_env(key, state, actions)[4]
+
+
+def _loop_prey_policy(env, key, state, aidx):
+    """The per-prey planner as it was before it was vmapped, with the
+    waypoints checked one at a time."""
+    n = env.num_prey_candidates
+    key, _key = jax.random.split(key)
+    length = jnp.sqrt(jax.random.uniform(_key, (n,), minval=0., maxval=1.))
+    key, _key = jax.random.split(key)
+    angle = jnp.pi * jnp.sqrt(jax.random.uniform(_key, (n,), minval=0., maxval=2.))
+    x = length * jnp.cos(angle)
+    y = length * jnp.sin(angle)
+    scores = jnp.zeros(n, dtype=jnp.float32)
+    n_iter = 5
+    if env.score_function == "sum":
+        for i in range(n_iter):
+            waypoints_length = (length / float(n_iter)) * (i + 1)
+            x_wp = waypoints_length * jnp.cos(angle)
+            y_wp = waypoints_length * jnp.sin(angle)
+            proj_pos = jnp.vstack((x_wp, y_wp)).transpose() + state.p_pos[aidx]
+            delta_pos = state.p_pos[None, :, :] - proj_pos[:, None, :]
+            dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos), axis=2))
+            dist_min = env.rad + env.rad[aidx]
+            scores = jnp.where((dist < dist_min[None]).sum(axis=1), scores, -9999999)
+            if i == n_iter - 1:
+                scores += dist[:, :env.num_adversaries].sum(axis=1)
+    else:
+        proj_pos = jnp.vstack((x, y)).transpose() + state.p_pos[aidx]
+        rel_dis = jnp.sqrt(jnp.sum(jnp.square(state.p_pos[aidx] - state.p_pos[:env.num_adversaries])))
+        min_dist_adv_idx = jnp.argmin(rel_dis)
+        delta_pos = state.p_pos[:env.num_adversaries][None, :, :] - proj_pos[:, None, :]
+        dist = jnp.sqrt(jnp.sum(jnp.square(delta_pos), axis=2))
+        dist_min = env.rad[:env.num_adversaries] + env.rad[aidx]
+        scores = jnp.where((dist < dist_min[None]).sum(axis=1), scores, -9999999)
+        scores += dist[:, min_dist_adv_idx]
+    best_idx = jnp.argmax(scores)
+    chosen_action = jnp.array([x[best_idx], y[best_idx]], dtype=jnp.float32)
+    return jax.lax.select(scores[best_idx] < 0, chosen_action * 0.0, chosen_action)
+
+
+@pytest.mark.parametrize("score_function", ["sum", "min"])
+def test_facmac_prey_policy_matches_loop(score_function):
+    from jaxmarl.environments.mpe.simple_facmac import SimpleFacmacMPE
+
+    env = SimpleFacmacMPE(
+        num_good_agents=3,
+        num_adversaries=9,
+        num_landmarks=6,
+        score_function=score_function,
+    )
+    prey_idx = jnp.arange(env.num_good_agents) + env.num_adversaries
+    key = jax.random.PRNGKey(0)
+    for _ in range(5):
+        key, key_r, key_p = jax.random.split(key, 3)
+        _, state = env.reset(key_r)
+        # pack entities together so that some waypoints collide
+        state = state.replace(p_pos=state.p_pos * 0.3)
+        keys = jax.random.split(key_p, env.num_good_agents)
+        prey_actions = env._prey_policy(keys, state, prey_idx)
+        for i in range(env.num_good_agents):
+            expected = _loop_prey_policy(env, keys[i], state, prey_idx[i])
+            assert jnp.allclose(prey_actions[i], expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("score_function", ["sum", "min"])
+def test_facmac_prey_plan_independently(score_function):
+    from jaxmarl.environments.mpe.simple_facmac import SimpleFacmacMPE
+
+    env = SimpleFacmacMPE(
+        num_good_agents=3,
+        num_adversaries=9,
+        num_landmarks=6,
+        score_function=score_function,
+        num_prey_candidates=20,
+    )
+    key = jax.random.PRNGKey(0)
+    _, state = env.reset(key)
+    prey_idx = jnp.arange(env.num_good_agents) + env.num_adversaries
+    keys = jax.random.split(key, env.num_good_agents)
+    prey_actions = env._prey_policy(keys, state, prey_idx)
+    assert prey_actions.shape == (env.num_good_agents, 2)
+    # each prey plans from its own position with its own key
+    for i in range(env.num_good_agents):
+        single = env._prey_policy(keys[i : i + 1], state, prey_idx[i : i + 1])
+        assert jnp.allclose(prey_actions[i], single[0])
+
+
+def test_facmac_prey_keys_differ():
+    from jaxmarl.environments.mpe.simple_facmac import SimpleFacmacMPE
+
+    env = SimpleFacmacMPE(
+        num_good_agents=3, num_adversaries=9, num_landmarks=6, num_prey_candidates=1000
+    )
+    key = jax.random.PRNGKey(0)
+    _, state = env.reset(key)
+    # stack the prey so that only their keys tell their candidates apart
+    prey_idx = jnp.arange(env.num_good_agents) + env.num_adversaries
+    state = state.replace(
+        p_pos=state.p_pos.at[prey_idx].set(state.p_pos[prey_idx[0]]),
+        p_vel=jnp.zeros_like(state.p_vel),
+    )
+    prey_actions = env._prey_policy(
+        jax.random.split(key, env.num_good_agents), state, prey_idx
+    )
+    assert jnp.all(jnp.abs(prey_actions).sum(-1) > 0)
+    same_key = env._prey_policy(
+        jnp.stack([key] * env.num_good_agents), state, prey_idx
+    )
+    assert jnp.allclose(same_key, same_key[0])
+    # the step splits off a separate key for each prey, so they move apart
+    actions = {a: jnp.zeros(5) for a in env.agents}
+    _, new_state, _, _, _ = env.step_env(key, state, actions)
+    prey_vel = new_state.p_vel[prey_idx]
+    for i in range(1, env.num_good_agents):
+        assert not jnp.allclose(prey_actions[0], prey_actions[i])
+        assert not jnp.allclose(prey_vel[0], prey_vel[i])
+
+
 if __name__=="__main__":
     print(' *** Testing MPE ***')
     act_type = DISCRETE_ACT
@@ -156,9 +328,3 @@ if __name__=="__main__":
 
 
     print(' *** All tests passed ***')
-    
-    
-    
-    
-    
-    
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Test the Overcooked environment
+"""
+import jax
+import jax.numpy as jnp
+import pytest
+from flax.core.frozen_dict import FrozenDict
+from jaxmarl.environments.overcooked import Overcooked, overcooked_layouts
+from jaxmarl.environments.overcooked.common import OBJECT_TO_INDEX
+from jaxmarl.environments.overcooked.overcooked import (
+    POT_EMPTY_STATUS,
+    POT_FULL_STATUS,
+    POT_READY_STATUS,
+    MAX_ONIONS_IN_POT,
+    URGENCY_CUTOFF,
+)
+
+LAYOUT_NAMES = ["cramped_room", "asymm_advantages", "coord_ring", "counter_circuit"]
+
+TOMATO_CHANNELS = [13, 17, 19, 24]
+
+
+def _reference_obs(env, state):
+    """Observation built channel by channel, separately for each agent."""
+    width = env.width
+    height = env.height
+    n_channels = 26
+    padding = (state.maze_map.shape[0]-height) // 2
+
+    maze_map = state.maze_map[padding:-padding, padding:-padding, 0]
+    soup_loc = jnp.array(maze_map == OBJECT_TO_INDEX["dish"], dtype=jnp.uint8)
+
+    pot_loc_layer = jnp.array(maze_map == OBJECT_TO_INDEX["pot"], dtype=jnp.uint8)
+    pot_status = state.maze_map[padding:-padding, padding:-padding, 2] * pot_loc_layer
+    onions_in_pot_layer = jnp.minimum(POT_EMPTY_STATUS - pot_status, MAX_ONIONS_IN_POT) * (pot_status >= POT_FULL_STATUS)    # 0/1/2/3, as long as not cooking or not done
+    onions_in_soup_layer = jnp.minimum(POT_EMPTY_STATUS - pot_status, MAX_ONIONS_IN_POT) * (pot_status < POT_FULL_STATUS) \
+                           * pot_loc_layer + MAX_ONIONS_IN_POT * soup_loc   # 0/3, as long as cooking or done
+    pot_cooking_time_layer = pot_status * (pot_status < POT_FULL_STATUS)                           # Timer: 19 to 0
+    soup_ready_layer = pot_loc_layer * (pot_status == POT_READY_STATUS) + soup_loc                 # Ready soups, plated or not
+    urgency_layer = jnp.ones(maze_map.shape, dtype=jnp.uint8) * ((env.max_steps - state.time) < URGENCY_CUTOFF)
+
+    agent_pos_layers = jnp.zeros((2, height, width), dtype=jnp.uint8)
+    agent_pos_layers = agent_pos_layers.at[0, state.agent_pos[0, 1], state.agent_pos[0, 0]].set(1)
+    agent_pos_layers = agent_pos_layers.at[1, state.agent_pos[1, 1], state.agent_pos[1, 0]].set(1)
+
+    # Add agent inv: This works because loose items and agent cannot overlap
+    agent_inv_items = jnp.expand_dims(state.agent_inv,(1,2)) * agent_pos_layers
+    maze_map = jnp.where(jnp.sum(agent_pos_layers,0), agent_inv_items.sum(0), maze_map)
+    soup_ready_layer = soup_ready_layer \
+                       + (jnp.sum(agent_inv_items,0) == OBJECT_TO_INDEX["dish"]) * jnp.sum(agent_pos_layers,0)
+    onions_in_soup_layer = onions_in_soup_layer \
+                           + (jnp.sum(agent_inv_items,0) == OBJECT_TO_INDEX["dish"]) * 3 * jnp.sum(agent_pos_layers,0)
+
+    env_layers = [
+        jnp.array(maze_map == OBJECT_TO_INDEX["pot"], dtype=jnp.uint8),       # Channel 10
+        jnp.array(maze_map == OBJECT_TO_INDEX["wall"], dtype=jnp.uint8),
+        jnp.array(maze_map == OBJECT_TO_INDEX["onion_pile"], dtype=jnp.uint8),
+        jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomato pile
+        jnp.array(maze_map == OBJECT_TO_INDEX["plate_pile"], dtype=jnp.uint8),
+        jnp.array(maze_map == OBJECT_TO_INDEX["goal"], dtype=jnp.uint8),        # 15
+        jnp.array(onions_in_pot_layer, dtype=jnp.uint8),
+        jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes in pot
+        jnp.array(onions_in_soup_layer, dtype=jnp.uint8),
+        jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes in soup
+        jnp.array(pot_cooking_time_layer, dtype=jnp.uint8),                     # 20
+        jnp.array(soup_ready_layer, dtype=jnp.uint8),
+        jnp.array(maze_map == OBJECT_TO_INDEX["plate"], dtype=jnp.uint8),
+        jnp.array(maze_map == OBJECT_TO_INDEX["onion"], dtype=jnp.uint8),
+        jnp.zeros(maze_map.shape, dtype=jnp.uint8),                           # tomatoes
+        urgency_layer,                                                          # 25
+    ]
+
+    # Agent related layers
+    agent_direction_layers = jnp.zeros((8, height, width), dtype=jnp.uint8)
+    dir_layer_idx = state.agent_dir_idx+jnp.array([0,4])
+    agent_direction_layers = agent_direction_layers.at[dir_layer_idx,:,:].set(agent_pos_layers)
+
+    # Both agent see their layers first, then the other layer
+    alice_obs = jnp.zeros((n_channels, height, width), dtype=jnp.uint8)
+    alice_obs = alice_obs.at[0:2].set(agent_pos_layers)
+
+    alice_obs = alice_obs.at[2:10].set(agent_direction_layers)
+    alice_obs = alice_obs.at[10:].set(jnp.stack(env_layers))
+
+    bob_obs = jnp.zeros((n_channels, height, width), dtype=jnp.uint8)
+    bob_obs = bob_obs.at[0].set(agent_pos_layers[1]).at[1].set(agent_pos_layers[0])
+    bob_obs = bob_obs.at[2:6].set(agent_direction_layers[4:]).at[6:10].set(agent_direction_layers[0:4])
+    bob_obs = bob_obs.at[10:].set(jnp.stack(env_layers))
+
+    alice_obs = jnp.transpose(alice_obs, (1, 2, 0))
+    bob_obs = jnp.transpose(bob_obs, (1, 2, 0))
+
+    return jnp.stack([alice_obs, bob_obs])
+
+
+def rollout(env, key, num_steps=100, layout_idx=None):
+    key, key_reset = jax.random.split(key)
+    obs, state = env.reset_array(key_reset, layout_idx)
+    trajectory = [(obs, state.agent_pos, jnp.zeros(env.num_agents))]
+    for _ in range(num_steps):
+        key, key_act, key_step = jax.random.split(key, 3)
+        actions = jax.random.randint(key_act, (env.num_agents,), 0, len(env.action_set))
+        obs, state, rewards, _, _ = env.step_array(key_step, state, actions)
+        trajectory.append((obs, state.agent_pos, rewards))
+    return trajectory
+
+
+@pytest.mark.parametrize("layout_idx", range(len(LAYOUT_NAMES)))
+def test_padded_layout_matches_single_layout(layout_idx):
+    layout = FrozenDict(overcooked_layouts[LAYOUT_NAMES[layout_idx]])
+    single = Overcooked(layout=layout)
+    multi = Overcooked(layout=[FrozenDict(overcooked_layouts[l]) for l in LAYOUT_NAMES])
+    h, w = layout["height"], layout["width"]
+
+    key = jax.random.PRNGKey(0)
+    for (obs, pos, rew), (obs_m, pos_m, rew_m) in zip(
+        rollout(single, key), rollout(multi, key, layout_idx=layout_idx)
+    ):
+        assert jnp.all(obs == obs_m[:, :h, :w])
+        assert jnp.all(pos == pos_m)
+        assert jnp.all(rew == rew_m)
+
+
+def test_mixed_layout_batch():
+    env = Overcooked(layout=[FrozenDict(overcooked_layouts[l]) for l in LAYOUT_NAMES])
+    num_envs = 64
+    obs, state = jax.jit(jax.vmap(env.reset_array))(jax.random.split(jax.random.PRNGKey(0), num_envs))
+    assert obs.shape == (num_envs, env.num_agents, env.height, env.width, 26)
+    assert set(state.layout_idx.tolist()) == set(range(len(LAYOUT_NAMES)))
+    # cells outside of the sampled layout are walls
+    assert jnp.all(state.wall_map == env.layout_wall_maps[state.layout_idx])
+
+    step = jax.jit(jax.vmap(env.step_array))
+    actions = jnp.full((num_envs, env.num_agents), 4)
+    _, next_state, _, _, _ = step(jax.random.split(jax.random.PRNGKey(1), num_envs), state, actions)
+    assert jnp.all(next_state.layout_idx == state.layout_idx)
+
+
+@pytest.mark.parametrize("random_reset", [False, True])
+def test_obs_matches_reference(random_reset):
+    env = Overcooked(
+        layout=[FrozenDict(overcooked_layouts[l]) for l in LAYOUT_NAMES],
+        random_reset=random_reset,
+        max_steps=60,
+    )
+    env_no_tomato = Overcooked(
+        layout=[FrozenDict(overcooked_layouts[l]) for l in LAYOUT_NAMES],
+        random_reset=random_reset,
+        max_steps=60,
+        tomato_channels=False,
+    )
+    keep = [c for c in range(26) if c not in TOMATO_CHANNELS]
+    assert env_no_tomato.obs_shape[-1] == len(keep)
+
+    reference_obs = jax.jit(jax.vmap(lambda state: _reference_obs(env, state)))
+    get_obs = jax.jit(jax.vmap(env.get_obs_array))
+    get_obs_no_tomato = jax.jit(jax.vmap(env_no_tomato.get_obs_array))
+    reset = jax.jit(jax.vmap(env.reset_array))
+    step = jax.jit(jax.vmap(env.step_array))
+
+    num_envs = 32
+    key = jax.random.PRNGKey(0)
+    key, key_reset = jax.random.split(key)
+    _, state = reset(jax.random.split(key_reset, num_envs))
+    for _ in range(60):
+        expected = reference_obs(state)
+        assert jnp.all(get_obs(state) == expected)
+        assert jnp.all(get_obs_no_tomato(state) == expected[..., keep])
+        key, key_act, key_step = jax.random.split(key, 3)
+        actions = jax.random.randint(key_act, (num_envs, env.num_agents), 0, len(env.action_set))
+        _, state, _, _, _ = step(jax.random.split(key_step, num_envs), state, actions)
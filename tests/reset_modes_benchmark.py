@@ -0,0 +1,72 @@
+"""
+Benchmark the auto-reset modes of MultiAgentEnv.step, reporting per-env
+steps/sec for every mode.
+"""
+import time
+import jax
+import jax.numpy as jnp
+from jaxmarl import make
+
+ENV_IDS = ["MPE_simple_spread_v3", "SMAX", "hanabi", "overcooked", "storm"]
+MODES = ["eager", "pool", "deferred"]
+
+
+def make_rollout(env, num_envs, num_steps, num_chunks):
+    def sample_actions(key):
+        key_a = jax.random.split(key, env.num_agents)
+        return {
+            agent: jax.vmap(env.action_space(agent).sample)(
+                jax.random.split(key_a[i], num_envs)
+            )
+            for i, agent in enumerate(env.agents)
+        }
+
+    def env_step(carry, _):
+        obs, state, key = carry
+        key, key_act, key_step = jax.random.split(key, 3)
+        actions = sample_actions(key_act)
+        obs, state, _, dones, _ = jax.vmap(env.step)(
+            jax.random.split(key_step, num_envs), state, actions
+        )
+        return (obs, state, key), dones["__all__"]
+
+    def chunk(carry, _):
+        (obs, state, key), dones = jax.lax.scan(env_step, carry, None, num_steps)
+        if env.reset_mode == "deferred":
+            # reset every env that finished during the chunk
+            key, key_reset = jax.random.split(key)
+            obs, state = jax.vmap(env.reset_done)(
+                jax.random.split(key_reset, num_envs), obs, state, dones.any(0)
+            )
+        return (obs, state, key), None
+
+    @jax.jit
+    def rollout(key):
+        key, key_reset = jax.random.split(key)
+        obs, state = jax.vmap(env.reset)(jax.random.split(key_reset, num_envs))
+        (_, state, _), _ = jax.lax.scan(chunk, (obs, state, key), None, num_chunks)
+        return state
+
+    return rollout
+
+
+def benchmark(env_id, mode, num_envs=256, num_steps=128, num_chunks=4):
+    env = make(env_id, reset_mode=mode, reset_pool_size=256)
+    rollout = make_rollout(env, num_envs, num_steps, num_chunks)
+    jax.block_until_ready(rollout(jax.random.PRNGKey(0)))
+
+    t0 = time.time()
+    jax.block_until_ready(rollout(jax.random.PRNGKey(1)))
+    total_time = time.time() - t0
+    return num_envs * num_steps * num_chunks / total_time
+
+
+def main():
+    for env_id in ENV_IDS:
+        for mode in MODES:
+            sps = benchmark(env_id, mode)
+            print(f"Env: {env_id}, Mode: {mode}, SPS: {sps:.0f}")
+
+
+if __name__ == "__main__":
+    main()
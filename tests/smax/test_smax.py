@@ -2,6 +2,7 @@ import jax.numpy as jnp
 import jax
 from jaxmarl import make
 from jaxmarl.environments.smax.smax_env import State
+from jaxmarl.environments.smax import map_name_to_scenario
 import pytest
 
 
@@ -637,3 +638,100 @@ def test_world_state(do_jit):
         end_idx = idx + env.num_enemies
         world_state = world_state.at[idx:end_idx].set(jnp.ones((env.num_enemies,)))
         assert jnp.allclose(obs["world_state"], world_state)
+
+
+@pytest.mark.parametrize(
+    ("map_name", "observation_type", "max_neighbors", "map_size"),
+    [
+        ("3m", "unit_list", None, 32),
+        ("27m_vs_30m", "unit_list", None, 32),
+        ("smacv2_10_units", "unit_list", 14, 64),
+        ("smacv2_20_units", "unit_list", 28, 128),
+        ("3m", "conic", None, 32),
+        ("smacv2_10_units", "conic", 14, 64),
+    ],
+)
+def test_cell_list_matches_dense(map_name, observation_type, max_neighbors, map_size):
+    scenario = map_name_to_scenario(map_name)
+    env_kwargs = dict(
+        scenario=scenario,
+        observation_type=observation_type,
+        map_width=map_size,
+        map_height=map_size,
+    )
+    dense_env = make("SMAX", **env_kwargs)
+    cell_env = make(
+        "SMAX", neighbor_mode="cell_list", max_neighbors=max_neighbors, **env_kwargs
+    )
+    key = jax.random.PRNGKey(0)
+    key, key_reset = jax.random.split(key)
+    _, state = dense_env.reset(key_reset)
+    num_compared = 0
+    for _ in range(10):
+        key, key_actions, key_step = jax.random.split(key, 3)
+        avail_actions = dense_env.get_avail_actions(state)
+        # the cell list is only exact when no unit has too many candidates;
+        # the teams spawn clustered, so the caps above leave room for a whole
+        # team plus a few stragglers
+        _, _, overflow = cell_env.get_neighbors(state)
+        assert not jnp.any(overflow)
+        cell_avail_actions = cell_env.get_avail_actions(state)
+        dense_obs = dense_env.get_obs(state)
+        cell_obs = cell_env.get_obs(state)
+        for agent in dense_env.agents:
+            assert jnp.all(avail_actions[agent] == cell_avail_actions[agent])
+            assert jnp.allclose(dense_obs[agent], cell_obs[agent], atol=1e-5)
+        assert jnp.allclose(
+            dense_env._push_units_away(state).unit_positions,
+            cell_env._push_units_away(state).unit_positions,
+            atol=1e-5,
+        )
+        num_compared += 1
+        key_a = jax.random.split(key_actions, num=dense_env.num_agents)
+        actions = {
+            agent: jax.random.categorical(
+                key_a[i], jnp.log(avail_actions[agent].astype(jnp.float32))
+            )
+            for i, agent in enumerate(dense_env.agents)
+        }
+        _, state, _, _, _ = dense_env.step(key_step, state, actions)
+    assert num_compared > 0
+
+
+def test_cell_list_reports_overflow():
+    scenario = map_name_to_scenario("27m_vs_30m")
+    env = make("SMAX", scenario=scenario, neighbor_mode="cell_list", max_neighbors=32)
+    key = jax.random.PRNGKey(0)
+    _, state = env.reset(key)
+    _, _, overflow = env.get_neighbors(state)
+    actions = {agent: 0 for agent in env.agents}
+    _, _, _, _, infos = env.step(key, state, actions)
+    # the teams spawn clustered, so some units have more than 32 candidates
+    assert jnp.any(overflow)
+    assert jnp.any(infos["neighbor_overflow"])
+    assert jnp.all(env.neighbor_grid.overflow(state.unit_positions) == overflow)
+    # by default the cap can't be exceeded by units that don't overlap
+    assert make("SMAX", scenario=scenario, neighbor_mode="cell_list").max_neighbors == 57
+    assert "neighbor_overflow" not in make("SMAX", scenario=scenario).step(
+        key, state, actions
+    )[4]
+
+
+def test_avail_actions_match_attack_targets():
+    key = jax.random.PRNGKey(0)
+    env, _, state = create_env(key)
+    unit_positions = state.unit_positions.at[0].set(jnp.array([1.0, 1.0]))
+    unit_positions = unit_positions.at[env.num_allies].set(jnp.array([1.0, 2.0]))
+    unit_positions = unit_positions.at[env.num_allies + 1].set(jnp.array([1.0, 5.0]))
+    state = state.replace(unit_positions=unit_positions)
+    avail_actions = env.get_avail_actions(state)
+    for i, agent in enumerate(env.agents):
+        for action in range(env.num_movement_actions, len(avail_actions[agent])):
+            target = env.attack_targets[env.teams[i], action]
+            in_range = (
+                jnp.linalg.norm(state.unit_positions[i] - state.unit_positions[target])
+                < env.unit_type_attack_ranges[state.unit_types[i]]
+            )
+            assert avail_actions[agent][action] == (in_range & state.unit_alive[target])
+    assert avail_actions["ally_0"][env.num_movement_actions] == 1
+    assert avail_actions["ally_0"][env.num_movement_actions + 1] == 0
@@ -0,0 +1,50 @@
+"""
+Benchmark STORM env steps/sec over batches of environments, for several
+numbers of agents. Actions are random, with frequent interactions.
+"""
+import time
+import jax
+import jax.numpy as jnp
+from jaxmarl import make
+
+NUM_AGENTS = [2, 4, 8]
+BATCH_SIZES = [256, 4096]
+
+
+def benchmark(num_agents=2, batch_size=256, num_steps=100, num_iters=3, **env_kwargs):
+    env = make("storm", num_agents=num_agents, **env_kwargs)
+
+    def rollout(key):
+        key, key_reset = jax.random.split(key)
+        _, state = env.reset(key_reset)
+
+        def _step(state, key):
+            key_act, key_zap, key_step = jax.random.split(key, 3)
+            actions = jax.random.randint(key_act, (num_agents,), 0, 5)
+            actions = jnp.where(jax.random.uniform(key_zap, (num_agents,)) < 0.4, 3, actions)
+            _, state, rewards, _, _ = env.step_env(key_step, state, list(actions))
+            return state, rewards
+
+        return jax.lax.scan(_step, state, jax.random.split(key, num_steps))
+
+    run = jax.jit(jax.vmap(rollout))
+    keys = jax.random.split(jax.random.PRNGKey(0), batch_size)
+    jax.block_until_ready(run(keys))
+
+    t0 = time.time()
+    for _ in range(num_iters):
+        out = run(keys)
+    jax.block_until_ready(out)
+    total_time = time.time() - t0
+    return batch_size * num_steps * num_iters / total_time
+
+
+def main():
+    for num_agents in NUM_AGENTS:
+        for batch_size in BATCH_SIZES:
+            sps = benchmark(num_agents=num_agents, batch_size=batch_size)
+            print(f"Agents: {num_agents}, batch size: {batch_size}, steps/sec: {sps:.0f}")
+
+
+if __name__ == "__main__":
+    main()
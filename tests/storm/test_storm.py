@@ -0,0 +1,108 @@
+"""
+Test the STORM environments against recorded rollouts
+"""
+import dataclasses
+import os
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+from jaxmarl import make
+
+ROLLOUTS = np.load(os.path.join(os.path.dirname(__file__), "storm_rollouts.npz"))
+FREEZE_PENALTY = 5
+
+
+def replay(env_id, num_agents, seed):
+    """Replays a recorded rollout and checks every state, observation and reward.
+
+    The rollouts were recorded before agent interactions were rewritten to give every
+    interacting pair its reward, so the replay stops at the first interaction.
+    """
+    prefix = f"{env_id}_{num_agents}_{seed}_"
+    kwargs = {"num_agents": num_agents} if env_id == "storm" else {}
+    env = make(env_id, num_inner_steps=40, num_outer_steps=3, **kwargs)
+    step = jax.jit(env.step_env)
+
+    def check(t, obs, state):
+        for f in dataclasses.fields(state):
+            expected = ROLLOUTS[prefix + "state_" + f.name][t]
+            assert np.array_equal(np.asarray(getattr(state, f.name)), expected), (t, f.name)
+        if prefix + "obs_0" in ROLLOUTS and t < ROLLOUTS[prefix + "obs_0"].shape[0]:
+            for i, leaf in enumerate(jax.tree_util.tree_leaves(obs)):
+                assert np.array_equal(np.asarray(leaf), ROLLOUTS[prefix + f"obs_{i}"][t]), (t, i)
+
+    key = jax.random.PRNGKey(seed)
+    key, key_reset = jax.random.split(key)
+    obs, state = env.reset(key_reset)
+    check(0, obs, state)
+    for t, actions in enumerate(ROLLOUTS[prefix + "actions"]):
+        key, _, key_step = jax.random.split(key, 3)
+        actions = list(actions) if env_id == "storm" else tuple(actions)
+        obs, state, reward, done, _ = step(key_step, state, actions)
+        recorded_freezes = ROLLOUTS[prefix + "state_agent_freezes"][t + 1]
+        if jnp.any(state.agent_freezes == FREEZE_PENALTY) or np.any(recorded_freezes == FREEZE_PENALTY):
+            return t
+        check(t + 1, obs, state)
+        assert done["__all__"] == ROLLOUTS[prefix + "done"][t]
+        rewards = np.stack([np.asarray(r) for r in jax.tree_util.tree_leaves(reward)])
+        assert np.allclose(rewards, ROLLOUTS[prefix + "rewards"][t])
+    return t
+
+
+@pytest.mark.parametrize("num_agents", [2, 3, 4, 8])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_storm_matches_recorded_rollouts(num_agents, seed):
+    replay("storm", num_agents, seed)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_storm_2p_matches_recorded_rollouts(seed):
+    replay("storm_2p", 2, seed)
+
+
+def _facing_state(env, num_agents, inventories):
+    """Agents 0 and 1 face each other, the others stand on the first row."""
+    _, state = env.reset(jax.random.PRNGKey(0))
+    pos = jnp.array(
+        [[3, 3, 0], [3, 4, 2]] + [[0, 2 * i, 0] for i in range(num_agents - 2)],
+        dtype=jnp.int8,
+    )
+    grid = jnp.zeros_like(state.grid)
+    grid = grid.at[pos[:, 0], pos[:, 1]].set(jnp.arange(1, num_agents + 1, dtype=jnp.int8))
+    return state.replace(
+        agent_positions=pos,
+        grid=grid,
+        agent_inventories=jnp.array(inventories, dtype=jnp.float32),
+    )
+
+
+@pytest.mark.parametrize("num_agents", [2, 3])
+def test_storm_interaction_rewards(num_agents):
+    env = make("storm", num_agents=num_agents)
+    inventories = [[2, 0], [1, 1]] + [[1, 0]] * (num_agents - 2)
+    state = _facing_state(env, num_agents, inventories)
+    actions = [3, 3] + [4] * (num_agents - 2)
+    _, state, rewards, _, _ = env.step_env(jax.random.PRNGKey(1), state, actions)
+    expected = env.get_reward(
+        state.replace(agent_inventories=jnp.array(inventories, dtype=jnp.float32)),
+        jnp.array([0, 1]),
+    )
+    assert jnp.allclose(rewards[:2], expected)
+    assert jnp.all(rewards[2:] == 0)
+    assert jnp.all(state.agent_freezes[:2] == FREEZE_PENALTY)
+
+
+def test_storm_agent_interacts_once():
+    # agent 2 faces agents 0 and 1, who both face it: it interacts with only one of them
+    env = make("storm", num_agents=3)
+    state = _facing_state(env, 3, [[1, 1]] * 3)
+    pos = jnp.array([[3, 2, 0], [3, 3, 0], [3, 4, 2]], dtype=jnp.int8)
+    grid = jnp.zeros_like(state.grid).at[pos[:, 0], pos[:, 1]].set(jnp.arange(1, 4, dtype=jnp.int8))
+    state = state.replace(agent_positions=pos, grid=grid)
+    step = jax.vmap(lambda key: env.step_env(key, state, [3, 3, 3]))
+    _, states, rewards, _, _ = step(jax.random.split(jax.random.PRNGKey(0), 32))
+    assert jnp.all((rewards != 0).sum(axis=1) == 2)
+    assert jnp.all(rewards[:, 2] != 0)
+    assert jnp.any(rewards[:, 0] != 0) and jnp.any(rewards[:, 1] != 0)
+    assert jnp.all(states.agent_freezes == FREEZE_PENALTY)
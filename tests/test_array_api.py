@@ -0,0 +1,42 @@
+"""
+Test that the agent-major array API matches the dictionary API
+"""
+import jax
+import jax.numpy as jnp
+import pytest
+from jaxmarl import make
+
+
+def sample_actions(key, env):
+    key_a = jax.random.split(key, env.num_agents)
+    return {
+        agent: env.action_space(agent).sample(key_a[i])
+        for i, agent in enumerate(env.agents)
+    }
+
+
+@pytest.mark.parametrize(
+    "env_id",
+    ["SMAX", "hanabi", "overcooked", "MPE_simple_spread_v3", "MPE_simple_tag_v3"],
+)
+def test_array_api_matches_dict_api(env_id):
+    env = make(env_id)
+    key = jax.random.PRNGKey(0)
+    key, key_reset = jax.random.split(key)
+    obs, state = env.reset(key_reset)
+    obs_array, state_array = env.reset_array(key_reset)
+    assert obs_array.shape[0] == env.num_agents
+    assert jnp.allclose(env.stack_agents(obs), obs_array)
+
+    for _ in range(5):
+        key, key_act, key_step = jax.random.split(key, 3)
+        actions = sample_actions(key_act, env)
+        obs, state, rewards, dones, _ = env.step(key_step, state, actions)
+        obs_array, state_array, rewards_array, dones_array, _ = env.step_array(
+            key_step, state_array, env.stack_agents(actions)
+        )
+        assert jnp.allclose(env.stack_agents(obs), obs_array)
+        assert jnp.allclose(env.stack_agents(rewards), rewards_array)
+        assert jnp.all(env.stack_dones(dones) == dones_array)
+        for x, y in zip(jax.tree_util.tree_leaves(state), jax.tree_util.tree_leaves(state_array)):
+            assert jnp.allclose(x, y)
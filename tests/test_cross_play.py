@@ -0,0 +1,61 @@
+"""
+Test the cross-play evaluation of checkpoint populations
+"""
+import jax
+import jax.numpy as jnp
+import distrax
+import flax.linen as nn
+from jaxmarl import make
+from jaxmarl.wrappers.baselines import save_params
+from jaxmarl.evaluation import (
+    load_population,
+    make_cross_play,
+    cross_play_table,
+    save_cross_play_table,
+)
+
+
+class Policy(nn.Module):
+    action_dim: int
+
+    @nn.compact
+    def __call__(self, x):
+        mean = nn.Dense(self.action_dim)(x)
+        return distrax.MultivariateNormalDiag(mean, jnp.ones_like(mean)), mean[..., 0]
+
+
+def test_cross_play(tmp_path):
+    env = make("MPE_simple_facmac_3a_v1")
+    network = Policy(5)
+    init_x = env.reset(jax.random.PRNGKey(0))[0][env.adversaries[0]]
+    paths = []
+    for i in range(3):
+        params = network.init(jax.random.PRNGKey(i), init_x)
+        paths.append(tmp_path / f"policy{i}.safetensors")
+        save_params(params, paths[-1])
+    population = load_population(paths)
+    assert jax.tree_util.tree_leaves(population)[0].shape[0] == 3
+
+    num_envs = 4
+    cross_play = jax.jit(
+        make_cross_play(
+            env,
+            network.apply,
+            evaluated_agents=env.adversaries[:1],
+            context_agents=env.adversaries[1:],
+            num_envs=num_envs,
+            num_steps=30,
+        ),
+        static_argnames="paired",
+    )
+    rng = jax.random.PRNGKey(0)
+    returns = cross_play(rng, population, population)
+    assert returns.shape == (3, 3, num_envs, env.num_agents)
+    paired = cross_play(rng, population, population, paired=True)
+    assert jnp.allclose(paired, jnp.diagonal(returns, axis1=0, axis2=1).transpose(2, 0, 1))
+
+    names = ["a", "b", "c"]
+    rows = cross_play_table(returns.sum(-1), names, names)
+    assert len(rows) == 3 * 3 * num_envs
+    save_cross_play_table(rows, tmp_path / "cross_play.csv")
+    assert (tmp_path / "cross_play.csv").read_text().startswith("eval,context,episode,return")
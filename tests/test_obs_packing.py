@@ -0,0 +1,61 @@
+"""
+Test the bit-packed observation mode of the grid environments
+"""
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+from jaxmarl import make
+from jaxmarl.environments import ObsPacking
+
+
+def test_pack_unpack_roundtrip():
+    packing = ObsPacking(11, int_channels=[3, 7])
+    assert packing.num_packed_channels == 2 + 2
+    key_bits, key_ints = jax.random.split(jax.random.PRNGKey(0))
+    obs = jax.random.bernoulli(key_bits, shape=(6, 5, 11)).astype(jnp.uint8)
+    obs = obs.at[..., [3, 7]].set(jax.random.randint(key_ints, (6, 5, 2), 0, 256).astype(jnp.uint8))
+    packed = jax.jit(packing.pack)(obs)
+    assert packed.shape == (6, 5, 4) and packed.dtype == jnp.uint8
+    assert jnp.all(jax.jit(packing.unpack)(packed) == obs)
+
+
+def _rollout_obs(env_id, env_kwargs, get_obs, num_steps=30):
+    """Observations of the same rollout with and without packing."""
+    envs = [make(env_id, **env_kwargs, packed_obs=packed) for packed in (False, True)]
+    observations = [[], []]
+    for env, obs_list in zip(envs, observations):
+        key = jax.random.PRNGKey(0)
+        key, key_reset = jax.random.split(key)
+        obs, state = env.reset(key_reset)
+        obs_list.append(get_obs(obs))
+        for _ in range(num_steps):
+            key, key_act, key_step = jax.random.split(key, 3)
+            key_act = jax.random.split(key_act, env.num_agents)
+            actions = [
+                env.action_space(a).sample(key_act[i]) for i, a in enumerate(env.agents)
+            ]
+            if env_id == "overcooked":
+                actions = dict(zip(env.agents, actions))
+            obs, state, _, _, _ = env.step(key_step, state, actions)
+            obs_list.append(get_obs(obs))
+    return envs[1], observations[0], observations[1]
+
+
+@pytest.mark.parametrize(
+    "env_id,env_kwargs,get_obs",
+    [
+        ("overcooked", {}, lambda obs: jnp.stack([obs["agent_0"], obs["agent_1"]])),
+        ("overcooked", {"tomato_channels": False, "random_reset": True}, lambda obs: jnp.stack([obs["agent_0"], obs["agent_1"]])),
+        ("coin_game", {}, lambda obs: jnp.stack(obs)),
+        ("coin_game", {"cnn": False}, lambda obs: jnp.stack(obs)),
+        ("storm", {}, lambda obs: obs["observations"]),
+        ("storm_2p", {}, lambda obs: jnp.stack([o["observation"] for o in obs])),
+    ],
+)
+def test_packed_obs_matches_unpacked(env_id, env_kwargs, get_obs):
+    env, observations, packed_observations = _rollout_obs(env_id, env_kwargs, get_obs)
+    for obs, packed in zip(observations, packed_observations):
+        assert packed.dtype == jnp.uint8
+        assert packed.shape[-1] == env.obs_packing.num_packed_channels
+        assert jnp.all(env.obs_packing.unpack(packed) == obs)
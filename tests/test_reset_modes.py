@@ -0,0 +1,119 @@
+"""
+Test the auto-reset modes of MultiAgentEnv.step
+"""
+import jax
+import jax.numpy as jnp
+import pytest
+from jaxmarl import make
+from jaxmarl.environments import ResetPool
+
+
+def sample_actions(key, env):
+    key_a = jax.random.split(key, env.num_agents)
+    return {
+        agent: env.action_space(agent).sample(key_a[i])
+        for i, agent in enumerate(env.agents)
+    }
+
+
+def run_until_done(env, key, max_steps=300):
+    key, key_reset = jax.random.split(key)
+    obs, state = env.reset(key_reset)
+    for _ in range(max_steps):
+        key, key_act, key_step = jax.random.split(key, 3)
+        actions = sample_actions(key_act, env)
+        obs, state, _, dones, _ = env.step(key_step, state, actions)
+        if dones["__all__"]:
+            return obs, state
+    raise AssertionError("episode did not finish")
+
+
+def in_pool(pool, state):
+    matches = jax.tree_map(
+        lambda pool, x: jnp.all(pool == x, axis=tuple(range(1, pool.ndim))),
+        pool.state,
+        state,
+    )
+    return jnp.any(jnp.all(jnp.stack(jax.tree_util.tree_leaves(matches)), axis=0))
+
+
+@pytest.mark.parametrize("env_id", ["MPE_simple_spread_v3", "SMAX"])
+def test_pool_resets_to_pool_state(env_id):
+    env = make(env_id, reset_mode="pool", reset_pool_size=4)
+    _, state = run_until_done(env, jax.random.PRNGKey(0))
+    assert in_pool(env.reset_pool, state)
+
+
+@pytest.mark.parametrize(
+    "env_id,done_field", [("MPE_simple_spread_v3", "done"), ("SMAX", "terminal")]
+)
+def test_deferred_does_not_reset(env_id, done_field):
+    env = make(env_id, reset_mode="deferred")
+    obs, state = run_until_done(env, jax.random.PRNGKey(0))
+    # the returned state is still the terminal one
+    assert jnp.all(getattr(state, done_field))
+    key = jax.random.PRNGKey(1)
+    obs_re, state_re = env.reset_done(key, obs, state, True)
+    obs_expected, state_expected = env.reset(key)
+    for x, y in zip(
+        jax.tree_util.tree_leaves((obs_re, state_re)),
+        jax.tree_util.tree_leaves((obs_expected, state_expected)),
+    ):
+        assert jnp.allclose(x, y)
+
+
+def test_invalid_reset_mode():
+    with pytest.raises(ValueError):
+        make("MPE_simple_spread_v3", reset_mode="lazy")
+
+
+def test_reset_pool_sample_and_refresh():
+    env = make("hanabi")
+    pool = ResetPool.create(env, jax.random.PRNGKey(0), 8)
+    assert pool.size == 8
+
+    _, state = jax.jit(pool.sample)(jax.random.PRNGKey(1))
+    assert in_pool(pool, state)
+
+    @jax.jit
+    def refresh(pool, key, step):
+        return pool.periodic_refresh(env, key, step, period=2, num_refresh=3)
+
+    same = refresh(pool, jax.random.PRNGKey(2), 1)
+    assert jnp.all(same.state.deck == pool.state.deck)
+    refreshed = refresh(pool, jax.random.PRNGKey(2), 2)
+    changed = (refreshed.state.deck != pool.state.deck).reshape(8, -1).any(-1)
+    assert changed.sum() == 3
+
+
+def test_reset_done_with_pool():
+    env = make("MPE_simple_spread_v3", reset_mode="deferred")
+    pool = ResetPool.create(env, jax.random.PRNGKey(0), 4)
+    obs, state = run_until_done(env, jax.random.PRNGKey(1))
+    _, state = env.reset_done(jax.random.PRNGKey(2), obs, state, True, pool)
+    assert in_pool(pool, state)
+
+
+def test_overridden_step_rejects_reset_modes():
+    with pytest.raises(ValueError):
+        make("coin_game", reset_mode="pool")
+    with pytest.raises(ValueError):
+        make("coin_game", reset_mode="deferred")
+
+
+def test_pool_is_passed_to_step():
+    env = make("MPE_simple_spread_v3", reset_mode="pool", reset_pool_size=4)
+    other_pool = ResetPool.create(env, jax.random.PRNGKey(5), 4)
+    _, state = env.reset(jax.random.PRNGKey(0))
+    actions = sample_actions(jax.random.PRNGKey(1), env)
+    # the episode ends on the next step
+    state = state.replace(step=env.max_steps)
+    _, state_own, _, _, _ = env.step(jax.random.PRNGKey(2), state, actions)
+    cache_size = env._step._cache_size()
+    _, state_other, _, _, _ = env.step(
+        jax.random.PRNGKey(2), state, actions, other_pool
+    )
+    assert in_pool(env.reset_pool, state_own)
+    assert in_pool(other_pool, state_other)
+    # the pool is an argument of the compiled step, not a constant
+    assert env._step._cache_size() == cache_size